@@ -20,9 +20,24 @@ controller ...
 import datetime
 import json
 import logging
+import threading
+import time
 import urllib.request, urllib.parse, urllib.error
 import ssl
 
+from .batch import BatchCall, BatchResult, run_batch
+from .cache import ResponseCache
+from . import fwtags
+from .index import GatewayIndex
+from .metrics import InMemorySink, LoggingSink, MetricsSink, RequestSample, StatsDSink, error_label
+from .ratelimit import ControllerGovernor, TokenBucket, shared_governor
+from .retry import CircuitBreaker, CircuitOpenError, RetryPolicy, is_read_action
+from .session import FileSessionStore, SessionStore
+from .stream import CountingReader, iter_json_path
+from . import stats
+from .tracing import CallTrace, Tracer
+from .transport import HTTPSConnectionPool
+
 
 class Util(object):
     """
@@ -61,6 +76,9 @@ class Aviatrix(object):
             super(Aviatrix.RESTException, self).__init__('Aviatrix REST API: {}'.format(reason))
             self.reason = reason
 
+    # raised instead of sending a request while the circuit breaker is open
+    CircuitOpenError = CircuitOpenError
+
     class CloudType(object):
         """
         Enum representation for the cloud_type argument
@@ -75,71 +93,563 @@ class Aviatrix(object):
         AWS_CHINA = 1024
         ARM_CHINA = 2048
 
-    def __init__(self, controller_ip):
+    # read-only actions whose responses may be kept in the response cache
+    CACHED_ACTIONS = frozenset(['list_vpcs_summary', 'list_peer_vpc_pairs',
+                                'list_accounts', 'list_policy_tags',
+                                'list_fqdn_filter_tags', 'list_spoke_gws',
+                                'list_transit_gws', 'list_spoke_gw_supported_sizes'])
+
+    _GATEWAY_LISTS = ('list_vpcs_summary', 'list_spoke_gws', 'list_transit_gws')
+
+    # cached actions invalidated by each mutating action
+    CACHE_INVALIDATIONS = {
+        'connect_container': _GATEWAY_LISTS,
+        'create_spoke_gw': _GATEWAY_LISTS,
+        'delete_container': _GATEWAY_LISTS + ('list_peer_vpc_pairs',),
+        'enable_vpc_ha': _GATEWAY_LISTS,
+        'disable_vpc_ha': _GATEWAY_LISTS,
+        'enable_single_az_ha': _GATEWAY_LISTS,
+        'enable_spoke_ha': _GATEWAY_LISTS,
+        'enable_nat': _GATEWAY_LISTS,
+        'disable_nat': _GATEWAY_LISTS,
+        'attach_spoke_to_transit_gw': _GATEWAY_LISTS,
+        'peer_vpc_pair': ('list_peer_vpc_pairs',),
+        'unpeer_vpc_pair': ('list_peer_vpc_pairs',),
+        'setup_account_profile': ('list_accounts',),
+        'add_policy_tag': ('list_policy_tags',),
+        'del_policy_tag': ('list_policy_tags',),
+        'add_fqdn_filter_tag': ('list_fqdn_filter_tags',),
+        'del_fqdn_filter_tag': ('list_fqdn_filter_tags',),
+        'set_fqdn_filter_tag_color': ('list_fqdn_filter_tags',),
+        'set_fqdn_filter_tag_state': ('list_fqdn_filter_tags',),
+        'attach_fqdn_filter_tag_to_gw': ('list_fqdn_filter_tags',),
+        'detach_fqdn_filter_tag_from_gw': ('list_fqdn_filter_tags',),
+    }
+
+    # words in a RESTException reason that mean the CID is no longer valid
+    INVALID_CID_REASONS = ('cid is invalid', 'invalid cid', 'cid expired',
+                           'cid is expired', 'session expired', 'session is expired')
+
+    def __init__(self, controller_ip, pool_size=10, idle_timeout=60, timeout=None,
+                 keep_results=False, cache=None, session_store=None, relogin=None,
+                 retry=None, circuit_breaker=None, governor=None, metrics=None, tracer=None):
         """
         Constructor for Aviatrix Controller class.  Controller IP is the
         host name or IP address of your controller.
         Arguments:
         controller_ip - string - host name or IP address of Aviatrix Controller
+        pool_size - int - maximum number of idle keep-alive connections kept
+                          open to the controller
+        idle_timeout - int - seconds before an idle connection is closed
+        timeout - float - socket timeout in seconds (None for the default)
+        keep_results - bool - keep the last response in self.result and
+                              self.results (for code written against older
+                              versions of this SDK).  Leave disabled to share
+                              one logged in instance between threads.
+        cache - ResponseCache - (optional) cache for the CACHED_ACTIONS
+                                responses; mutating actions drop the
+                                affected entries (see CACHE_INVALIDATIONS)
+        session_store - SessionStore - (optional) reuse the CID of an earlier
+                                       login (e.g. FileSessionStore())
+        relogin - bool - log in again and replay the request when the
+                         controller rejects the CID (default: enabled when a
+                         session_store is given)
+        retry - RetryPolicy - (optional) retry requests failing with network
+                              errors or overload statuses (read actions only
+                              unless retry_writes is set)
+        circuit_breaker - CircuitBreaker - (optional) fail fast with
+                                           CircuitOpenError while the
+                                           controller keeps failing
+        governor - ControllerGovernor - (optional) rate and in-flight limits,
+                                        usually shared_governor(controller_ip)
+        metrics - MetricsSink - (optional) receives a RequestSample for
+                                every request sent to the controller
+        tracer - Tracer - (optional) receives a CallTrace with the DNS,
+                          connect, TLS, time to first byte, transfer and
+                          JSON decode timing of every request
         """
         if not controller_ip:
             raise ValueError('Aviatrix Controller IP is required')
         self.controller_ip = controller_ip
         self.customer_id = ''
+        self.keep_results = keep_results
+        self.cache = cache
+        self.gateway_index = None
+        self.session_store = session_store
+        self.relogin = bool(session_store) if relogin is None else relogin
+        self._credentials = None
+        self._login_lock = threading.Lock()
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.governor = governor
+        self.metrics = metrics
+        self.tracer = tracer
         self.results = []
         self.result = None
         # Required for SSL Certificate no-verify
         self.ctx = ssl.create_default_context()
         self.ctx.check_hostname = False
         self.ctx.verify_mode = ssl.CERT_NONE
+        self.transport = HTTPSConnectionPool(controller_ip, self.ctx,
+                                             pool_size=pool_size,
+                                             idle_timeout=idle_timeout,
+                                             timeout=timeout)
 
-    def _avx_api_call(self, method, action, parameters, is_backend=False):
+    def close(self):
         """
-        Internal function to handle the API call.
+        Closes the idle connections to the controller
+        """
+        self.transport.close()
+
+    def enable_gateway_index(self, max_age=300):
+        """
+        Builds a GatewayIndex of the gateways in every account and makes
+        get_gateway_by_name() look gateways up in it.
+        Arguments:
+        max_age - float - seconds before an account's gateways are re-read
+        Returns:
+        the GatewayIndex
+        """
+        index = GatewayIndex(self, max_age)
+        index.refresh()
+        self.gateway_index = index
+        return index
+
+    def batch(self, calls, max_workers=16):
+        """
+        Runs many API calls concurrently over a bounded pool of worker
+        threads sharing this client's session.
+        Arguments:
+        calls - list - BatchCall objects, method names or tuples of
+                       (method name, args[, kwargs]), for example
+                       [('get_fw_policy_full', ('gw1',)), ...]
+        max_workers - int - maximum number of calls in flight
+        Returns:
+        list of BatchResult (call, value, error) in the order of calls;
+        a failed call is reported in its error field instead of raising
+        """
+        return run_batch(self, calls, max_workers)
+
+    def _build_request(self, method, action, parameters, is_backend=False):
+        """
+        Builds the HTTP request for an API call.
         Arguments:
         method - string - GET/POST
         action - string - the action name (see API docs for details)
         parameters - dict - parameters to send to controller for this action
         is_backend - bool - true is public API
-
-        Side Effects:
-        self.result - set to the JSON response object
-        self.results - set to the reason or results object
+        Returns:
+        tuple (url, body, headers) where url is the path and query string
         """
-        url = 'https://{0}/v1/{1}'.format(self.controller_ip, ('api' if not is_backend else 'backend1'))
+        url = '/v1/{0}'.format('api' if not is_backend else 'backend1')
         new_parameters = dict(parameters)
         new_parameters['action'] = action
         new_parameters['CID'] = self.customer_id
         data = urllib.parse.urlencode(new_parameters)
+        headers = {}
         if method == 'GET':
             url = url + '?' + data
-            req = urllib.request.Request(url)
+            data = None
         elif method == 'POST':
             data = data.encode()
-            req = urllib.request.Request(url, data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
         else:
             raise ValueError('Invalid method {}'.format(method))
-        with urllib.request.urlopen(req, context=self.ctx) as response:
-            json_response = response.read()
-            logging.debug('[{0}] HTTP Response: {1}'.format(url, json_response))
+        return url, data, headers
+
+    def _parse_response(self, url, json_response):
+        """
+        Decodes the body returned by the controller.
+        Arguments:
+        url - string - the request path (used for logging)
+        json_response - bytes - the HTTP response body
+        Returns:
+        the JSON response object
+
+        Side Effects (only if keep_results is enabled):
+        self.result - set to the JSON response object
+        self.results - set to the reason or results object
+        """
+        logging.debug('[{0}] HTTP Response: {1}'.format(url, json_response))
 
         if json_response[0:6] == 'Error:':
             raise ValueError(json_response)
         try:
-            self.result = json.loads(json_response)
-            if 'return' in self.result:
-                if not self.result['return']:
-                    self.results = None
-                    raise Aviatrix.RESTException(self.result['reason'])
-                else:
-                    self.results = self.result['results']
-            else:
-                self.results = self.result
+            result = json.loads(json_response)
         except ValueError as nojson:
             if str(nojson) == 'No JSON object could be decoded':
-                self.results = json_response
+                result = json_response
             else:
                 raise nojson
+        failed = isinstance(result, dict) and 'return' in result and not result['return']
+        if self.keep_results:
+            self.result = result
+            self.results = None if failed else Aviatrix._results_of(result)
+        if failed:
+            raise Aviatrix.RESTException(result['reason'])
+        return result
+
+    @staticmethod
+    def _results_of(result):
+        """
+        Returns the results object of a decoded JSON response
+        """
+        if isinstance(result, dict) and 'return' in result:
+            return result['results']
+        return result
+
+    def _avx_api_call(self, method, action, parameters, is_backend=False):
+        """
+        Internal function to handle the API call.
+        Arguments:
+        method - string - GET/POST
+        action - string - the action name (see API docs for details)
+        parameters - dict - parameters to send to controller for this action
+        is_backend - bool - true is public API
+        Returns:
+        the JSON response object
+        """
+        return self._run_steps(self._call_steps(method, action, parameters, is_backend))
+
+    def _send(self, method, action, parameters, is_backend=False):
+        """
+        Sends a single API request (see _avx_api_call())
+        """
+        return self._run_steps(self._request_steps(method, action, parameters, is_backend))
+
+    def _relogin(self, customer_id):
+        """
+        Logs in again after the controller rejected customer_id
+        """
+        with self._login_lock:
+            # another thread may have logged in again in the meantime
+            if self.customer_id == customer_id:
+                self._login_response(self._send('GET', 'login', self._login_parameters()))
+
+    def _io(self, step):
+        """
+        Returns:
+        the blocking callable performing a step of _call_steps()
+        """
+        if step == 'sleep':
+            return time.sleep
+        if step == 'acquire':
+            return self.governor.acquire
+        if step == 'relogin':
+            return self._relogin
+        # 'request' or 'open'
+        return getattr(self.transport, step)
+
+    def _run_steps(self, steps):
+        """
+        Performs the I/O steps yielded by a generator such as _call_steps()
+        and feeds back their results (or raises their errors into it)
+        Returns:
+        the value returned by the generator
+        """
+        value = error = None
+        while True:
+            try:
+                step, args = steps.send(value) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = self._io(step)(*args), None
+            except BaseException as err:  # pylint: disable=broad-except
+                value, error = None, err
+
+    # The request logic (relogin, cache, metrics, circuit breaker, governor
+    # and retries) is written once as generators yielding the I/O to perform
+    # as (step, args), where step is 'request' or 'open' (transport calls),
+    # 'acquire' (governor), 'sleep' or 'relogin'.  _run_steps() performs them
+    # with blocking calls and AsyncAviatrix._run_steps() with coroutines.
+
+    def _call_steps(self, method, action, parameters, is_backend=False):
+        """
+        Steps of _avx_api_call(): the request, replayed after logging in
+        again if the controller rejects the CID
+        """
+        customer_id = self.customer_id
+        try:
+            return (yield from self._request_steps(method, action, parameters, is_backend))
+        except Aviatrix.RESTException as err:
+            if not self._should_relogin(action, err):
+                raise
+        yield 'relogin', (customer_id,)
+        return (yield from self._request_steps(method, action, parameters, is_backend))
+
+    def _request_steps(self, method, action, parameters, is_backend=False):
+        """
+        Steps of _send(): a single request with its cache lookup, metrics
+        and retries
+        """
+        url, data, headers = self._build_request(method, action, parameters, is_backend)
+        cache_key, generation, json_response = self._cache_lookup(action, parameters)
+        if json_response is not None:
+            return self._parse_response(url, json_response)
+        trace = None
+        if self.tracer is not None:
+            trace = CallTrace(action, 'backend1' if is_backend else 'api', method)
+        start = time.monotonic()
+        try:
+            try:
+                json_response = yield from self._retry_steps(
+                    action, is_backend, 'request',
+                    (method, url, data, headers, trace, is_read_action(action)))
+            finally:
+                self._cache_invalidate(action, parameters)
+            result = self._decode(url, json_response, trace)
+        except Exception as err:
+            if self.metrics is not None or trace is not None:
+                self._observe(action, is_backend, method, url, data, start,
+                              len(json_response) if json_response else 0, trace, err)
+            raise
+        if self.metrics is not None or trace is not None:
+            self._observe(action, is_backend, method, url, data, start, len(json_response), trace)
+        if cache_key is not None:
+            # dropped if a mutating action invalidated the cache meanwhile
+            self.cache.put(cache_key, json_response, generation)
+        return result
+
+    def _retry_steps(self, action, is_backend, step, args, hold_slot=False):
+        """
+        Steps of a transport call made through the circuit breaker and the
+        governor, retried as the retry policy allows
+        Arguments:
+        action - string - the action name
+        is_backend - bool - true is public API
+        step - string - the transport call ('request' or 'open')
+        args - tuple - its arguments
+        hold_slot - bool - keep the governor's in-flight slot after a
+                           successful call; the caller must release it
+        Returns:
+        the value returned by the transport call
+        """
+        attempt = 0
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_call()
+            attempt += 1
+            recorded = False
+            try:
+                if self.governor is not None:
+                    yield 'acquire', (action, is_backend)
+                held = False
+                try:
+                    value = yield step, args
+                except Exception as err:
+                    recorded = True
+                    delay = self._retry_delay(action, attempt, err)
+                    if delay is None:
+                        raise
+                else:
+                    if self.circuit_breaker is not None:
+                        self.circuit_breaker.record()
+                    recorded = True
+                    held = hold_slot
+                    return value
+                finally:
+                    if self.governor is not None and not held:
+                        self.governor.release()
+            finally:
+                # cancelled or interrupted: the attempt has no outcome to record
+                if self.circuit_breaker is not None and not recorded:
+                    self.circuit_breaker.release()
+            yield 'sleep', (delay,)
+
+    def _decode(self, url, json_response, trace):
+        """
+        Calls _parse_response(), timing it when tracing
+        """
+        if trace is None:
+            return self._parse_response(url, json_response)
+        start = time.monotonic()
+        try:
+            return self._parse_response(url, json_response)
+        finally:
+            trace.add('decode', time.monotonic() - start)
+
+    def _observe(self, action, is_backend, method, url, data, start, response_size, trace,
+                 err=None):
+        """
+        Hands the RequestSample of a request to the metrics sink and its
+        CallTrace to the tracer
+        Arguments:
+        response_size - int - bytes of the response body received
+        """
+        duration = time.monotonic() - start
+        if isinstance(err, Aviatrix.RESTException):
+            error = str(err.reason)
+        else:
+            error = error_label(err)
+        if self.metrics is not None:
+            self.metrics.record(RequestSample(action, 'backend1' if is_backend else 'api', method,
+                                              duration, len(url) + (len(data) if data else 0),
+                                              response_size, error))
+        if trace is not None:
+            trace.total = duration
+            trace.error = error
+            self.tracer.record(trace)
+
+    def _retry_delay(self, action, attempt, err):
+        """
+        Records a failed attempt with the circuit breaker
+        Returns:
+        seconds to wait before retrying, or None if err must be raised
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(err)
+        if self.retry is None:
+            return None
+        delay = self.retry.next_delay(action, attempt, err)
+        if delay is not None:
+            logging.info('Aviatrix {0} failed ({1}); retry {2} in {3:.2f}s'.format(
+                action, err, attempt, delay))
+        return delay
+
+    def _avx_api_stream(self, method, action, parameters, is_backend=False, path=('results',)):
+        """
+        Internal function to handle an API call whose response is decoded
+        incrementally while it is read from the socket.  Like _avx_api_call()
+        it logs in again when the CID is rejected, and the request is
+        counted by the metrics sink, the tracer and the governor (whose
+        in-flight slot is held until the body is consumed or the generator
+        is closed).
+        Arguments:
+        method - string - GET/POST
+        action - string - the action name (see API docs for details)
+        parameters - dict - parameters to send to controller for this action
+        is_backend - bool - true is public API
+        path - tuple - keys leading to the array to iterate
+        Returns:
+        generator of the array elements.  A failure reported before the
+        array (the controller sends 'return' first) raises RESTException
+        before any element is yielded; a failure reported after the array
+        raises it once the elements were yielded.
+        """
+        customer_id = self.customer_id
+        started = False
+        try:
+            for item in self._stream(method, action, parameters, is_backend, path):
+                started = True
+                yield item
+            return
+        except Aviatrix.RESTException as err:
+            # nothing was handed to the caller yet, so the request can be replayed
+            if started or not self._should_relogin(action, err):
+                raise
+        self._relogin(customer_id)
+        for item in self._stream(method, action, parameters, is_backend, path):
+            yield item
+
+    def _stream(self, method, action, parameters, is_backend, path):
+        """
+        Sends a single streamed API request (see _avx_api_stream())
+        """
+        url, data, headers = self._build_request(method, action, parameters, is_backend)
+        logging.debug('[{0}] streaming HTTP Response'.format(url))
+        trace = None
+        if self.tracer is not None:
+            trace = CallTrace(action, 'backend1' if is_backend else 'api', method)
+        start = time.monotonic()
+        reader = None
+        error = None
+        try:
+            conn, response = self._run_steps(self._retry_steps(
+                action, is_backend, 'open', (method, url, data, headers, trace, is_read_action(action)),
+                hold_slot=True))
+            try:
+                reader = CountingReader(response)
+                envelope = {}
+                checked = False
+                for item in iter_json_path(reader, path, envelope):
+                    if not checked:
+                        # the members read so far precede the array
+                        self._check_envelope(envelope)
+                        checked = True
+                    yield item
+                self._check_envelope(envelope)
+            finally:
+                self.transport.release(conn, response)
+                if self.governor is not None:
+                    self.governor.release()
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            if self.metrics is not None or trace is not None:
+                received = reader.count if reader is not None else 0
+                if trace is not None:
+                    trace.response_bytes = received
+                self._observe(action, is_backend, method, url, data, start, received, trace, error)
+
+    @staticmethod
+    def _check_envelope(envelope):
+        """
+        Raises RESTException if the members of a streamed response report a
+        failure
+        """
+        if 'return' in envelope and not envelope['return']:
+            raise Aviatrix.RESTException(envelope.get('reason'))
+
+    def _cache_lookup(self, action, parameters):
+        """
+        Looks up a cached response for a cacheable action
+        Returns:
+        tuple (cache key or None, cache generation before the request,
+        cached response body or None)
+        """
+        if self.cache is None or action not in self.CACHED_ACTIONS:
+            return None, None, None
+        cache_key = self.cache.key(action, parameters, self.controller_ip)
+        generation = self.cache.generation()
+        return cache_key, generation, self.cache.get(cache_key)
+
+    def _cache_invalidate(self, action, parameters):
+        """
+        Drops cached responses (and gateway index entries) made stale by a
+        mutating action
+        """
+        if action not in self.CACHE_INVALIDATIONS:
+            return
+        if self.cache is not None:
+            self.cache.invalidate(self.CACHE_INVALIDATIONS[action], self.controller_ip)
+        if self.gateway_index is not None and 'list_vpcs_summary' in self.CACHE_INVALIDATIONS[action]:
+            self.gateway_index.invalidate(parameters.get('account_name'))
+
+    def _api(self, method, action, parameters, is_backend=False, key=None, on_response=None,
+             convert=None):
+        """
+        Performs an API call and returns its results.  Every public method is
+        written in terms of this call so that AsyncAviatrix, which overrides
+        it with a coroutine, exposes the same actions and parameters.
+        Arguments:
+        method - string - GET/POST
+        action - string - the action name (see API docs for details)
+        parameters - dict - parameters to send to controller for this action
+        is_backend - bool - true is public API
+        key - string - (optional) return only this entry of the results
+        on_response - callable - (optional) called with the JSON response object
+        convert - callable - (optional) converts the returned value
+        Returns:
+        the results object (or the given key of it)
+        """
+        result = self._avx_api_call(method, action, parameters, is_backend)
+        return self._extract(result, key, on_response, convert)
+
+    @staticmethod
+    def _extract(result, key, on_response, convert=None):
+        """
+        Picks the value returned by _api() out of a decoded response
+        """
+        if on_response is not None:
+            on_response(result)
+        results = Aviatrix._results_of(result)
+        if key is not None:
+            results = results[key]
+        if convert is not None:
+            return convert(results)
+        return results
 
     def login(self, username, password):
         """
@@ -148,15 +658,62 @@ class Aviatrix(object):
         username - string - the username to login to the controller with
         password - string - the password for the given  username
         Side Effects:
-        self.customer_id set to the CID in the response
+        self.customer_id set to the CID in the response (or to the CID saved
+        in the session store, in which case no request is sent)
         """
         if not username or not password:
             raise ValueError('Username and password are required')
-        self._avx_api_call('GET', 'login', {'username': username,
-                                            'password': password})
+        self._credentials = (username, password)
+        if self._restore_session():
+            return None
+        return self._api('GET', 'login', self._login_parameters(),
+                         on_response=self._login_response)
+
+    def _login_parameters(self):
+        username, password = self._credentials
+        return {'username': username, 'password': password}
+
+    def _restore_session(self):
+        """
+        Uses the CID saved in the session store, if any
+        Returns:
+        True if a saved CID was found
+        """
+        if self.session_store is None:
+            return False
+        customer_id = self.session_store.load(self.controller_ip, self._credentials[0])
+        if not customer_id:
+            return False
+        self.customer_id = customer_id
+        return True
+
+    def _should_relogin(self, action, err):
+        """
+        True if err means the CID expired and the request can be replayed
+        after logging in again
+        """
+        if not self.relogin or self._credentials is None or action == 'login':
+            return False
+        reason = str(err.reason).lower()
+        if not any(text in reason for text in self.INVALID_CID_REASONS):
+            return False
+        logging.info('Aviatrix CID rejected ({0}); logging in again'.format(err.reason))
+        if self.session_store is not None:
+            self.session_store.discard(self.controller_ip, self._credentials[0])
+        return True
+
+    def _login_response(self, result):
+        """
+        Stores the CID returned by a successful login
+        Arguments:
+        result - dict - the JSON response object of the login action
+        """
         try:
-            if self.result['return']:
-                self.customer_id = self.result['CID']
+            if result['return']:
+                self.customer_id = result['CID']
+                if self.session_store is not None:
+                    self.session_store.save(self.controller_ip, self._credentials[0],
+                                            self.customer_id)
         except AttributeError as login_err:
             logging.info('Login Request Failed. AttributeError: {}'.format(str(login_err)))
 
@@ -167,7 +724,7 @@ class Aviatrix(object):
         email - string - email address
         """
 
-        self._avx_api_call('GET', 'add_admin_email_addr', {'admin_email': email})
+        return self._api('GET', 'add_admin_email_addr', {'admin_email': email})
 
     def change_password(self, account, username, old_password, password):
         """
@@ -182,7 +739,7 @@ class Aviatrix(object):
                   'user_name': username,
                   'old_password': old_password,
                   'password': password}
-        self._avx_api_call('GET', 'change_password', params)
+        return self._api('GET', 'change_password', params)
 
     def initial_setup(self, subaction):
         """
@@ -190,7 +747,7 @@ class Aviatrix(object):
         Arguments:
         subaction - string - one of 'run' or 'check'
         """
-        self._avx_api_call('POST', 'initial_setup', {'subaction': subaction})
+        return self._api('POST', 'initial_setup', {'subaction': subaction})
 
     def setup_account_profile(self, account, cloud_type, aws_account_number, aws_role_arn, aws_role_ec2):
         """
@@ -211,7 +768,7 @@ class Aviatrix(object):
                   'aws_account_number': aws_account_number,
                   'aws_role_arn': aws_role_arn,
                   'aws_role_ec2': aws_role_ec2}
-        self._avx_api_call('POST', 'setup_account_profile', params)
+        return self._api('POST', 'setup_account_profile', params)
 
     def setup_customer_id(self, customer_id):
         """
@@ -221,7 +778,7 @@ class Aviatrix(object):
         """
 
         params = {'customer_id': customer_id}
-        self._avx_api_call('GET', 'setup_customer_id', params)
+        return self._api('GET', 'setup_customer_id', params)
 
     def get_controller_public_ip(self):
         """
@@ -231,8 +788,7 @@ class Aviatrix(object):
         """
 
         params = {'public': 'yes'}
-        self._avx_api_call('POST', 'show_controller_ip', params, True)
-        return self.results['public_ip']
+        return self._api('POST', 'show_controller_ip', params, True, key='public_ip')
 
     CREATE_GW_ALLOWED = ['cloud_type', 'account_name', 'gw_name', 'vpc_reg',
                          'zone', 'vpc_net', 'vpc_size', 'vpc_id', 'enable_nat',
@@ -308,7 +864,7 @@ class Aviatrix(object):
         for key, value in kwargs.items():
             if key in Aviatrix.CREATE_GW_ALLOWED:
                 params[key] = value
-        self._avx_api_call('POST', 'connect_container', params)
+        return self._api('POST', 'connect_container', params)
 
     CREATE_SPOKE_GW_ALLOWED=['account_name', 'cloud_type', 'region', 'vpc_id', 'public_subnet', 'gw_name',
                              'gw_size', 'dns_server', 'nat_enabled', 'tags']
@@ -343,7 +899,7 @@ class Aviatrix(object):
         for key, value in kwargs.items():
             if key in Aviatrix.CREATE_SPOKE_GW_ALLOWED:
                 params[key] = value
-        self._avx_api_call('POST', 'create_spoke_gw', params)
+        return self._api('POST', 'create_spoke_gw', params)
 
     def delete_gateway(self, cloud_type, gw_name):
         """
@@ -354,8 +910,8 @@ class Aviatrix(object):
                            1024 (AWS China), 2048 (ARM China)
         gw_name - string - the name of the gateway to delete
         """
-        self._avx_api_call('GET', 'delete_container', {'cloud_type': cloud_type,
-                                                       'gw_name': gw_name})
+        return self._api('GET', 'delete_container', {'cloud_type': cloud_type,
+                                                     'gw_name': gw_name})
 
     def peering(self, vpc_name1, vpc_name2):
         """
@@ -364,8 +920,8 @@ class Aviatrix(object):
         vpc_name1 - string - name of the gateway
         vpc_name2 - string - name of the second gateway
         """
-        self._avx_api_call('GET', 'peer_vpc_pair', {'vpc_name1': vpc_name1,
-                                                    'vpc_name2': vpc_name2})
+        return self._api('GET', 'peer_vpc_pair', {'vpc_name1': vpc_name1,
+                                                  'vpc_name2': vpc_name2})
 
     def unpeering(self, vpc_name1, vpc_name2):
         """
@@ -374,8 +930,8 @@ class Aviatrix(object):
         vpc_name1 - string - name of the gateway
         vpc_name2 - string - name of the second gateway
         """
-        self._avx_api_call('GET', 'unpeer_vpc_pair', {'vpc_name1': vpc_name1,
-                                                      'vpc_name2': vpc_name2})
+        return self._api('GET', 'unpeer_vpc_pair', {'vpc_name1': vpc_name1,
+                                                    'vpc_name2': vpc_name2})
 
     def enable_vpc_ha(self, vpc_name, specific_subnet):
         """
@@ -386,7 +942,7 @@ class Aviatrix(object):
         """
         params = {'vpc_name': vpc_name,
                   'specific_subnet': specific_subnet}
-        self._avx_api_call('POST', 'enable_vpc_ha', params)
+        return self._api('POST', 'enable_vpc_ha', params)
 
     def disable_vpc_ha(self, vpc_name, specific_subnet):
         """
@@ -395,8 +951,8 @@ class Aviatrix(object):
         vpc_name - string - the name of the gateway
         specific_subnet - string -
         """
-        self._avx_api_call('POST', 'disable_vpc_ha', {'vpc_name': vpc_name,
-                                                      'specific_subnet': specific_subnet})
+        return self._api('POST', 'disable_vpc_ha', {'vpc_name': vpc_name,
+                                                    'specific_subnet': specific_subnet})
 
     def extended_vpc_peer(self, source, nexthop, reachable_cidr):
         """
@@ -409,7 +965,7 @@ class Aviatrix(object):
         params = {'source': source,
                   'nexthop': nexthop,
                   'reachable_cidr': reachable_cidr}
-        self._avx_api_call('POST', 'add_extended_vpc_peer', params)
+        return self._api('POST', 'add_extended_vpc_peer', params)
 
     def list_peers_vpc_pairs(self):
         """
@@ -425,8 +981,16 @@ class Aviatrix(object):
         Returns:
         the list of peers
         """
-        self._avx_api_call('GET', 'list_peer_vpc_pairs', {})
-        return self.results['pair_list']
+        return self._api('GET', 'list_peer_vpc_pairs', {}, key='pair_list')
+
+    def iter_peers(self):
+        """
+        Iterates over the peered gateways without loading the whole list in memory
+        Returns:
+        generator of peer objects
+        """
+        return self._avx_api_stream('GET', 'list_peer_vpc_pairs', {},
+                                    path=('results', 'pair_list'))
 
     def list_gateways(self, account_name):
         """
@@ -437,8 +1001,18 @@ class Aviatrix(object):
         the list of gateways
         """
         params = {'account_name': account_name}
-        self._avx_api_call('GET', 'list_vpcs_summary', params)
-        return self.results
+        return self._api('GET', 'list_vpcs_summary', params)
+
+    def iter_gateways(self, account_name):
+        """
+        Iterates over the gateways without loading the whole list in memory
+        Arguments:
+        account_name - string - the name of the cloud account
+        Returns:
+        generator of gateway objects
+        """
+        params = {'account_name': account_name}
+        return self._avx_api_stream('GET', 'list_vpcs_summary', params)
 
     def get_gateway_by_name(self, account_name, gw_name):
         """
@@ -448,8 +1022,19 @@ class Aviatrix(object):
         gw_name - string - the name of the gateway name
         Returns:
         matching gateway object or None if not found
+
+        When a gateway index is enabled (see enable_gateway_index()) the
+        gateway is looked up in the index instead of downloading the list.
+        """
+        if self.gateway_index is not None:
+            return self.gateway_index.get(gw_name)
+        return self._find_gateway(self.list_gateways(account_name), gw_name)
+
+    @staticmethod
+    def _find_gateway(gws, gw_name):
+        """
+        Finds a gateway by name in the output of list_gateways()
         """
-        gws = self.list_gateways(account_name)
         if not gws:
             return None
 
@@ -466,8 +1051,16 @@ class Aviatrix(object):
         Array of VPN user objects
         """
 
-        self._avx_api_call('GET', 'list_vpn_users', {})
-        return self.results
+        return self._api('GET', 'list_vpn_users', {})
+
+    def iter_vpn_users(self):
+        """
+        Iterates over the VPN users without loading the whole list in memory
+        Returns:
+        generator of VPN user objects
+        """
+
+        return self._avx_api_stream('GET', 'list_vpn_users', {})
 
     def delete_vpn_user(self, vpc_id, username):
         """
@@ -479,7 +1072,7 @@ class Aviatrix(object):
 
         params = {'vpc_id': vpc_id,
                   'username': username}
-        self._avx_api_call('GET', 'delete_vpn_user', params)
+        return self._api('GET', 'delete_vpn_user', params)
 
     def add_vpn_user(self, lb_name, vpc_id, username,
                      user_email=None,
@@ -509,7 +1102,7 @@ class Aviatrix(object):
             params['profile_name'] = profile_name
         if saml_endpoint:
             params['saml_endpoint'] = saml_endpoint
-        self._avx_api_call('POST', 'add_vpn_user', params, True)
+        return self._api('POST', 'add_vpn_user', params, True)
 
     def detach_vpn_user(self, vpc_id, username):
         """
@@ -522,7 +1115,7 @@ class Aviatrix(object):
         params = {'vpc_id_or_dns_name': vpc_id,
                   'username': username,
                   'dns': 'false'}
-        self._avx_api_call('POST', 'detach_vpn_user', params)
+        return self._api('POST', 'detach_vpn_user', params)
 
     def attach_vpn_user(self, lb_name, vpc_id, username,
                         user_email=None,
@@ -554,7 +1147,7 @@ class Aviatrix(object):
             params['profile_name'] = profile_name
         if saml_endpoint:
             params['saml_endpoint'] = saml_endpoint
-        self._avx_api_call('POST', 'attach_vpn_user', params)
+        return self._api('POST', 'attach_vpn_user', params)
 
     class StatName(object):
         """
@@ -596,7 +1189,7 @@ class Aviatrix(object):
         PROCESSES_WAITING_TO_RUN = 'nproc_running'
         PROCESSES_UNINTERRUPTABLE_SLEEP = 'nproc_non_int_sleep'
 
-    def get_gateway_statistic_over_time(self, gw_names, start, end, stat):
+    def get_gateway_statistic_over_time(self, gw_names, start, end, stat, as_arrays=False):
         """
         Gets statistics about one or more gateways during the given timeframe.
         Arguments:
@@ -604,9 +1197,11 @@ class Aviatrix(object):
         start - datetime - start time to return statistic
         end - datetime - end time to return statistic
         stat - enum.StatName - the statistic to return
+        as_arrays - bool - return NumPy arrays (requires numpy, see aviatrix.stats)
 
         Returns:
-        list of gateways with the data in an array
+        list of gateways with the data in an array, or with as_arrays a dict
+        of gateway name to aviatrix.stats.StatSeries
         """
 
         if isinstance(gw_names, str):
@@ -618,8 +1213,8 @@ class Aviatrix(object):
                   'ds_name': stat,
                   'db_id': 0,
                   'gw_name': gw_name}
-        self._avx_api_call('POST', 'get_statistics', params, True)
-        return self.results
+        return self._api('POST', 'get_statistics', params, True,
+                         convert=stats.to_arrays if as_arrays else None)
 
     def get_current_gateway_statistics(self, gw_name):
         """
@@ -632,8 +1227,7 @@ class Aviatrix(object):
         """
 
         params = {'gw_name': gw_name}
-        self._avx_api_call('POST', 'show_packets_stat_for_gw', params, True)
-        return self.results
+        return self._api('POST', 'show_packets_stat_for_gw', params, True)
 
     def enable_nat(self, gw_name):
         """
@@ -644,7 +1238,7 @@ class Aviatrix(object):
         """
 
         params = {'gw_name': gw_name}
-        self._avx_api_call('POST', 'enable_nat', params)
+        return self._api('POST', 'enable_nat', params)
 
     def disable_nat(self, gw_name):
         """
@@ -655,7 +1249,7 @@ class Aviatrix(object):
         """
 
         params = {'gw_name': gw_name}
-        self._avx_api_call('POST', 'disable_nat', params)
+        return self._api('POST', 'disable_nat', params)
 
     def add_fqdn_filter_tag(self, tag_name):
         """
@@ -665,7 +1259,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name}
-        self._avx_api_call('POST', 'add_fqdn_filter_tag', params)
+        return self._api('POST', 'add_fqdn_filter_tag', params)
 
     def delete_fqdn_filter_tag(self, tag_name):
         """
@@ -675,7 +1269,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name}
-        self._avx_api_call('POST', 'del_fqdn_filter_tag', params)
+        return self._api('POST', 'del_fqdn_filter_tag', params)
 
     def set_fqdn_filter_domain_list(self, tag_name, domains):
         """
@@ -687,7 +1281,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name, 'domain_names[]': domains}
-        self._avx_api_call('POST', 'set_fqdn_filter_tag_domain_names', params)
+        return self._api('POST', 'set_fqdn_filter_tag_domain_names', params)
 
     def get_fqdn_filter_domain_list(self, tag_name):
         """
@@ -697,8 +1291,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name}
-        self._avx_api_call('GET', 'list_fqdn_filter_tag_domain_names', params)
-        return self.results
+        return self._api('GET', 'list_fqdn_filter_tag_domain_names', params)
 
     def set_fqdn_filter_black_list(self, tag_name):
         """
@@ -708,7 +1301,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name, 'color': 'black'}
-        self._avx_api_call('POST', 'set_fqdn_filter_tag_color', params)
+        return self._api('POST', 'set_fqdn_filter_tag_color', params)
 
     def set_fqdn_filter_white_list(self, tag_name):
         """
@@ -718,7 +1311,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name, 'color': 'white'}
-        self._avx_api_call('POST', 'set_fqdn_filter_tag_color', params)
+        return self._api('POST', 'set_fqdn_filter_tag_color', params)
 
     def enable_fqdn_filter(self, tag_name):
         """
@@ -728,7 +1321,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name, 'status': 'enabled'}
-        self._avx_api_call('POST', 'set_fqdn_filter_tag_state', params)
+        return self._api('POST', 'set_fqdn_filter_tag_state', params)
 
     def disable_fqdn_filter(self, tag_name):
         """
@@ -738,7 +1331,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name, 'status': 'disabled'}
-        self._avx_api_call('POST', 'set_fqdn_filter_tag_state', params)
+        return self._api('POST', 'set_fqdn_filter_tag_state', params)
 
     def attach_fqdn_filter_to_gateway(self, tag_name, gw_name):
         """
@@ -749,7 +1342,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name, 'gw_name': gw_name}
-        self._avx_api_call('POST', 'attach_fqdn_filter_tag_to_gw', params)
+        return self._api('POST', 'attach_fqdn_filter_tag_to_gw', params)
 
     def detach_fqdn_filter_from_gateway(self, tag_name, gw_name):
         """
@@ -760,7 +1353,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name, 'gw_name': gw_name}
-        self._avx_api_call('POST', 'detach_fqdn_filter_tag_from_gw', params)
+        return self._api('POST', 'detach_fqdn_filter_tag_from_gw', params)
 
     def list_fqdn_filter_gateways(self, tag_name):
         """
@@ -772,8 +1365,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name}
-        self._avx_api_call('GET', 'list_fqdn_filter_tag_attached_gws', params)
-        return self.results
+        return self._api('GET', 'list_fqdn_filter_tag_attached_gws', params)
 
     def list_fqdn_filters(self):
         """
@@ -781,8 +1373,7 @@ class Aviatrix(object):
         """
 
         params = {}
-        self._avx_api_call('GET', 'list_fqdn_filter_tags', params)
-        return self.results
+        return self._api('GET', 'list_fqdn_filter_tags', params)
 
     def list_fw_tags(self):
         """
@@ -792,8 +1383,7 @@ class Aviatrix(object):
         """
 
         params = {}
-        self._avx_api_call('POST', 'list_policy_tags', params, True)
-        return self.results
+        return self._api('POST', 'list_policy_tags', params, True)
 
     def add_fw_tag(self, tag_name):
         """
@@ -803,7 +1393,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name}
-        self._avx_api_call('POST', 'add_policy_tag', params)
+        return self._api('POST', 'add_policy_tag', params)
 
     def delete_fw_tag(self, tag_name):
         """
@@ -813,7 +1403,7 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name}
-        self._avx_api_call('POST', 'del_policy_tag', params)
+        return self._api('POST', 'del_policy_tag', params)
 
     def get_fw_tag_members(self, tag_name):
         """
@@ -823,17 +1413,21 @@ class Aviatrix(object):
         """
 
         params = {'tag_name': tag_name}
-        self._avx_api_call('GET', 'list_policy_members', params)
-        return self.results['members']
+        return self._api('GET', 'list_policy_members', params, key='members')
 
-    def set_fw_tag_members(self, tag_name, members):
+    def set_fw_tag_members(self, tag_name, members, compact=False):
         """
         Sets the policies associated with the given tag.
         Arguments:
         tag_name - string - the name of the FW policy tag
         members - list[dict] - dict should include 'name', 'cidr'
+        compact - bool - remove duplicates and collapse overlapping or
+                         adjacent CIDRs into the fewest covering blocks
+                         (see fwtags.sync_tag_members() to skip no-op updates)
         """
 
+        if compact:
+            members = fwtags.compact_members(members)
         params = {'tag_name': tag_name}
         current = 0
         for member in members:
@@ -841,7 +1435,7 @@ class Aviatrix(object):
             params['new_policies[%d][cidr]' % (current)] = member['cidr']
             current = current + 1
 
-        self._avx_api_call('POST', 'update_policy_members', params)
+        return self._api('POST', 'update_policy_members', params)
 
     def get_fw_policy_full(self, gw_name):
         """
@@ -854,8 +1448,7 @@ class Aviatrix(object):
         """
 
         params = {'vpc_name': gw_name}
-        self._avx_api_call('GET', 'vpc_access_policy', params)
-        return self.results
+        return self._api('GET', 'vpc_access_policy', params)
 
     def set_fw_policy_security_rules(self, gw_name, rules):
         """
@@ -870,10 +1463,12 @@ class Aviatrix(object):
                s_ip/d_ip - valid CIDR or tag name
                port - single port or range ('25', '25:1024', etc.)
                log_enable is one of ('on', 'off')
+        NOTE: the rules are sent in the POST body; see fwpolicy.PolicyManager
+              to push only the gateways whose rules actually changed
         """
 
         params = {'vpc_name': gw_name, 'new_policy': json.dumps(rules)}
-        self._avx_api_call('GET', 'update_access_policy', params)
+        return self._api('POST', 'update_access_policy', params)
 
     def list_accounts(self):
 
@@ -882,8 +1477,7 @@ class Aviatrix(object):
         """
 
         params = {}
-        self._avx_api_call('GET', 'list_accounts', params)
-        return self.results
+        return self._api('GET', 'list_accounts', params)
 
     def list_spoke_gws(self):
         """
@@ -891,8 +1485,14 @@ class Aviatrix(object):
         """
 
         params = {}
-        self._avx_api_call('GET', 'list_spoke_gws', params)
-        return self.results
+        return self._api('GET', 'list_spoke_gws', params)
+
+    def iter_spoke_gws(self):
+        """
+        Iterates over the spoke gateways without loading the whole list in memory
+        """
+
+        return self._avx_api_stream('GET', 'list_spoke_gws', {})
 
     def list_public_subnets(self, account_name, region, vpc_id, cloud_type):
         """
@@ -909,8 +1509,7 @@ class Aviatrix(object):
                   'vpc_id': vpc_id,
                   'cloud_type': cloud_type
                   }
-        self._avx_api_call('GET', 'list_public_subnets', params)
-        return self.results
+        return self._api('GET', 'list_public_subnets', params)
 
     def list_spoke_gw_supported_sizes(self):
         """
@@ -920,8 +1519,7 @@ class Aviatrix(object):
                 the list of supported gateway sizes
                 """
         params = {}
-        self._avx_api_call('GET', 'list_spoke_gw_supported_sizes', params)
-        return self.results
+        return self._api('GET', 'list_spoke_gw_supported_sizes', params)
 
     def list_transit_gws(self):
         """
@@ -931,8 +1529,14 @@ class Aviatrix(object):
                 the list of supported gateway sizes
                 """
         params = {}
-        self._avx_api_call('GET', 'list_transit_gws', params)
-        return self.results
+        return self._api('GET', 'list_transit_gws', params)
+
+    def iter_transit_gws(self):
+        """
+        Iterates over the transit gateways without loading the whole list in memory
+        """
+
+        return self._avx_api_stream('GET', 'list_transit_gws', {})
 
     def enable_single_az_ha(self, gw_name):
         """
@@ -942,7 +1546,7 @@ class Aviatrix(object):
         """
 
         params = {'gw_name': gw_name}
-        self._avx_api_call('POST', 'enable_single_az_ha', params)
+        return self._api('POST', 'enable_single_az_ha', params)
 
     def enable_spoke_ha(self, gw_name, public_subnet):
         """
@@ -953,7 +1557,7 @@ class Aviatrix(object):
         """
 
         params = {'gw_name': gw_name, 'public_subnet': public_subnet}
-        self._avx_api_call('POST', 'enable_spoke_ha', params)
+        return self._api('POST', 'enable_spoke_ha', params)
 
     def attach_spoke_to_transit_gw(self, spoke_gw, transit_gw):
         """
@@ -964,4 +1568,4 @@ class Aviatrix(object):
         """
 
         params = {'spoke_gw': spoke_gw, 'transit_gw': transit_gw}
-        self._avx_api_call('POST', 'attach_spoke_to_transit_gw', params)
\ No newline at end of file
+        return self._api('POST', 'attach_spoke_to_transit_gw', params)
\ No newline at end of file
@@ -0,0 +1,608 @@
+"""
+asyncio flavour of the Aviatrix SDK
+
+Usage:
+
+import asyncio
+from aviatrix.aio import AsyncAviatrix
+
+async def main():
+    controller = AsyncAviatrix(controller_ip, max_concurrency=200)
+    await controller.login(username, password)
+    gws = await controller.list_gateways('admin')
+    stats = await asyncio.gather(*[controller.get_current_gateway_statistics(gw['vpc_name'])
+                                   for gw in gws])
+    async for user in controller.iter_vpn_users():
+        print(user['_id'])
+    controller.close()
+
+asyncio.run(main())
+"""
+
+import asyncio
+import collections
+import contextlib
+import http.client
+import io
+import logging
+import time
+import urllib.error
+
+from . import Aviatrix
+from .batch import BatchResult, bound_method, to_batch_call
+from .index import AsyncGatewayIndex
+from .retry import is_read_action
+from .stream import aiter_json_path
+from .tracing import CallTrace
+
+
+class AsyncHTTPResponse(object):
+    """
+    Response returned by AsyncHTTPSConnectionPool.open(), whose body is read
+    incrementally with read()
+    Attributes:
+    status - int - HTTP status code
+    reason - string - HTTP reason phrase
+    headers - http.client.HTTPMessage - response headers
+    keep_alive - bool - whether the connection may be reused
+    complete - bool - whether the whole body has been read
+    received - int - bytes of the body read so far
+    """
+
+    def __init__(self, reader, writer, status, reason, headers, keep_alive, timeout=None):
+        self.reader = reader
+        self.writer = writer
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.received = 0
+        self._chunked = headers.get('Transfer-Encoding', '').lower() == 'chunked'
+        self._chunk_left = 0
+        if status in (204, 304) or status < 200:
+            # never a body; reading to the end would wait for the server to
+            # close the kept alive connection
+            self._length = 0
+        elif self._chunked or headers.get('Content-Length') is None:
+            self._length = None
+        else:
+            self._length = int(headers['Content-Length'])
+        if self._length is None and not self._chunked:
+            # the body ends when the server closes the connection, so it is
+            # never pooled (see RFC 9112 section 6.3)
+            self.keep_alive = False
+        self.complete = self._length == 0
+
+    @classmethod
+    async def read_head(cls, status_line, reader, writer, timeout=None):
+        """
+        Reads the headers following the status line
+        Returns:
+        AsyncHTTPResponse
+        """
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b''.join(header_lines) + b'\r\n'))
+        connection = headers.get('Connection', '').lower()
+        keep_alive = connection != 'close' and (version != 'HTTP/1.0' or connection == 'keep-alive')
+        return cls(reader, writer, int(status), reason, headers, keep_alive, timeout)
+
+    async def read(self, size=-1):
+        """
+        Reads up to size bytes of the body (all of it, or the next chunk of
+        a chunked body, if size is negative)
+        Returns:
+        bytes (b'' at the end of the body)
+        """
+        if self.complete:
+            return b''
+        if self.timeout is None:
+            data = await self._read(size)
+        else:
+            data = await asyncio.wait_for(self._read(size), self.timeout)
+        self.received += len(data)
+        return data
+
+    async def read_all(self):
+        """
+        Returns:
+        the rest of the body (bytes)
+        """
+        chunks = []
+        while True:
+            data = await self.read()
+            if not data:
+                return b''.join(chunks)
+            chunks.append(data)
+
+    async def _read(self, size):
+        if self._chunked:
+            if not self._chunk_left:
+                self._chunk_left = int((await self.reader.readline()).split(b';')[0], 16)
+                if not self._chunk_left:
+                    # skip trailers
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    self.complete = True
+                    return b''
+            data = await self.reader.readexactly(
+                self._chunk_left if size < 0 else min(size, self._chunk_left))
+            self._chunk_left -= len(data)
+            if not self._chunk_left:
+                await self.reader.readline()
+            return data
+        if self._length is not None:
+            data = await self.reader.readexactly(self._length if size < 0 else min(size, self._length))
+            self._length -= len(data)
+            self.complete = not self._length
+            return data
+        data = await self.reader.read(size)
+        self.complete = not data
+        return data
+
+
+class AsyncHTTPSConnectionPool(object):
+    """
+    Non-blocking pool of keep-alive HTTPS connections to a single host,
+    built on asyncio streams.  The number of requests in flight is bounded by
+    max_concurrency.
+    """
+
+    def __init__(self, host, context, max_concurrency=100, pool_size=100,
+                 idle_timeout=60, timeout=None):
+        """
+        Constructor
+        Arguments:
+        host - string - host name or IP address (optionally host:port)
+        context - ssl.SSLContext - SSL settings used for every connection
+        max_concurrency - int - maximum number of requests in flight
+        pool_size - int - maximum number of idle connections kept open
+        idle_timeout - int - seconds an idle connection is kept open
+        timeout - float - timeout in seconds for a single request (None to wait forever)
+        """
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+        self.host = host
+        name, _, port = host.rpartition(':')
+        if name and port.isdigit():
+            self._address = (name.strip('[]'), int(port))
+        else:
+            self._address = (host, 443)
+        self.context = context
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = collections.deque()
+        self._loop = None
+        self._semaphore = None
+
+    def _bind_loop(self):
+        """
+        Connections and the semaphore belong to one event loop; start over
+        when the pool is used from a new loop (e.g. a second asyncio.run()).
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            if self._loop is not None and self._loop.is_closed():
+                # their transports can no longer be closed; let them go
+                self._idle.clear()
+            self.close()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _get_connection(self):
+        """
+        Returns (reader, writer, reused) for an idle or a new connection
+        """
+        now = time.monotonic()
+        while self._idle:
+            reader, writer, last_used = self._idle.pop()
+            if now - last_used <= self.idle_timeout and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self._address[0], self._address[1],
+                                                       ssl=self.context,
+                                                       server_hostname=self._address[0])
+        return reader, writer, False
+
+    def _put_connection(self, reader, writer):
+        """
+        Returns a connection to the pool (or closes it if the pool is full)
+        """
+        if len(self._idle) < self.pool_size:
+            self._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    async def request(self, method, url, body=None, headers=None, trace=None, idempotent=False):
+        """
+        Sends a request and reads the complete response body.
+        Arguments:
+        method - string - GET/POST
+        url - string - path and query string of the request
+        body - bytes - request body (or None)
+        headers - dict - additional request headers
+        trace - CallTrace - (optional) receives the timing of the phases
+        idempotent - bool - see open()
+        Returns:
+        the response body (bytes)
+        """
+        if self.timeout is None:
+            return await self._request(method, url, body, headers, trace, idempotent)
+        return await asyncio.wait_for(self._request(method, url, body, headers, trace, idempotent),
+                                      self.timeout)
+
+    async def _request(self, method, url, body, headers, trace=None, idempotent=False):
+        response = await self.open(method, url, body, headers, trace, idempotent)
+        started = time.monotonic()
+        try:
+            payload = await response.read_all()
+        finally:
+            self.release(response)
+        if trace is not None:
+            trace.add('transfer', time.monotonic() - started)
+            trace.response_bytes = len(payload)
+        return payload
+
+    async def open(self, method, url, body=None, headers=None, trace=None, idempotent=False):
+        """
+        Sends a request and returns the response without reading the body.
+        The request keeps one of the max_concurrency slots until the caller
+        calls release() with the response, once the body has been consumed.
+        Arguments:
+        method - string - GET/POST
+        url - string - path and query string of the request
+        body - bytes - request body (or None)
+        headers - dict - additional request headers
+        trace - CallTrace - (optional) receives the connection setup and
+                            time to first byte
+        idempotent - bool - the request may be sent again if a reused
+                            connection fails after it was sent; otherwise
+                            it is only resent when it could not be sent
+        Returns:
+        AsyncHTTPResponse
+        """
+        self._bind_loop()
+        await self._semaphore.acquire()
+        try:
+            if self.timeout is None:
+                response = await self._open(method, url, body, headers or {}, trace, idempotent)
+            else:
+                response = await asyncio.wait_for(
+                    self._open(method, url, body, headers or {}, trace, idempotent), self.timeout)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        if response.status >= 400:
+            try:
+                payload = await response.read_all()
+            finally:
+                self.release(response)
+            raise urllib.error.HTTPError('https://{0}{1}'.format(self.host, url),
+                                         response.status, response.reason, response.headers,
+                                         io.BytesIO(payload))
+        return response
+
+    def release(self, response):
+        """
+        Hands the connection of a response back to the pool (or closes it if
+        the body was not consumed) and frees the request's slot
+        Arguments:
+        response - AsyncHTTPResponse - response returned by open()
+        """
+        if response.complete and response.keep_alive:
+            self._put_connection(response.reader, response.writer)
+        else:
+            response.writer.close()
+        self._semaphore.release()
+
+    async def _open(self, method, url, body, headers, trace=None, idempotent=False):
+        while True:
+            started = time.monotonic()
+            reader, writer, reused = await self._get_connection()
+            connected = time.monotonic()
+            sent = False
+            try:
+                writer.write(self._format_request(method, url, body, headers))
+                await writer.drain()
+                sent = True
+                status_line = await reader.readline()
+                if not status_line:
+                    raise http.client.RemoteDisconnected('Remote end closed connection without response')
+            except (http.client.RemoteDisconnected, ConnectionError) as err:
+                writer.close()
+                # once sent, the controller may have acted on the request
+                # before the connection failed
+                if not reused or (sent and not idempotent):
+                    raise
+                logging.debug('Reconnecting to {0} after stale connection: {1}'.format(self.host, err))
+                continue
+            except BaseException:
+                # timeouts and cancellation leave the exchange half done
+                writer.close()
+                raise
+            try:
+                response = await AsyncHTTPResponse.read_head(status_line, reader, writer,
+                                                             self.timeout)
+            except BaseException:
+                writer.close()
+                raise
+            if trace is not None:
+                trace.attempts += 1
+                trace.reused = reused
+                trace.add('connect', connected - started)
+                trace.add('ttfb', time.monotonic() - connected)
+            return response
+
+    def _format_request(self, method, url, body, headers):
+        """
+        Serializes an HTTP/1.1 request
+        """
+        lines = ['{0} {1} HTTP/1.1'.format(method, url),
+                 'Host: {0}'.format(self.host),
+                 'Accept-Encoding: identity',
+                 'Connection: keep-alive']
+        if body is not None:
+            lines.append('Content-Length: {0}'.format(len(body)))
+        for name, value in headers.items():
+            lines.append('{0}: {1}'.format(name, value))
+        data = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        if body is not None:
+            data += body
+        return data
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+class AsyncAviatrix(Aviatrix):
+    """
+    Aviatrix client whose API methods are coroutines.  It inherits every
+    action (and its parameters) from the Aviatrix class and only replaces the
+    request layer with a non-blocking transport.  The streaming iter_*
+    methods return async generators.
+    """
+
+    def __init__(self, controller_ip, max_concurrency=100, pool_size=100,
+                 idle_timeout=60, timeout=None, keep_results=False, cache=None,
+                 session_store=None, relogin=None, retry=None, circuit_breaker=None,
+                 governor=None, metrics=None, tracer=None):
+        """
+        Constructor
+        Arguments:
+        controller_ip - string - host name or IP address of Aviatrix Controller
+        max_concurrency - int - maximum number of requests in flight
+        pool_size - int - maximum number of idle keep-alive connections
+        idle_timeout - int - seconds before an idle connection is closed
+        timeout - float - timeout in seconds for a single request
+        keep_results - bool - keep the last response in self.result and self.results
+        cache - ResponseCache - (optional) cache for read-only list actions
+        session_store - SessionStore - (optional) reuse the CID of an earlier login
+        relogin - bool - log in again when the controller rejects the CID
+        retry - RetryPolicy - (optional) retry transient failures
+        circuit_breaker - CircuitBreaker - (optional) fail fast while the controller keeps failing
+        governor - ControllerGovernor - (optional) rate and in-flight limits
+        metrics - MetricsSink - (optional) receives a RequestSample per request
+        tracer - Tracer - (optional) receives a CallTrace per request; the
+                          connection setup is reported as a whole under
+                          'connect' (asyncio does not split DNS and TLS)
+        """
+        super(AsyncAviatrix, self).__init__(controller_ip, keep_results=keep_results,
+                                            cache=cache, session_store=session_store,
+                                            relogin=relogin, retry=retry,
+                                            circuit_breaker=circuit_breaker,
+                                            governor=governor, metrics=metrics,
+                                            tracer=tracer)
+        # created in the event loop that first needs it (see _relogin_lock())
+        self._async_login_lock = None
+        self._async_login_loop = None
+        self.transport = AsyncHTTPSConnectionPool(controller_ip, self.ctx,
+                                                  max_concurrency=max_concurrency,
+                                                  pool_size=pool_size,
+                                                  idle_timeout=idle_timeout,
+                                                  timeout=timeout)
+
+    async def _avx_api_call(self, method, action, parameters, is_backend=False):
+        """
+        Coroutine version of Aviatrix._avx_api_call()
+        """
+        return await self._run_steps(self._call_steps(method, action, parameters, is_backend))
+
+    async def _send(self, method, action, parameters, is_backend=False):
+        """
+        Coroutine version of Aviatrix._send()
+        """
+        return await self._run_steps(self._request_steps(method, action, parameters, is_backend))
+
+    def _relogin_lock(self):
+        """
+        Returns the asyncio.Lock serializing relogins, bound to the running
+        event loop
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._async_login_loop:
+            self._async_login_loop = loop
+            self._async_login_lock = asyncio.Lock()
+        return self._async_login_lock
+
+    async def _relogin(self, customer_id):
+        """
+        Coroutine version of Aviatrix._relogin()
+        """
+        async with self._relogin_lock():
+            if self.customer_id == customer_id:
+                self._login_response(await self._send('GET', 'login', self._login_parameters()))
+
+    def _io(self, step):
+        """
+        Returns:
+        the coroutine function performing a step of Aviatrix._call_steps()
+        """
+        if step == 'sleep':
+            return asyncio.sleep
+        if step == 'acquire':
+            return self.governor.acquire_async
+        if step == 'relogin':
+            return self._relogin
+        # 'request' or 'open'
+        return getattr(self.transport, step)
+
+    async def _run_steps(self, steps):
+        """
+        Coroutine version of Aviatrix._run_steps()
+        """
+        value = error = None
+        while True:
+            try:
+                step, args = steps.send(value) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = await self._io(step)(*args), None
+            except BaseException as err:  # pylint: disable=broad-except
+                value, error = None, err
+
+    async def _avx_api_stream(self, method, action, parameters, is_backend=False,
+                              path=('results',)):
+        """
+        Async generator version of Aviatrix._avx_api_stream(), so the iter_*
+        methods return async generators (iterate them with async for).  The
+        governor slot and the connection are held until the body is consumed
+        or the generator is closed (e.g. with contextlib.aclosing()).
+        """
+        customer_id = self.customer_id
+        started = False
+        try:
+            # closed explicitly: async generators are otherwise only
+            # finalized by the garbage collector
+            async with contextlib.aclosing(self._stream(method, action, parameters, is_backend,
+                                                        path)) as items:
+                async for item in items:
+                    started = True
+                    yield item
+            return
+        except Aviatrix.RESTException as err:
+            # nothing was handed to the caller yet, so the request can be replayed
+            if started or not self._should_relogin(action, err):
+                raise
+        await self._relogin(customer_id)
+        async with contextlib.aclosing(self._stream(method, action, parameters, is_backend,
+                                                    path)) as items:
+            async for item in items:
+                yield item
+
+    async def _stream(self, method, action, parameters, is_backend, path):
+        """
+        Async generator version of Aviatrix._stream()
+        """
+        url, data, headers = self._build_request(method, action, parameters, is_backend)
+        logging.debug('[{0}] streaming HTTP Response'.format(url))
+        trace = None
+        if self.tracer is not None:
+            trace = CallTrace(action, 'backend1' if is_backend else 'api', method)
+        start = time.monotonic()
+        response = None
+        error = None
+        try:
+            response = await self._run_steps(self._retry_steps(
+                action, is_backend, 'open', (method, url, data, headers, trace, is_read_action(action)),
+                hold_slot=True))
+            try:
+                envelope = {}
+                checked = False
+                async for item in aiter_json_path(response, path, envelope):
+                    if not checked:
+                        # the members read so far precede the array
+                        self._check_envelope(envelope)
+                        checked = True
+                    yield item
+                self._check_envelope(envelope)
+            finally:
+                self.transport.release(response)
+                if self.governor is not None:
+                    self.governor.release()
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            if self.metrics is not None or trace is not None:
+                received = response.received if response is not None else 0
+                if trace is not None:
+                    trace.response_bytes = received
+                self._observe(action, is_backend, method, url, data, start, received, trace, error)
+
+    async def _api(self, method, action, parameters, is_backend=False, key=None, on_response=None,
+                   convert=None):
+        """
+        Coroutine version of Aviatrix._api()
+        """
+        result = await self._avx_api_call(method, action, parameters, is_backend)
+        return self._extract(result, key, on_response, convert)
+
+    async def login(self, username, password):
+        """
+        Coroutine version of Aviatrix.login()
+        """
+        if not username or not password:
+            raise ValueError('Username and password are required')
+        self._credentials = (username, password)
+        if self._restore_session():
+            return None
+        return await self._api('GET', 'login', self._login_parameters(),
+                               on_response=self._login_response)
+
+    async def enable_gateway_index(self, max_age=300):
+        """
+        Coroutine version of Aviatrix.enable_gateway_index(); the index is
+        an AsyncGatewayIndex whose lookups are coroutines
+        """
+        index = AsyncGatewayIndex(self, max_age)
+        await index.refresh()
+        self.gateway_index = index
+        return index
+
+    async def get_gateway_by_name(self, account_name, gw_name):
+        """
+        Gets a gateway by name
+        Arguments:
+        account_name - string - the name of the cloud account
+        gw_name - string - the name of the gateway name
+        Returns:
+        matching gateway object or None if not found
+
+        When a gateway index is enabled (see enable_gateway_index()) the
+        gateway is looked up in the index instead of downloading the list.
+        """
+        if self.gateway_index is not None:
+            return await self.gateway_index.get(gw_name)
+        return self._find_gateway(await self.list_gateways(account_name), gw_name)
+
+    async def batch(self, calls, max_workers=None):
+        """
+        Coroutine version of Aviatrix.batch().  Concurrency is bounded by the
+        client's max_concurrency unless max_workers is lower.
+        """
+        calls = [to_batch_call(call) for call in calls]
+        funcs = [bound_method(self, call) for call in calls]
+        limit = asyncio.Semaphore(max_workers or self.transport.max_concurrency)
+
+        async def execute(func, call):
+            async with limit:
+                try:
+                    return BatchResult(call, await func(*call.args, **call.kwargs), None)
+                except Exception as err:  # pylint: disable=broad-except
+                    return BatchResult(call, None, err)
+
+        return list(await asyncio.gather(*[execute(func, call)
+                                           for func, call in zip(funcs, calls)]))
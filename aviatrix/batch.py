@@ -0,0 +1,97 @@
+"""
+Concurrent execution of many Aviatrix API calls over a bounded pool of
+worker threads sharing one logged in client.
+
+Usage:
+
+calls = [BatchCall('get_current_gateway_statistics', (gw['vpc_name'],))
+         for gw in controller.list_gateways('admin')]
+for item in controller.batch(calls, max_workers=32):
+    if item.ok:
+        print(item.value)
+    else:
+        print('{0} failed: {1}'.format(item.call.args, item.error))
+"""
+
+import collections
+import concurrent.futures
+
+
+class BatchCall(collections.namedtuple('BatchCall', ['method', 'args', 'kwargs'])):
+    """
+    A single call of a public client method
+    Attributes:
+    method - string - name of the method (e.g. 'get_fw_policy_full')
+    args - tuple - positional arguments
+    kwargs - dict - keyword arguments
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, method, args=(), kwargs=None):
+        return super(BatchCall, cls).__new__(cls, method, tuple(args), dict(kwargs or {}))
+
+
+class BatchResult(collections.namedtuple('BatchResult', ['call', 'value', 'error'])):
+    """
+    Outcome of a BatchCall
+    Attributes:
+    call - BatchCall - the call that was executed
+    value - the value returned by the method (None on error)
+    error - Exception - the exception raised by the method (None on success)
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """
+        True if the call succeeded
+        """
+        return self.error is None
+
+
+def to_batch_call(call):
+    """
+    Accepts a BatchCall, a method name, or a (method, args[, kwargs]) tuple
+    """
+    if isinstance(call, BatchCall):
+        return call
+    if isinstance(call, str):
+        return BatchCall(call)
+    return BatchCall(*call)
+
+
+def bound_method(client, call):
+    """
+    Looks up the public client method named by the call
+    """
+    if call.method.startswith('_') or not callable(getattr(client, call.method, None)):
+        raise ValueError('Invalid batch method {}'.format(call.method))
+    return getattr(client, call.method)
+
+
+def _execute(func, call):
+    try:
+        return BatchResult(call, func(*call.args, **call.kwargs), None)
+    except Exception as err:  # pylint: disable=broad-except
+        return BatchResult(call, None, err)
+
+
+def run_batch(client, calls, max_workers=16):
+    """
+    Runs the given calls concurrently on the client.
+    Arguments:
+    client - Aviatrix - a logged in client
+    calls - iterable - BatchCall objects, method names or (method, args[, kwargs]) tuples
+    max_workers - int - maximum number of calls in flight
+    Returns:
+    list of BatchResult in the same order as calls
+    """
+    calls = [to_batch_call(call) for call in calls]
+    funcs = [bound_method(client, call) for call in calls]
+    if not calls:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as pool:
+        futures = [pool.submit(_execute, func, call) for func, call in zip(funcs, calls)]
+        return [future.result() for future in futures]
@@ -0,0 +1,140 @@
+"""
+Response cache for read-only Aviatrix API actions.
+"""
+
+import collections
+import threading
+import time
+
+
+class ResponseCache(object):
+    """
+    Thread safe, size bounded (LRU) cache of raw API responses keyed by
+    controller, action name and parameters, with a time-to-live per action.
+    One cache may be shared by the clients of several controllers.
+
+    Every invalidation starts a new generation.  A response read before an
+    invalidation finished is stale, so put() drops it when given the
+    generation() taken before the request was sent.
+
+    Usage:
+
+    controller = Aviatrix(controller_ip, cache=ResponseCache(ttl=60,
+                                                             ttls={'list_vpcs_summary': 15}))
+    """
+
+    def __init__(self, maxsize=256, ttl=60, ttls=None):
+        """
+        Constructor
+        Arguments:
+        maxsize - int - maximum number of responses kept
+        ttl - float - default time-to-live in seconds
+        ttls - dict - time-to-live per action name, overriding ttl
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(action, parameters, controller_ip=None):
+        """
+        Builds the cache key for an API call
+        Arguments:
+        action - string - the action name
+        parameters - dict - the action parameters
+        controller_ip - string - the controller the call is sent to
+        """
+        return (action, controller_ip, tuple(sorted((str(name), str(value))
+                                                    for name, value in parameters.items())))
+
+    def generation(self):
+        """
+        Returns:
+        the current invalidation generation, to pass to put()
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """
+        Looks up a cached response
+        Arguments:
+        key - tuple - a key built by ResponseCache.key()
+        Returns:
+        the cached response body or None on a miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, response, generation=None):
+        """
+        Stores a response
+        Arguments:
+        key - tuple - a key built by ResponseCache.key()
+        response - bytes - the response body
+        generation - int - (optional) generation() before the request was
+                           sent; the response is dropped if an invalidation
+                           happened since
+        """
+        ttl = self.ttls.get(key[0], self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, actions, controller_ip=None):
+        """
+        Drops every cached response of the given actions
+        Arguments:
+        actions - iterable - action names
+        controller_ip - string - (optional) only drop the responses of this
+                                 controller
+        """
+        actions = set(actions)
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[0] in actions and
+                        (controller_ip is None or key[1] == controller_ip)]:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Drops all cached responses
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+        dict with the hit, miss and eviction counters and the current size
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'size': len(self._entries)}
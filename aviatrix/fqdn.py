@@ -0,0 +1,234 @@
+"""
+Local evaluation of FQDN filters.
+
+The domain lists of FQDN filter tags are compiled into one trie keyed by
+the labels of the names in reverse order ('www.google.com' is found under
+com -> google -> www).  A hostname is matched by walking its labels from
+the top level domain down, collecting the wildcard entries ('*.google.com')
+met on the way and the exact entry at the end, so the cost depends on the
+number of labels of the hostname, not on the number of entries.
+
+A hostname is allowed when no black list tag matches it and, if there are
+white list tags, at least one of them matches it.  Every verdict names the
+tags and entries that matched, so a filter change can be tested against
+proxy logs before it is enabled with enable_fqdn_filter().
+
+Usage:
+
+current = FqdnMatcher.from_controller(controller, {'prod': 'white'})
+proposed = FqdnMatcher()
+proposed.add_tag('prod', new_domains, 'white')
+for hostname, before, after in changed_hosts(current, proposed, hostnames):
+    print(hostname, before.allowed, '->', after.allowed, after.matches)
+"""
+
+import collections
+
+BLACK = 'black'
+WHITE = 'white'
+
+# trie keys of the entries ending at a node (not strings, so never a label)
+_EXACT = 0
+_WILDCARD = 1
+
+
+class FqdnMatch(collections.namedtuple('FqdnMatch', ['tag', 'color', 'entry'])):
+    """
+    An entry of a tag matching a hostname
+    Attributes:
+    tag - string - the FQDN filter tag
+    color - string - BLACK or WHITE
+    entry - string - the matching domain entry (e.g. '*.google.com')
+    """
+
+    __slots__ = ()
+
+
+class FqdnVerdict(collections.namedtuple('FqdnVerdict', ['hostname', 'allowed', 'matches'])):
+    """
+    Result of the evaluation of a hostname
+    Attributes:
+    hostname - string - the normalized hostname
+    allowed - bool - whether the filters let the hostname through
+    matches - tuple - FqdnMatch of every tag matching the hostname (the most
+                      specific entry of each tag)
+    """
+
+    __slots__ = ()
+
+
+def normalize_hostname(hostname):
+    """
+    Lower cases a hostname and removes a trailing dot or :port
+    """
+    hostname = hostname.strip().lower()
+    if hostname.count(':') == 1:
+        hostname = hostname.split(':', 1)[0]
+    return hostname.rstrip('.')
+
+
+def _domain_entry(entry):
+    """
+    Returns:
+    the domain of a list entry (a string or a dict with 'fqdn')
+    """
+    if isinstance(entry, dict):
+        entry = entry.get('fqdn') or entry.get('domain') or ''
+    return entry.strip().lower().rstrip('.')
+
+
+class FqdnMatcher(object):
+    """
+    Compiled domain lists of FQDN filter tags
+    """
+
+    def __init__(self, cache_size=100000):
+        """
+        Constructor
+        Arguments:
+        cache_size - int - number of verdicts kept for repeated hostnames
+                           (0 disables the cache)
+        """
+        self.tags = collections.OrderedDict()
+        self.cache_size = cache_size
+        self._root = {}
+        self._cache = {}
+
+    def add_tag(self, tag_name, domains, color=WHITE):
+        """
+        Adds the domain list of a tag
+        Arguments:
+        tag_name - string - the FQDN filter tag
+        domains - list - output of get_fqdn_filter_domain_list() or domain
+                         strings such as '*.google.com' and 'cnn.com'
+        color - string - BLACK or WHITE
+        """
+        color = str(color).lower()
+        if color not in (BLACK, WHITE):
+            raise ValueError('Invalid FQDN filter color {0!r}'.format(color))
+        if tag_name in self.tags:
+            raise ValueError('FQDN filter tag {0} already added'.format(tag_name))
+        self.tags[tag_name] = color
+        for entry in domains or ():
+            domain = _domain_entry(entry)
+            if not domain:
+                continue
+            labels = domain.split('.')
+            wildcard = labels[0] == '*'
+            if wildcard:
+                labels = labels[1:]
+            node = self._root
+            for label in reversed(labels):
+                node = node.setdefault(label, {})
+            # the most recently added entry of a tag wins on duplicates
+            node.setdefault(_WILDCARD if wildcard else _EXACT, {})[tag_name] = domain
+        self._cache.clear()
+
+    @classmethod
+    def from_controller(cls, controller, tags, max_workers=16):
+        """
+        Fetches the domain lists of tags concurrently and compiles them
+        Arguments:
+        controller - Aviatrix - a logged in client
+        tags - dict - tag name to its color (BLACK or WHITE)
+        max_workers - int - maximum number of calls in flight
+        Returns:
+        FqdnMatcher
+        """
+        matcher = cls()
+        calls = [('get_fqdn_filter_domain_list', (tag_name,)) for tag_name in tags]
+        for item in controller.batch(calls, max_workers=max_workers):
+            if not item.ok:
+                raise item.error
+            tag_name = item.call.args[0]
+            domains = item.value
+            if isinstance(domains, dict):
+                domains = domains.get('domain_names') or domains.get('domains') or []
+            matcher.add_tag(tag_name, domains, tags[tag_name])
+        return matcher
+
+    def match(self, hostname):
+        """
+        Arguments:
+        hostname - string - a hostname
+        Returns:
+        tuple of FqdnMatch, one per matching tag, in the order tags were added
+        """
+        labels = normalize_hostname(hostname).split('.')
+        found = {}
+        node = self._root
+        for position in range(len(labels) - 1, -1, -1):
+            node = node.get(labels[position])
+            if node is None:
+                break
+            if position and _WILDCARD in node:
+                # a wildcard covers the names below it, not the domain itself
+                found.update(node[_WILDCARD])
+        else:
+            if _EXACT in node:
+                found.update(node[_EXACT])
+        if _WILDCARD in self._root and labels != ['']:
+            for tag_name, entry in self._root[_WILDCARD].items():
+                found.setdefault(tag_name, entry)
+        return tuple(FqdnMatch(tag_name, color, found[tag_name])
+                     for tag_name, color in self.tags.items() if tag_name in found)
+
+    def evaluate(self, hostname):
+        """
+        Evaluates a hostname against all the tags
+        Arguments:
+        hostname - string - a hostname
+        Returns:
+        FqdnVerdict
+        """
+        hostname = normalize_hostname(hostname)
+        verdict = self._cache.get(hostname)
+        if verdict is not None:
+            return verdict
+        matches = self.match(hostname)
+        colors = set(match.color for match in matches)
+        if BLACK in colors:
+            allowed = False
+        elif WHITE in self.tags.values():
+            allowed = WHITE in colors
+        else:
+            allowed = True
+        verdict = FqdnVerdict(hostname, allowed, matches)
+        if self.cache_size:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[hostname] = verdict
+        return verdict
+
+    def evaluate_many(self, hostnames):
+        """
+        Arguments:
+        hostnames - iterable - hostnames (e.g. read from proxy logs)
+        Returns:
+        generator of FqdnVerdict in the order of hostnames
+        """
+        for hostname in hostnames:
+            yield self.evaluate(hostname)
+
+
+def changed_hosts(current, proposed, hostnames):
+    """
+    Finds the hostnames whose verdict a filter change would flip
+    Arguments:
+    current - FqdnMatcher - the filters in place
+    proposed - FqdnMatcher - the changed filters
+    hostnames - iterable - hostnames (e.g. read from proxy logs)
+    Returns:
+    generator of (hostname, current FqdnVerdict, proposed FqdnVerdict),
+    once per distinct hostname
+    """
+    seen = set()
+    for hostname in hostnames:
+        hostname = normalize_hostname(hostname)
+        if hostname in seen:
+            continue
+        seen.add(hostname)
+        before = current.evaluate(hostname)
+        after = proposed.evaluate(hostname)
+        if before.allowed != after.allowed:
+            yield hostname, before, after
@@ -0,0 +1,431 @@
+"""
+Shadowing and redundancy analysis of firewall rules.
+
+Every rule is described by the flows it matches: a protocol, a port
+interval and the address ranges of its source and destination (tags are
+resolved to the ranges of their members).  Comparing these spaces pairwise
+finds:
+
+ - shadowed rules: covered by an earlier rule with the opposite action, so
+   they never match and their intent is not applied
+ - redundant rules: covered by an earlier rule with the same action (they
+   never match), or covered by a later rule or the base policy with the
+   same action and no conflicting rule in between
+ - mergeable rules: two rules with the same action differing only in one
+   source/destination CIDR or port range whose union is a single CIDR or
+   range, with no conflicting rule in between
+
+Removing the rules that never match or are redundant and merging the
+mergeable ones gives a shorter rule list with the same first-match result
+for every flow.  Across a fleet, rules and whole policies repeated on
+several gateways are reported as well.
+
+Usage:
+
+fleet = analyze_fleet(controller, [gw['vpc_name'] for gw in controller.list_gateways('admin')])
+print(fleet.describe())
+PolicyManager(controller).sync(fleet.minimized())
+"""
+
+import bisect
+import collections
+
+from .fweval import fetch_tag_members
+from .fwpolicy import PolicyManager, Rule, canonical_rule
+from .fwtags import cidr_range, collapse_cidrs, merge_ranges
+
+SHADOWED = 'shadowed'
+REDUNDANT = 'redundant'
+MERGEABLE = 'mergeable'
+
+# port interval of the rules without a port
+_ANY_PORT = (0, 65535)
+
+
+class Finding(collections.namedtuple('Finding', ['kind', 'index', 'rule', 'other_index',
+                                                 'other_rule', 'reason'])):
+    """
+    A rule that can be removed or merged
+    Attributes:
+    kind - string - SHADOWED, REDUNDANT or MERGEABLE
+    index - int - position of the rule in the original list
+    rule - fwpolicy.Rule - the rule
+    other_index - int - position of the covering (or merged into) rule
+                        (None when the base policy covers the rule)
+    other_rule - fwpolicy.Rule - that rule (None for the base policy)
+    reason - string - a short explanation
+    """
+
+    __slots__ = ()
+
+
+class _Space(collections.namedtuple('_Space', ['protocol', 'ports', 'src', 'dst'])):
+    """
+    Flows matched by a rule; src and dst are either a tuple of disjoint
+    sorted (version, first, last) ranges or the name of an unknown tag
+    """
+
+    __slots__ = ()
+
+
+def _address_space(address, tags):
+    if address in tags:
+        return tuple(merge_ranges(cidr_range(cidr) for cidr in tags[address]))
+    try:
+        return (cidr_range(address),)
+    except ValueError:
+        # a tag without members: only comparable with itself
+        return address
+
+
+def _ports(port):
+    if not port:
+        return _ANY_PORT
+    low, _, high = port.partition(':')
+    return int(low), int(high or low)
+
+
+def rule_space(rule, tags=None):
+    """
+    Arguments:
+    rule - fwpolicy.Rule - a canonical rule
+    tags - dict - tag name to its CIDRs
+    Returns:
+    the space of flows matched by the rule
+    """
+    tags = tags or {}
+    return _Space(rule.protocol, _ports(rule.port), _address_space(rule.s_ip, tags),
+                  _address_space(rule.d_ip, tags))
+
+
+def _ranges_cover(outer, inner):
+    if isinstance(outer, str) or isinstance(inner, str):
+        return outer == inner
+    for version, first, last in inner:
+        # the outer range starting at or before first is the only candidate
+        index = bisect.bisect_right(outer, (version, first, float('inf'))) - 1
+        if index < 0:
+            return False
+        candidate = outer[index]
+        if candidate[0] != version or candidate[1] > first or candidate[2] < last:
+            return False
+    return True
+
+
+def _ranges_overlap(one, other):
+    if isinstance(one, str) or isinstance(other, str):
+        # unknown tag members may overlap anything
+        return True
+    i = j = 0
+    while i < len(one) and j < len(other):
+        if one[i][:2] <= other[j][:2]:
+            low, high = one[i], other[j]
+        else:
+            low, high = other[j], one[i]
+        if low[0] == high[0] and high[1] <= low[2]:
+            return True
+        if (one[i][0], one[i][2]) < (other[j][0], other[j][2]):
+            i += 1
+        else:
+            j += 1
+    return False
+
+
+def covers(outer, inner):
+    """
+    Returns:
+    True if every flow of the inner space is in the outer space
+    """
+    return ((outer.protocol == 'all' or outer.protocol == inner.protocol) and
+            outer.ports[0] <= inner.ports[0] and inner.ports[1] <= outer.ports[1] and
+            _ranges_cover(outer.src, inner.src) and _ranges_cover(outer.dst, inner.dst))
+
+
+def overlaps(one, other):
+    """
+    Returns:
+    True if some flow is in both spaces
+    """
+    return ((one.protocol == 'all' or other.protocol == 'all' or one.protocol == other.protocol) and
+            one.ports[0] <= other.ports[1] and other.ports[0] <= one.ports[1] and
+            _ranges_overlap(one.src, other.src) and _ranges_overlap(one.dst, other.dst))
+
+
+def _merge_cidrs(one, other):
+    try:
+        merged = collapse_cidrs([one, other])
+    except ValueError:
+        # tags are not merged
+        return None
+    return merged[0] if len(merged) == 1 else None
+
+
+def _merge_ports(rule, other):
+    low, high = _ports(rule.port)
+    other_low, other_high = _ports(other.port)
+    if other_low > high + 1 or low > other_high + 1:
+        return None
+    low, high = min(low, other_low), max(high, other_high)
+    if (low, high) == _ANY_PORT:
+        return ''
+    return str(low) if low == high else '{0}:{1}'.format(low, high)
+
+
+def merge_rules(rule, other):
+    """
+    Merges two rules with the same action, protocol and logging that differ
+    in one field only
+    Returns:
+    the merged fwpolicy.Rule, or None if the union is not a single rule
+    """
+    if rule[:1] + rule[4:] != other[:1] + other[4:]:
+        return None
+    differs = [name for name in ('s_ip', 'd_ip', 'port')
+               if getattr(rule, name) != getattr(other, name)]
+    if len(differs) != 1:
+        return None
+    if differs[0] == 'port':
+        merged = _merge_ports(rule, other)
+    else:
+        merged = _merge_cidrs(getattr(rule, differs[0]), getattr(other, differs[0]))
+    if merged is None:
+        return None
+    return rule._replace(**{differs[0]: merged})
+
+
+class RuleAnalysis(object):
+    """
+    Findings and minimized rules of one policy
+    """
+
+    def __init__(self, rules, findings, minimized, payloads):
+        """
+        Constructor
+        Arguments:
+        rules - list - the analyzed rules (fwpolicy.Rule)
+        findings - list - Finding objects
+        minimized - list - the rules to keep (fwpolicy.Rule), in order
+        payloads - list - the original rule dict of every kept rule, with
+                          only the merged field changed for merged rules
+        """
+        self.rules = rules
+        self.findings = findings
+        self.minimized = minimized
+        self.payloads = payloads
+
+    def counts(self):
+        """
+        Returns:
+        dict of finding kind to the number of findings
+        """
+        counts = dict.fromkeys((SHADOWED, REDUNDANT, MERGEABLE), 0)
+        counts.update(collections.Counter(finding.kind for finding in self.findings))
+        return counts
+
+    def summary(self):
+        """
+        Returns:
+        a one line summary
+        """
+        counts = self.counts()
+        return '{0} rules -> {1}: {2} shadowed, {3} redundant, {4} merged'.format(
+            len(self.rules), len(self.minimized), counts[SHADOWED], counts[REDUNDANT],
+            counts[MERGEABLE])
+
+    def describe(self):
+        """
+        Returns:
+        the summary followed by one line per finding
+        """
+        lines = [self.summary()]
+        for finding in self.findings:
+            lines.append('{0:<9} rule {1}: {2}'.format(finding.kind, finding.index, finding.reason))
+        return '\n'.join(lines)
+
+    def rules_to_push(self):
+        """
+        Returns:
+        the minimized rules as expected by set_fw_policy_security_rules():
+        copies of the original rule dicts, so fields and spellings the
+        analysis does not model are kept
+        """
+        return [dict(payload) for payload in self.payloads]
+
+
+def _payload(rule):
+    return rule.as_dict() if isinstance(rule, Rule) else dict(rule)
+
+
+def analyze_rules(rules, tags=None, base_policy=None, base_policy_log_enable='off'):
+    """
+    Finds shadowed, redundant and mergeable rules
+    Arguments:
+    rules - list - rules as returned by get_fw_policy_full() (dicts or
+                   fwpolicy.Rule objects), in evaluation order
+    tags - dict - tag name to its members (output of get_fw_tag_members()
+                  or a list of CIDRs); rules using other tags are only
+                  compared with rules using the same tag
+    base_policy - string - (optional) 'allow-all' or 'deny-all'; rules
+                           repeating the base policy are redundant
+    base_policy_log_enable - string - 'on' or 'off', logging of the base policy
+    Returns:
+    RuleAnalysis
+    """
+    originals = list(rules)
+    rules = [canonical_rule(rule) for rule in originals]
+    # copies of the original dicts of the rules changed by a merge, by index
+    merged_payloads = {}
+    tags = dict((name, [member['cidr'] if isinstance(member, dict) else member
+                        for member in members])
+                for name, members in (tags or {}).items())
+    findings = []
+
+    # rules covered by an earlier rule never match
+    kept = []
+    for index, rule in enumerate(rules):
+        space = rule_space(rule, tags)
+        for other_index, other, other_space in kept:
+            if covers(other_space, space):
+                kind = REDUNDANT if other.deny_allow == rule.deny_allow else SHADOWED
+                findings.append(Finding(kind, index, rule, other_index, other,
+                                        'never matches, covered by rule {0}'.format(other_index)))
+                break
+        else:
+            kept.append((index, rule, space))
+
+    # rules covered by a later rule (or the base policy) with the same action
+    base_action = None
+    if base_policy:
+        base_action = 'allow' if str(base_policy).lower().startswith('allow') else 'deny'
+    position = len(kept) - 1
+    while position >= 0:
+        index, rule, space = kept[position]
+        covering = None
+        for later_position in range(position + 1, len(kept)):
+            _, other, other_space = kept[later_position]
+            if other.deny_allow != rule.deny_allow or other.log_enable != rule.log_enable:
+                if overlaps(other_space, space):
+                    break
+            elif covers(other_space, space):
+                covering = kept[later_position]
+                break
+        else:
+            if rule.deny_allow == base_action and rule.log_enable == base_policy_log_enable:
+                findings.append(Finding(REDUNDANT, index, rule, None, None,
+                                        'repeats the base policy'))
+                del kept[position]
+        if covering is not None:
+            findings.append(Finding(REDUNDANT, index, rule, covering[0], covering[1],
+                                    'covered by later rule {0}'.format(covering[0])))
+            del kept[position]
+        position -= 1
+
+    # merge pairs with no conflicting rule in between, until nothing changes
+    merged_any = True
+    while merged_any:
+        merged_any = False
+        for position in range(len(kept)):
+            index, rule, space = kept[position]
+            # spaces of the rules in between with another action or logging:
+            # moving a later rule's flows above them could change the result
+            conflicts = []
+            for later_position in range(position + 1, len(kept)):
+                other_index, other, other_space = kept[later_position]
+                merged = merge_rules(rule, other)
+                if merged is not None and not any(overlaps(conflict, other_space)
+                                                  for conflict in conflicts):
+                    findings.append(Finding(MERGEABLE, other_index, other, index, rule,
+                                            'merged into rule {0} as {1}'.format(index, merged)))
+                    payload = merged_payloads.get(index) or _payload(originals[index])
+                    for name in ('s_ip', 'd_ip', 'port'):
+                        if getattr(merged, name) != getattr(rule, name):
+                            payload[name] = getattr(merged, name)
+                    merged_payloads[index] = payload
+                    kept[position] = (index, merged, rule_space(merged, tags))
+                    del kept[later_position]
+                    merged_any = True
+                    break
+                if other.deny_allow != rule.deny_allow or other.log_enable != rule.log_enable:
+                    conflicts.append(other_space)
+            if merged_any:
+                break
+
+    findings.sort(key=lambda finding: finding.index)
+    payloads = [merged_payloads.get(index) or _payload(originals[index]) for index, _, _ in kept]
+    return RuleAnalysis(rules, findings, [rule for _, rule, _ in kept], payloads)
+
+
+class FleetAnalysis(object):
+    """
+    Analyses of many gateways with the rules and policies they share
+    """
+
+    def __init__(self, analyses, shared_rules, identical_policies, errors):
+        """
+        Constructor
+        Arguments:
+        analyses - dict - gateway name to its RuleAnalysis
+        shared_rules - dict - fwpolicy.Rule to the names of the gateways using it
+                              (rules used by several gateways only)
+        identical_policies - list - lists of the names of gateways with the
+                                    same rules (groups of several gateways only)
+        errors - dict - gateway name to the exception raised fetching its policy
+        """
+        self.analyses = analyses
+        self.shared_rules = shared_rules
+        self.identical_policies = identical_policies
+        self.errors = errors
+
+    def minimized(self):
+        """
+        Returns:
+        dict of gateway name to its minimized rules (see
+        RuleAnalysis.rules_to_push()), for PolicyManager.plan()
+        """
+        return collections.OrderedDict((gw_name, analysis.rules_to_push())
+                                       for gw_name, analysis in self.analyses.items())
+
+    def describe(self):
+        """
+        Returns:
+        the summary of every gateway and the shared rules and policies
+        """
+        lines = ['{0}: {1}'.format(gw_name, analysis.summary())
+                 for gw_name, analysis in self.analyses.items()]
+        for gw_names in self.identical_policies:
+            lines.append('identical policies: {0}'.format(', '.join(gw_names)))
+        if self.shared_rules:
+            lines.append('{0} rules are repeated on several gateways'.format(len(self.shared_rules)))
+        for gw_name, err in self.errors.items():
+            lines.append('{0}: fetch failed: {1}'.format(gw_name, err))
+        return '\n'.join(lines)
+
+
+def analyze_fleet(controller, gw_names, max_workers=16):
+    """
+    Fetches the policies of many gateways and the members of the tags they
+    use concurrently and analyzes them
+    Arguments:
+    controller - Aviatrix - a logged in client
+    gw_names - list - gateway names
+    max_workers - int - maximum number of calls in flight
+    Returns:
+    FleetAnalysis
+    """
+    policies, errors = PolicyManager(controller, max_workers).fetch(gw_names)
+    tags = fetch_tag_members(controller, [rule for policy in policies.values()
+                                          for rule in policy.rules], max_workers)
+    analyses = collections.OrderedDict()
+    users = collections.OrderedDict()
+    digests = collections.OrderedDict()
+    for gw_name, policy in policies.items():
+        analyses[gw_name] = analyze_rules(policy.security_rules, tags, policy.base_policy,
+                                          policy.base_policy_log_enable or 'off')
+        for rule in set(policy.rules):
+            users.setdefault(rule, []).append(gw_name)
+        if policy.rules:
+            digests.setdefault(policy.digest, []).append(gw_name)
+    shared = collections.OrderedDict((rule, names) for rule, names in users.items()
+                                     if len(names) > 1)
+    identical = [names for names in digests.values() if len(names) > 1]
+    return FleetAnalysis(analyses, shared, identical, errors)
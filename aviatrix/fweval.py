@@ -0,0 +1,335 @@
+"""
+Local evaluation of firewall rules ("would this flow pass?").
+
+The rules of a gateway are compiled into indexes that each return a bit
+mask of the rules matching one field of a flow (bit i is rule i):
+
+ - source and destination prefix indexes: a binary trie of the rule CIDRs
+   stored level by level (a dict of network to mask for every prefix
+   length in use), so a lookup costs one dict probe per distinct length
+ - a port index: the rule port ranges cut into elementary intervals,
+   found with bisect
+ - a protocol index: a dict of protocol to mask
+
+The flow matches the rules whose bits are set in all four masks and the
+lowest set bit is the first match in rule order; without a match the base
+policy decides.  Tag names used as s_ip/d_ip are resolved to their members.
+
+Usage:
+
+evaluator = PolicyEvaluator.from_gateway(controller, 'gw-prod')
+print(evaluator.evaluate('10.1.2.3', '10.2.0.9', 'tcp', 443))
+verdicts = evaluator.evaluate_many([('10.1.2.3', '10.2.0.9', 'tcp', 443), ...])
+"""
+
+import bisect
+import collections
+
+from .fwpolicy import canonical_rule
+from .fwtags import cidr_range
+
+# rule protocols matching every flow
+ANY_PROTOCOL = 'all'
+
+
+class Flow(collections.namedtuple('Flow', ['src', 'dst', 'protocol', 'port'])):
+    """
+    A flow to evaluate
+    Attributes:
+    src - string - source IP address
+    dst - string - destination IP address
+    protocol - string - 'tcp', 'udp', 'icmp', ...
+    port - int - destination port (None for protocols without ports)
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, src, dst, protocol='tcp', port=None):
+        return super(Flow, cls).__new__(cls, src, dst, protocol, port)
+
+
+class Verdict(collections.namedtuple('Verdict', ['flow', 'action', 'rule_index', 'rule'])):
+    """
+    Result of the evaluation of a flow
+    Attributes:
+    flow - Flow - the flow
+    action - string - 'allow' or 'deny'
+    rule_index - int - position of the first matching rule (None if the
+                       base policy decided)
+    rule - fwpolicy.Rule - the first matching rule (None if the base policy decided)
+    """
+
+    __slots__ = ()
+
+    @property
+    def allowed(self):
+        """
+        True if the flow passes
+        """
+        return self.action == 'allow'
+
+
+def rule_tags(rules):
+    """
+    Arguments:
+    rules - iterable - canonical rules (fwpolicy.Rule)
+    Returns:
+    sorted list of the tag names used as s_ip or d_ip
+    """
+    tags = set()
+    for rule in rules:
+        for address in (rule.s_ip, rule.d_ip):
+            try:
+                cidr_range(address)
+            except ValueError:
+                tags.add(address)
+    return sorted(tags)
+
+
+def fetch_tag_members(controller, rules, max_workers=16):
+    """
+    Fetches the members of the tags used by the rules concurrently
+    Arguments:
+    controller - Aviatrix - a logged in client
+    rules - iterable - canonical rules (fwpolicy.Rule)
+    max_workers - int - maximum number of calls in flight
+    Returns:
+    dict of tag name to the output of get_fw_tag_members()
+    """
+    members = {}
+    for item in controller.batch([('get_fw_tag_members', (tag,)) for tag in rule_tags(rules)],
+                                 max_workers=max_workers):
+        if not item.ok:
+            raise item.error
+        members[item.call.args[0]] = item.value or []
+    return members
+
+
+class PrefixIndex(object):
+    """
+    Maps addresses to the mask of the rules whose prefixes contain them
+    """
+
+    def __init__(self):
+        # version to {prefix length: {network >> host bits: mask}}
+        self._levels = {4: {}, 6: {}}
+        self._lookup = None
+
+    def add(self, cidr, bit):
+        """
+        Adds a prefix of a rule
+        Arguments:
+        cidr - string - the prefix
+        bit - int - the rule's bit
+        """
+        version, first, last = cidr_range(cidr)
+        host_bits = (last - first + 1).bit_length() - 1
+        level = self._levels[version].setdefault(host_bits, {})
+        key = first >> host_bits
+        level[key] = level.get(key, 0) | bit
+        self._lookup = None
+
+    def _compile(self):
+        self._lookup = dict((version, sorted(levels.items()))
+                            for version, levels in self._levels.items())
+
+    def match(self, address):
+        """
+        Arguments:
+        address - string - an IP address
+        Returns:
+        mask of the rules with a prefix containing the address
+        """
+        if self._lookup is None:
+            self._compile()
+        version, value, _ = cidr_range(address)
+        mask = 0
+        for host_bits, level in self._lookup[version]:
+            mask |= level.get(value >> host_bits, 0)
+        return mask
+
+
+class PortIndex(object):
+    """
+    Maps ports to the mask of the rules whose port range contains them
+    """
+
+    def __init__(self):
+        self._ranges = []
+        self.any_port = 0
+        self._bounds = None
+        self._masks = None
+
+    def add(self, port, bit):
+        """
+        Adds the port of a rule
+        Arguments:
+        port - string - '' (any), a port or a range 'low:high'
+        bit - int - the rule's bit
+        """
+        if not port:
+            self.any_port |= bit
+        else:
+            low, _, high = port.partition(':')
+            self._ranges.append((int(low), int(high or low), bit))
+        self._bounds = None
+
+    def _compile(self):
+        # interval i covers [bounds[i], bounds[i + 1])
+        bounds = sorted(set([0] + [low for low, _, _ in self._ranges] +
+                            [high + 1 for _, high, _ in self._ranges]))
+        masks = [self.any_port] * len(bounds)
+        for low, high, bit in self._ranges:
+            for index in range(bisect.bisect_left(bounds, low), bisect.bisect_left(bounds, high + 1)):
+                masks[index] |= bit
+        self._bounds = bounds
+        self._masks = masks
+
+    def match(self, port):
+        """
+        Arguments:
+        port - int - a port (None for a flow without ports)
+        Returns:
+        mask of the rules matching the port
+        """
+        if port is None:
+            return self.any_port
+        if self._bounds is None:
+            self._compile()
+        return self._masks[bisect.bisect_right(self._bounds, int(port)) - 1]
+
+
+class PolicyEvaluator(object):
+    """
+    Evaluates flows against an ordered list of firewall rules
+    """
+
+    def __init__(self, rules, tags=None, base_policy='deny-all'):
+        """
+        Constructor
+        Arguments:
+        rules - list - rules as returned by get_fw_policy_full() (dicts or
+                       fwpolicy.Rule objects), in evaluation order
+        tags - dict - tag name to its members (output of
+                      get_fw_tag_members() or a list of CIDRs)
+        base_policy - string - 'allow-all' or 'deny-all', applied when no rule matches
+        """
+        self.rules = [canonical_rule(rule) for rule in rules]
+        self.tags = dict((name, [member['cidr'] if isinstance(member, dict) else member
+                                 for member in members])
+                         for name, members in (tags or {}).items())
+        self.base_action = 'allow' if str(base_policy).lower().startswith('allow') else 'deny'
+        self._sources = PrefixIndex()
+        self._destinations = PrefixIndex()
+        self._ports = PortIndex()
+        self._protocols = {}
+        self._any_protocol = 0
+        for index, rule in enumerate(self.rules):
+            bit = 1 << index
+            for cidr in self._resolve(rule.s_ip):
+                self._sources.add(cidr, bit)
+            for cidr in self._resolve(rule.d_ip):
+                self._destinations.add(cidr, bit)
+            self._ports.add(rule.port, bit)
+            if rule.protocol == ANY_PROTOCOL:
+                self._any_protocol |= bit
+            else:
+                self._protocols[rule.protocol] = self._protocols.get(rule.protocol, 0) | bit
+        for protocol in self._protocols:
+            self._protocols[protocol] |= self._any_protocol
+
+    def _resolve(self, address):
+        """
+        Returns:
+        the CIDRs of a rule address (a CIDR or a tag name)
+        """
+        if address in self.tags:
+            return self.tags[address]
+        try:
+            cidr_range(address)
+        except ValueError:
+            raise ValueError('Unknown tag {0!r} in firewall rules'.format(address))
+        return [address]
+
+    @classmethod
+    def from_gateway(cls, controller, gw_name, max_workers=16):
+        """
+        Builds an evaluator from the policy of a gateway, fetching the
+        members of the tags it uses concurrently
+        Arguments:
+        controller - Aviatrix - a logged in client
+        gw_name - string - the gateway name
+        max_workers - int - maximum number of calls in flight
+        Returns:
+        PolicyEvaluator
+        """
+        policy = controller.get_fw_policy_full(gw_name) or {}
+        rules = [canonical_rule(rule) for rule in policy.get('security_rules') or ()]
+        return cls(rules, fetch_tag_members(controller, rules, max_workers),
+                   policy.get('base_policy') or 'deny-all')
+
+    def _decide(self, flow, mask):
+        if not mask:
+            return Verdict(flow, self.base_action, None, None)
+        index = (mask & -mask).bit_length() - 1
+        return Verdict(flow, self.rules[index].deny_allow, index, self.rules[index])
+
+    def evaluate(self, src, dst, protocol='tcp', port=None):
+        """
+        Evaluates one flow
+        Arguments:
+        src - string - source IP address
+        dst - string - destination IP address
+        protocol - string - the flow's protocol (only rules with protocol
+                            'all' match a protocol no rule names)
+        port - int - destination port (None for protocols without ports)
+        Returns:
+        Verdict
+        """
+        flow = Flow(src, dst, protocol, port)
+        mask = self._protocols.get(protocol.lower(), self._any_protocol)
+        if mask:
+            mask &= self._ports.match(port)
+        if mask:
+            mask &= self._sources.match(src)
+        if mask:
+            mask &= self._destinations.match(dst)
+        return self._decide(flow, mask)
+
+    def evaluate_many(self, flows):
+        """
+        Evaluates many flows; the prefix lookups of repeated addresses are
+        shared
+        Arguments:
+        flows - iterable - Flow objects or (src, dst, protocol, port) tuples
+        Returns:
+        list of Verdict in the order of flows
+        """
+        sources = {}
+        destinations = {}
+        verdicts = []
+        for flow in flows:
+            if not isinstance(flow, Flow):
+                flow = Flow(*flow)
+            mask = self._protocols.get(flow.protocol.lower(), self._any_protocol)
+            if mask:
+                mask &= self._ports.match(flow.port)
+            if mask:
+                src = sources.get(flow.src)
+                if src is None:
+                    src = sources[flow.src] = self._sources.match(flow.src)
+                mask &= src
+            if mask:
+                dst = destinations.get(flow.dst)
+                if dst is None:
+                    dst = destinations[flow.dst] = self._destinations.match(flow.dst)
+                mask &= dst
+            verdicts.append(self._decide(flow, mask))
+        return verdicts
+
+    def allows(self, src, dst, protocol='tcp', port=None):
+        """
+        Returns:
+        True if the flow passes (see evaluate())
+        """
+        return self.evaluate(src, dst, protocol, port).allowed
@@ -0,0 +1,449 @@
+"""
+Firewall policy management that only pushes real changes.
+
+The current policies of many gateways are fetched concurrently with
+get_fw_policy_full().  Rules are canonicalized (case, whitespace, CIDR and
+port spelling, defaults) and every rule list is hashed, so a gateway whose
+rules already match the desired ones is skipped instead of being
+reprogrammed.  For the others the plan shows the rules added, removed and
+moved, and only those gateways receive set_fw_policy_security_rules().
+The canonical form is only used to compare: the rules pushed are the
+caller's rule dicts, unchanged.
+
+Usage:
+
+manager = PolicyManager(controller, max_workers=16)
+plan = manager.plan(dict((gw_name, rules) for gw_name in gw_names))
+print(plan.describe())
+results = manager.apply(plan)
+"""
+
+import collections
+import difflib
+import hashlib
+import ipaddress
+import json
+import logging
+
+ADD = 'add'
+REMOVE = 'remove'
+MOVE = 'move'
+
+# keys of a rule as used by set_fw_policy_security_rules()
+RULE_FIELDS = ('protocol', 's_ip', 'd_ip', 'port', 'deny_allow', 'log_enable')
+
+# protocols without ports
+PORTLESS_PROTOCOLS = ('all', 'icmp')
+
+
+class Rule(collections.namedtuple('Rule', RULE_FIELDS)):
+    """
+    A canonical firewall rule (all values are strings)
+    Attributes:
+    protocol - string - 'all', 'tcp', 'udp', 'icmp', 'sctp', 'rdp' or 'dccp'
+    s_ip - string - source CIDR or tag name
+    d_ip - string - destination CIDR or tag name
+    port - string - '' (any), a single port or a range 'low:high'
+    deny_allow - string - 'allow' or 'deny'
+    log_enable - string - 'on' or 'off'
+    """
+
+    __slots__ = ()
+
+    def as_dict(self):
+        """
+        Returns:
+        the rule as expected by set_fw_policy_security_rules()
+        """
+        return dict(zip(self._fields, self))
+
+
+def _canonical_address(value):
+    value = str(value or '').strip()
+    try:
+        return str(ipaddress.ip_network(value, strict=False))
+    except ValueError:
+        # a tag name
+        return value
+
+
+def _canonical_port(protocol, value):
+    value = str(value or '').replace(' ', '')
+    if protocol in PORTLESS_PROTOCOLS or value.lower() in ('all', '0:65535'):
+        return ''
+    low, sep, high = value.partition(':')
+    if not sep:
+        low, sep, high = value.partition('-')
+    if sep and low == high:
+        return low
+    return '{0}:{1}'.format(low, high) if sep else value
+
+
+def _canonical_flag(value):
+    if isinstance(value, bool):
+        return 'on' if value else 'off'
+    value = str(value or '').strip().lower()
+    return 'on' if value in ('on', 'true', 'yes', '1') else 'off'
+
+
+def canonical_rule(rule):
+    """
+    Normalizes a rule so equivalent spellings compare equal
+    Arguments:
+    rule - dict - a rule as returned by get_fw_policy_full() (or a Rule)
+    Returns:
+    Rule
+    """
+    if isinstance(rule, Rule):
+        return rule
+    protocol = str(rule.get('protocol') or 'all').strip().lower()
+    return Rule(protocol,
+                _canonical_address(rule.get('s_ip')),
+                _canonical_address(rule.get('d_ip')),
+                _canonical_port(protocol, rule.get('port')),
+                str(rule.get('deny_allow') or '').strip().lower(),
+                _canonical_flag(rule.get('log_enable')))
+
+
+def canonicalize_rules(rules):
+    """
+    Arguments:
+    rules - list - rules (dicts or Rule objects)
+    Returns:
+    tuple of Rule in the same order
+    """
+    return tuple(canonical_rule(rule) for rule in rules or ())
+
+
+def policy_hash(rules):
+    """
+    Hashes an ordered rule list
+    Arguments:
+    rules - list - rules (dicts or Rule objects)
+    Returns:
+    hex SHA-256 digest of the canonical rules
+    """
+    payload = json.dumps([list(rule) for rule in canonicalize_rules(rules)], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RuleChange(collections.namedtuple('RuleChange', ['op', 'rule', 'old_index', 'new_index'])):
+    """
+    A rule added, removed or moved
+    Attributes:
+    op - string - ADD, REMOVE or MOVE
+    rule - Rule - the rule
+    old_index - int - position in the current rules (None for ADD)
+    new_index - int - position in the desired rules (None for REMOVE)
+    """
+
+    __slots__ = ()
+
+
+class PolicyDiff(object):
+    """
+    Differences between the current and the desired rules of a gateway
+    """
+
+    def __init__(self, changes):
+        """
+        Constructor
+        Arguments:
+        changes - list - RuleChange objects
+        """
+        self.changes = changes
+
+    @property
+    def added(self):
+        """
+        list of the RuleChange for added rules
+        """
+        return [change for change in self.changes if change.op == ADD]
+
+    @property
+    def removed(self):
+        """
+        list of the RuleChange for removed rules
+        """
+        return [change for change in self.changes if change.op == REMOVE]
+
+    @property
+    def moved(self):
+        """
+        list of the RuleChange for rules kept at another position
+        """
+        return [change for change in self.changes if change.op == MOVE]
+
+    def summary(self):
+        """
+        Returns:
+        a one line summary
+        """
+        return '{0} added, {1} removed, {2} moved'.format(len(self.added), len(self.removed),
+                                                         len(self.moved))
+
+    def describe(self):
+        """
+        Returns:
+        one line per change
+        """
+        lines = []
+        for change in self.changes:
+            rule = change.rule
+            text = '{0} {1} {2} -> {3} port {4} log {5}'.format(
+                rule.deny_allow, rule.protocol, rule.s_ip, rule.d_ip, rule.port or 'any',
+                rule.log_enable)
+            if change.op == ADD:
+                lines.append('+ [{0}] {1}'.format(change.new_index, text))
+            elif change.op == REMOVE:
+                lines.append('- [{0}] {1}'.format(change.old_index, text))
+            else:
+                lines.append('~ [{0} -> {1}] {2}'.format(change.old_index, change.new_index, text))
+        return '\n'.join(lines)
+
+
+def diff_rules(current, desired):
+    """
+    Compares two ordered rule lists.  Rules present in both but out of
+    order are reported as moves rather than a removal and an addition.
+    Arguments:
+    current - list - the rules on the gateway (dicts or Rule objects)
+    desired - list - the rules to push (dicts or Rule objects)
+    Returns:
+    PolicyDiff
+    """
+    current = canonicalize_rules(current)
+    desired = canonicalize_rules(desired)
+    matcher = difflib.SequenceMatcher(None, current, desired, autojunk=False)
+    removed = collections.OrderedDict()
+    added = []
+    for tag, low1, high1, low2, high2 in matcher.get_opcodes():
+        if tag in ('delete', 'replace'):
+            for index in range(low1, high1):
+                removed.setdefault(current[index], []).append(index)
+        if tag in ('insert', 'replace'):
+            added.extend((index, desired[index]) for index in range(low2, high2))
+    changes = []
+    for new_index, rule in added:
+        if removed.get(rule):
+            changes.append(RuleChange(MOVE, rule, removed[rule].pop(0), new_index))
+        else:
+            changes.append(RuleChange(ADD, rule, None, new_index))
+    for rule, indexes in removed.items():
+        changes.extend(RuleChange(REMOVE, rule, index, None) for index in indexes)
+    changes.sort(key=lambda change: (change.new_index if change.new_index is not None
+                                     else change.old_index, change.op != REMOVE))
+    return PolicyDiff(changes)
+
+
+class GatewayPolicy(collections.namedtuple('GatewayPolicy', ['gw_name', 'rules', 'digest',
+                                                             'base_policy',
+                                                             'base_policy_log_enable',
+                                                             'security_rules'])):
+    """
+    The firewall policy of a gateway
+    Attributes:
+    gw_name - string - the gateway name
+    rules - tuple - the canonical security rules (Rule objects)
+    digest - string - policy_hash() of the rules
+    base_policy - string - the base policy (e.g. 'allow-all' or 'deny-all')
+    base_policy_log_enable - string - 'on' or 'off'
+    security_rules - list - the rules as returned by the controller
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_response(cls, gw_name, policy):
+        """
+        Builds a GatewayPolicy from the output of get_fw_policy_full()
+        """
+        security_rules = list(policy.get('security_rules') or ())
+        rules = canonicalize_rules(security_rules)
+        return cls(gw_name, rules, policy_hash(rules), policy.get('base_policy'),
+                   policy.get('base_policy_log_enable'), security_rules)
+
+
+class PolicyUpdate(collections.namedtuple('PolicyUpdate', ['gw_name', 'rules', 'diff',
+                                                           'current_digest', 'digest'])):
+    """
+    A gateway whose rules must be pushed
+    Attributes:
+    gw_name - string - the gateway name
+    rules - tuple - the desired rules as given to plan() (pushed unchanged)
+    diff - PolicyDiff - changes from the current rules
+    current_digest - string - hash of the current rules
+    digest - string - hash of the desired rules
+    """
+
+    __slots__ = ()
+
+
+class PushResult(collections.namedtuple('PushResult', ['update', 'error'])):
+    """
+    Outcome of a PolicyUpdate
+    Attributes:
+    update - PolicyUpdate - the pushed update
+    error - Exception - the error raised (None on success)
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """
+        True if the rules were pushed
+        """
+        return self.error is None
+
+
+class PolicyPlan(object):
+    """
+    Gateways to update, gateways already up to date and fetch errors
+    """
+
+    def __init__(self, updates, unchanged, errors):
+        """
+        Constructor
+        Arguments:
+        updates - list - PolicyUpdate objects
+        unchanged - list - names of the gateways whose rules already match
+        errors - dict - gateway name to the exception raised fetching its policy
+        """
+        self.updates = updates
+        self.unchanged = unchanged
+        self.errors = errors
+
+    def summary(self):
+        """
+        Returns:
+        a one line summary
+        """
+        summary = '{0} gateways to update, {1} unchanged'.format(len(self.updates),
+                                                                 len(self.unchanged))
+        if self.errors:
+            summary += ', {0} failed to fetch'.format(len(self.errors))
+        return summary
+
+    def describe(self):
+        """
+        Returns:
+        the summary followed by the diff of every updated gateway
+        """
+        lines = [self.summary()]
+        for update in self.updates:
+            lines.append('{0}: {1}'.format(update.gw_name, update.diff.summary()))
+            lines.extend('  ' + line for line in update.diff.describe().splitlines())
+        for gw_name, err in self.errors.items():
+            lines.append('{0}: fetch failed: {1}'.format(gw_name, err))
+        return '\n'.join(lines)
+
+
+def push_payload(update):
+    """
+    Builds the rules sent for an update: the caller's rule dicts, copied
+    without any change (Rule objects are converted with as_dict())
+    Arguments:
+    update - PolicyUpdate - the update
+    Returns:
+    list of dicts
+    Raises:
+    ValueError if the payload does not round-trip to the planned rules
+    """
+    payload = [rule.as_dict() if isinstance(rule, Rule) else dict(rule) for rule in update.rules]
+    # set_fw_policy_security_rules() sends json.dumps(payload)
+    if json.loads(json.dumps(payload)) != payload or policy_hash(payload) != update.digest:
+        raise ValueError('Firewall rules of {0} do not round-trip unchanged'.format(update.gw_name))
+    return payload
+
+
+class PolicyManager(object):
+    """
+    Fetches, compares and pushes the firewall rules of many gateways
+    """
+
+    def __init__(self, controller, max_workers=16):
+        """
+        Constructor
+        Arguments:
+        controller - Aviatrix - a logged in client
+        max_workers - int - maximum number of calls in flight
+        """
+        self.controller = controller
+        self.max_workers = max_workers
+
+    def fetch(self, gw_names):
+        """
+        Fetches the current policies concurrently
+        Arguments:
+        gw_names - list - gateway names
+        Returns:
+        tuple (dict of gateway name to GatewayPolicy, dict of gateway name
+        to the exception raised for the gateways that failed)
+        """
+        policies = collections.OrderedDict()
+        errors = collections.OrderedDict()
+        calls = [('get_fw_policy_full', (gw_name,)) for gw_name in gw_names]
+        for item in self.controller.batch(calls, max_workers=self.max_workers):
+            gw_name = item.call.args[0]
+            if item.ok:
+                policies[gw_name] = GatewayPolicy.from_response(gw_name, item.value or {})
+            else:
+                errors[gw_name] = item.error
+        return policies, errors
+
+    def plan(self, desired):
+        """
+        Compares the desired rules with the rules on the gateways
+        Arguments:
+        desired - dict - gateway name to its desired rules (list of dicts
+                         or Rule objects, in evaluation order)
+        Returns:
+        PolicyPlan
+        """
+        desired = collections.OrderedDict(
+            (gw_name, tuple(rules or ())) for gw_name, rules in desired.items())
+        policies, errors = self.fetch(list(desired))
+        updates = []
+        unchanged = []
+        for gw_name, policy in policies.items():
+            rules = desired[gw_name]
+            # the canonical form is only used to compare, never pushed
+            canonical = canonicalize_rules(rules)
+            digest = policy_hash(canonical)
+            if digest == policy.digest:
+                unchanged.append(gw_name)
+                continue
+            updates.append(PolicyUpdate(gw_name, rules, diff_rules(policy.rules, canonical),
+                                        policy.digest, digest))
+        return PolicyPlan(updates, unchanged, errors)
+
+    def apply(self, plan):
+        """
+        Pushes the rules of the gateways that changed
+        Arguments:
+        plan - PolicyPlan - the plan from plan()
+        Returns:
+        list of PushResult in plan order
+        """
+        calls = [('set_fw_policy_security_rules', (update.gw_name, push_payload(update)))
+                 for update in plan.updates]
+        results = []
+        for update, item in zip(plan.updates,
+                                self.controller.batch(calls, max_workers=self.max_workers)):
+            if not item.ok:
+                logging.warning('Firewall policy push to {0} failed: {1}'.format(update.gw_name,
+                                                                                 item.error))
+            results.append(PushResult(update, item.error))
+        return results
+
+    def sync(self, desired):
+        """
+        Plans and applies in one step
+        Arguments:
+        desired - dict - gateway name to its desired rules
+        Returns:
+        tuple (PolicyPlan, list of PushResult)
+        """
+        plan = self.plan(desired)
+        return plan, self.apply(plan)
@@ -0,0 +1,290 @@
+"""
+Compaction and incremental updates of firewall tag members.
+
+Members fed from IPAM exports often repeat or overlap each other.  Every
+CIDR is converted to an integer range [first, last]; sorting the ranges
+and merging the ones that overlap or touch gives the covered address
+space, which is then cut back into the fewest aligned CIDR blocks.  This
+costs one sort, several times less than ipaddress.collapse_addresses().
+
+Because update_policy_members replaces the whole member list, an update is
+only sent when the canonical CIDRs differ from get_fw_tag_members(), and
+members that stay keep their current names.
+
+Usage:
+
+members = [{'name': 'office', 'cidr': '10.1.0.0/24'}, {'name': 'lab', 'cidr': '10.1.1.0/24'}]
+compact_members(members)        # [{'name': '10.1.0.0/23', 'cidr': '10.1.0.0/23'}]
+update = sync_tag_members(controller, 'IPAM', members, compact=True)
+print(update.diff.summary())
+"""
+
+import collections
+import ipaddress
+import socket
+
+# address size in bits by IP version
+_BITS = {4: 32, 6: 128}
+
+
+def _parse_ipv4(text):
+    """
+    Fast path for dotted quad CIDRs
+    Returns:
+    the address as an int, or None if text is not a plain IPv4 address
+    """
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, text), 'big')
+    except OSError:
+        return None
+
+
+def cidr_range(cidr):
+    """
+    Converts a CIDR (host bits are ignored, a bare address is a host route)
+    to an integer range
+    Arguments:
+    cidr - string - e.g. '10.0.0.0/8', '10.1.2.3', '2001:db8::/32'
+    Returns:
+    tuple (version, first, last)
+    """
+    text = cidr.strip()
+    address, sep, length = text.partition('/')
+    value = _parse_ipv4(address)
+    if value is not None and (not sep or (length.isdigit() and int(length) <= 32)):
+        host_bits = 32 - (int(length) if sep else 32)
+        first = (value >> host_bits) << host_bits
+        return 4, first, first | ((1 << host_bits) - 1)
+    try:
+        network = ipaddress.ip_network(text, strict=False)
+    except ValueError:
+        raise ValueError('Invalid CIDR {0!r}'.format(cidr))
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def _format_cidr(version, first, prefixlen):
+    if version == 4:
+        return '{0}.{1}.{2}.{3}/{4}'.format(first >> 24, (first >> 16) & 255, (first >> 8) & 255,
+                                            first & 255, prefixlen)
+    return '{0}/{1}'.format(ipaddress.IPv6Address(first), prefixlen)
+
+
+def _range_cidr(version, first, last):
+    # the range of a single CIDR block has a power of two size
+    return _format_cidr(version, first, _BITS[version] - (last - first + 1).bit_length() + 1)
+
+
+def canonical_cidr(cidr):
+    """
+    Arguments:
+    cidr - string - a CIDR or address
+    Returns:
+    the CIDR with host bits cleared and an explicit prefix length
+    """
+    return _range_cidr(*cidr_range(cidr))
+
+
+def _blocks(version, first, last):
+    """
+    Cuts an integer range into the fewest aligned blocks
+    Returns:
+    generator of (first, last, prefixlen) in address order
+    """
+    bits = _BITS[version]
+    while first <= last:
+        # largest block aligned on first that does not pass last
+        size = first & -first if first else 1 << bits
+        while first + size - 1 > last:
+            size >>= 1
+        yield first, first + size - 1, bits - size.bit_length() + 1
+        first += size
+
+
+def range_to_cidrs(version, first, last):
+    """
+    Cuts an integer range into the fewest aligned CIDR blocks
+    Returns:
+    list of CIDR strings in address order
+    """
+    return [_format_cidr(version, start, prefixlen)
+            for start, _, prefixlen in _blocks(version, first, last)]
+
+
+def merge_ranges(ranges):
+    """
+    Merges overlapping and adjacent ranges
+    Arguments:
+    ranges - iterable - (version, first, last) tuples
+    Returns:
+    sorted list of disjoint, non adjacent (version, first, last) tuples
+    """
+    merged = []
+    for version, first, last in sorted(ranges):
+        if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+            if last > merged[-1][2]:
+                merged[-1] = (version, merged[-1][1], last)
+        else:
+            merged.append((version, first, last))
+    return merged
+
+
+def collapse_cidrs(cidrs):
+    """
+    Computes the minimal set of CIDRs covering the same addresses
+    Arguments:
+    cidrs - iterable - CIDR strings
+    Returns:
+    list of CIDR strings (IPv4 first, in address order)
+    """
+    collapsed = []
+    for version, first, last in merge_ranges(cidr_range(cidr) for cidr in cidrs):
+        collapsed.extend(range_to_cidrs(version, first, last))
+    return collapsed
+
+
+def _member_ranges(members):
+    """
+    Returns:
+    dict of (version, first, last) to the name of the first member with
+    that range, in input order
+    """
+    ranges = collections.OrderedDict()
+    for member in members:
+        key = cidr_range(member['cidr'])
+        if key not in ranges:
+            ranges[key] = member.get('name')
+    return ranges
+
+
+def dedup_members(members):
+    """
+    Drops members whose CIDR (after canonicalization) repeats an earlier one
+    Arguments:
+    members - iterable - dicts with 'name' and 'cidr'
+    Returns:
+    list of dicts with 'name' and the canonical 'cidr', in input order
+    """
+    unique = []
+    for key, name in _member_ranges(members).items():
+        cidr = _range_cidr(*key)
+        unique.append({'name': name or cidr, 'cidr': cidr})
+    return unique
+
+
+def compact_members(members, name_format='{0}'):
+    """
+    Replaces the members with the minimal set of CIDRs covering them.  A
+    block equal to an input CIDR keeps that member's name; a merged block is
+    named with name_format.
+    Arguments:
+    members - iterable - dicts with 'name' and 'cidr'
+    name_format - string - format of the name of merged blocks ({0} is the CIDR)
+    Returns:
+    list of dicts with 'name' and 'cidr' in address order
+    """
+    names = _member_ranges(members)
+    compacted = []
+    for version, first, last in merge_ranges(names):
+        for start, end, prefixlen in _blocks(version, first, last):
+            cidr = _format_cidr(version, start, prefixlen)
+            compacted.append({'name': names.get((version, start, end)) or name_format.format(cidr),
+                              'cidr': cidr})
+    return compacted
+
+
+class MemberDiff(collections.namedtuple('MemberDiff', ['added', 'removed', 'unchanged'])):
+    """
+    Differences between the current and the desired members of a tag
+    Attributes:
+    added - list - desired members whose CIDR is not in the tag
+    removed - list - current members whose CIDR is no longer desired
+    unchanged - int - number of CIDRs present in both
+    """
+
+    __slots__ = ()
+
+    @property
+    def changed(self):
+        """
+        True if the member list must be updated
+        """
+        return bool(self.added or self.removed)
+
+    def summary(self):
+        """
+        Returns:
+        a one line summary
+        """
+        return '{0} added, {1} removed, {2} unchanged'.format(len(self.added), len(self.removed),
+                                                             self.unchanged)
+
+
+class TagUpdate(collections.namedtuple('TagUpdate', ['tag_name', 'members', 'diff', 'pushed'])):
+    """
+    Result of sync_tag_members()
+    Attributes:
+    tag_name - string - the tag
+    members - list - the full member list of the tag after the update
+    diff - MemberDiff - changes from the previous members
+    pushed - bool - whether set_fw_tag_members() was called
+    """
+
+    __slots__ = ()
+
+
+def diff_members(current, desired):
+    """
+    Compares member lists by canonical CIDR (names are not compared)
+    Arguments:
+    current - list - output of get_fw_tag_members()
+    desired - list - dicts with 'name' and 'cidr'
+    Returns:
+    MemberDiff
+    """
+    return _diff(dedup_members(current), dedup_members(desired))
+
+
+def _diff(current, desired):
+    # both lists hold unique canonical CIDRs
+    current_cidrs = set(member['cidr'] for member in current)
+    desired_cidrs = set(member['cidr'] for member in desired)
+    return MemberDiff([member for member in desired if member['cidr'] not in current_cidrs],
+                      [member for member in current if member['cidr'] not in desired_cidrs],
+                      len(current_cidrs & desired_cidrs))
+
+
+def plan_tag_members(current, desired, compact=False):
+    """
+    Computes the member list to push
+    Arguments:
+    current - list - output of get_fw_tag_members()
+    desired - list - dicts with 'name' and 'cidr'
+    compact - bool - collapse overlapping and adjacent CIDRs first
+    Returns:
+    tuple (members, MemberDiff); members keep their current names
+    """
+    desired = compact_members(desired) if compact else dedup_members(desired)
+    current = dedup_members(current)
+    diff = _diff(current, desired)
+    names = dict((member['cidr'], member['name']) for member in current)
+    members = [{'name': names.get(member['cidr'], member['name']), 'cidr': member['cidr']}
+               for member in desired]
+    return members, diff
+
+
+def sync_tag_members(controller, tag_name, members, compact=False):
+    """
+    Updates the members of a tag only if its CIDRs change
+    Arguments:
+    controller - Aviatrix - a logged in client
+    tag_name - string - the name of the FW policy tag
+    members - list - desired members, dicts with 'name' and 'cidr'
+    compact - bool - collapse overlapping and adjacent CIDRs first
+    Returns:
+    TagUpdate
+    """
+    current = controller.get_fw_tag_members(tag_name) or []
+    members, diff = plan_tag_members(current, members, compact)
+    if diff.changed:
+        controller.set_fw_tag_members(tag_name, members)
+    return TagUpdate(tag_name, members, diff, diff.changed)
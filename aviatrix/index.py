@@ -0,0 +1,292 @@
+"""
+In-memory index of the gateways known to a controller.
+
+Usage:
+
+index = controller.enable_gateway_index(max_age=300)
+controller.get_gateway_by_name('admin', 'gw-transit-hub')  # no API call while fresh
+gwy = index.get('gw-transit-hub')
+aws_east = index.by_region('us-east-1')
+"""
+
+import asyncio
+import threading
+import time
+
+
+def _account_names(accounts):
+    """
+    Extracts the account names from the output of list_accounts()
+    """
+    if isinstance(accounts, dict):
+        accounts = accounts.get('account_list', [])
+    names = []
+    for account in accounts or []:
+        name = account.get('account_name') if isinstance(account, dict) else account
+        if name:
+            names.append(name)
+    return names
+
+
+class GatewayIndex(object):
+    """
+    Gateway name to gateway record map covering every account returned by
+    list_accounts(), with secondary indexes by VPC ID, region and cloud type.
+    Each account is refreshed independently once it is older than max_age.
+    """
+
+    def __init__(self, controller, max_age=300):
+        """
+        Constructor
+        Arguments:
+        controller - Aviatrix - a logged in client
+        max_age - float - seconds before an account's gateways are re-read
+        """
+        self.controller = controller
+        self.max_age = max_age
+        self._by_name = {}
+        self._by_vpc_id = {}
+        self._by_region = {}
+        self._by_cloud_type = {}
+        # account name -> (time loaded, names of its gateways)
+        self._accounts = {}
+        self._accounts_loaded = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _add(index, key, name):
+        if key is not None:
+            index.setdefault(key, set()).add(name)
+
+    @staticmethod
+    def _remove(index, key, name):
+        names = index.get(key)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del index[key]
+
+    @staticmethod
+    def _cloud_type(value):
+        # the controller reports cloud_type as either a number or a string
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    def _drop(self, name):
+        gwy = self._by_name.pop(name, None)
+        if gwy is None:
+            return
+        self._remove(self._by_vpc_id, gwy.get('vpc_id'), name)
+        self._remove(self._by_region, gwy.get('vpc_region'), name)
+        self._remove(self._by_cloud_type, self._cloud_type(gwy.get('cloud_type')), name)
+
+    def _store(self, gwy):
+        name = gwy['vpc_name']
+        self._drop(name)
+        self._by_name[name] = gwy
+        self._add(self._by_vpc_id, gwy.get('vpc_id'), name)
+        self._add(self._by_region, gwy.get('vpc_region'), name)
+        self._add(self._by_cloud_type, self._cloud_type(gwy.get('cloud_type')), name)
+
+    def refresh_account(self, account_name):
+        """
+        Re-reads the gateways of a single account
+        Arguments:
+        account_name - string - the name of the cloud account
+        """
+        self._load_account(account_name, self.controller.list_gateways(account_name) or [])
+
+    def _load_account(self, account_name, gws):
+        """
+        Replaces the gateways of an account with the output of list_gateways()
+        """
+        with self._lock:
+            _, previous = self._accounts.get(account_name, (None, set()))
+            current = set()
+            for gwy in gws:
+                self._store(gwy)
+                current.add(gwy['vpc_name'])
+            for name in previous - current:
+                self._drop(name)
+            self._accounts[account_name] = (time.monotonic(), current)
+
+    def refresh(self, force=False):
+        """
+        Refreshes the account list and every account older than max_age
+        Arguments:
+        force - bool - refresh all accounts regardless of their age
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._accounts_stale(force, now):
+                self._load_accounts(self.controller.list_accounts(), now)
+            for account_name in self._stale_accounts(force, now):
+                self.refresh_account(account_name)
+
+    def _accounts_stale(self, force, now):
+        """
+        True if the account list must be reloaded
+        """
+        return force or self._accounts_loaded is None or now - self._accounts_loaded > self.max_age
+
+    def _load_accounts(self, accounts, now):
+        """
+        Replaces the account list with the output of list_accounts()
+        """
+        names = _account_names(accounts)
+        with self._lock:
+            for removed in set(self._accounts) - set(names):
+                for name in self._accounts.pop(removed)[1]:
+                    self._drop(name)
+            for name in names:
+                self._accounts.setdefault(name, (None, set()))
+            self._accounts_loaded = now
+
+    def _stale_accounts(self, force, now):
+        """
+        Returns:
+        the names of the accounts whose gateways must be reloaded
+        """
+        with self._lock:
+            return [account_name for account_name, (loaded, _) in self._accounts.items()
+                    if force or loaded is None or now - loaded > self.max_age]
+
+    def invalidate(self, account_name=None):
+        """
+        Marks one account (or all of them) stale so the next lookup reloads it
+        Arguments:
+        account_name - string - (optional) the name of the cloud account
+        """
+        with self._lock:
+            if account_name is None:
+                self._accounts_loaded = None
+                names = list(self._accounts)
+            else:
+                names = [account_name] if account_name in self._accounts else []
+            for name in names:
+                self._accounts[name] = (None, self._accounts[name][1])
+
+    @property
+    def fresh(self):
+        """
+        True if no account needs to be reloaded
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._accounts_loaded is None or now - self._accounts_loaded > self.max_age:
+                return False
+            return all(loaded is not None and now - loaded <= self.max_age
+                       for loaded, _ in self._accounts.values())
+
+    def _lookup(self, index, key):
+        if not self.fresh:
+            self.refresh()
+        return self._find(index, key)
+
+    def _find(self, index, key):
+        with self._lock:
+            return [self._by_name[name] for name in sorted(index.get(key, ()))]
+
+    def get(self, gw_name):
+        """
+        Gets a gateway by name
+        Arguments:
+        gw_name - string - the name of the gateway
+        Returns:
+        the gateway object (as returned by list_gateways) or None
+        """
+        if not self.fresh:
+            self.refresh()
+        return self._get(gw_name)
+
+    def _get(self, gw_name):
+        with self._lock:
+            return self._by_name.get(gw_name)
+
+    def by_vpc_id(self, vpc_id):
+        """
+        Returns:
+        list of gateways deployed in the given VPC
+        """
+        return self._lookup(self._by_vpc_id, vpc_id)
+
+    def by_region(self, region):
+        """
+        Returns:
+        list of gateways deployed in the given region
+        """
+        return self._lookup(self._by_region, region)
+
+    def by_cloud_type(self, cloud_type):
+        """
+        Returns:
+        list of gateways of the given Aviatrix.CloudType
+        """
+        return self._lookup(self._by_cloud_type, self._cloud_type(cloud_type))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_name)
+
+
+class AsyncGatewayIndex(GatewayIndex):
+    """
+    GatewayIndex of an AsyncAviatrix client: refresh(), refresh_account(),
+    get() and the by_*() lookups are coroutines, and the stale accounts are
+    reloaded concurrently
+    """
+
+    def __init__(self, controller, max_age=300):
+        """
+        Constructor
+        Arguments:
+        controller - AsyncAviatrix - a logged in client
+        max_age - float - seconds before an account's gateways are re-read
+        """
+        super(AsyncGatewayIndex, self).__init__(controller, max_age)
+        # created in the event loop that first refreshes (see _async_lock())
+        self._refresh_lock = None
+        self._refresh_loop = None
+
+    def _async_lock(self):
+        """
+        Returns the asyncio.Lock serializing refreshes, bound to the running
+        event loop
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._refresh_loop:
+            self._refresh_loop = loop
+            self._refresh_lock = asyncio.Lock()
+        return self._refresh_lock
+
+    async def refresh_account(self, account_name):
+        """
+        Coroutine version of GatewayIndex.refresh_account()
+        """
+        self._load_account(account_name, await self.controller.list_gateways(account_name) or [])
+
+    async def refresh(self, force=False):
+        """
+        Coroutine version of GatewayIndex.refresh()
+        """
+        async with self._async_lock():
+            now = time.monotonic()
+            if self._accounts_stale(force, now):
+                self._load_accounts(await self.controller.list_accounts(), now)
+            await asyncio.gather(*[self.refresh_account(account_name)
+                                   for account_name in self._stale_accounts(force, now)])
+
+    async def _lookup(self, index, key):
+        if not self.fresh:
+            await self.refresh()
+        return self._find(index, key)
+
+    async def get(self, gw_name):
+        """
+        Coroutine version of GatewayIndex.get()
+        """
+        if not self.fresh:
+            await self.refresh()
+        return self._get(gw_name)
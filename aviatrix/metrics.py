@@ -0,0 +1,247 @@
+"""
+Per-action request instrumentation.
+
+When a client has a metrics sink, every request sent to the controller is
+described by a RequestSample (action, endpoint, latency, request and
+response sizes, error) and handed to the sink.  Without a sink the request
+path only pays for a None check.
+
+Usage:
+
+sink = InMemorySink()
+controller = Aviatrix(controller_ip, metrics=sink)
+...
+print(sink.report())
+json.dump(sink.stats(), open('before-upgrade.json', 'w'))
+"""
+
+import bisect
+import collections
+import logging
+import re
+import socket
+import threading
+import urllib.error
+
+# upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+
+class RequestSample(collections.namedtuple('RequestSample',
+                                           ['action', 'endpoint', 'method', 'duration',
+                                            'request_bytes', 'response_bytes', 'error'])):
+    """
+    One request sent to the controller
+    Attributes:
+    action - string - the action name
+    endpoint - string - 'api' or 'backend1'
+    method - string - GET/POST
+    duration - float - seconds from sending the request to the decoded response
+    request_bytes - int - size of the request line and body
+    response_bytes - int - size of the response body (0 if none was received)
+    error - string - RESTException reason, 'HTTP <status>' or the exception
+                     type of a failed request (None on success)
+    """
+
+    __slots__ = ()
+
+
+def error_label(err):
+    """
+    Returns:
+    a short description of a transport error for the error counters
+    (RESTException errors are counted by their reason instead)
+    """
+    if err is None:
+        return None
+    if isinstance(err, urllib.error.HTTPError):
+        return 'HTTP {0}'.format(err.code)
+    return type(err).__name__
+
+
+class MetricsSink(object):
+    """
+    Interface of a metrics sink.  record() is called from the thread (or
+    event loop) that made the request, so it must be quick and thread safe.
+    """
+
+    def record(self, sample):
+        """
+        Records one request
+        Arguments:
+        sample - RequestSample - the request
+        """
+        raise NotImplementedError()
+
+
+class InMemorySink(MetricsSink):
+    """
+    Aggregates the samples per (endpoint, action) in memory
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Constructor
+        Arguments:
+        buckets - tuple - ascending latency bucket upper bounds in seconds
+        """
+        self.buckets = tuple(buckets)
+        self._actions = {}
+        self._lock = threading.Lock()
+
+    def _new_entry(self):
+        return {'calls': 0, 'errors': 0, 'latency_total': 0.0, 'latency_min': None,
+                'latency_max': 0.0, 'histogram': [0] * len(self.buckets),
+                'request_bytes': 0, 'response_bytes': 0,
+                'errors_by_reason': collections.Counter()}
+
+    def record(self, sample):
+        with self._lock:
+            entry = self._actions.get((sample.endpoint, sample.action))
+            if entry is None:
+                entry = self._actions[(sample.endpoint, sample.action)] = self._new_entry()
+            entry['calls'] += 1
+            entry['latency_total'] += sample.duration
+            if entry['latency_min'] is None or sample.duration < entry['latency_min']:
+                entry['latency_min'] = sample.duration
+            entry['latency_max'] = max(entry['latency_max'], sample.duration)
+            index = bisect.bisect_left(self.buckets, sample.duration)
+            entry['histogram'][min(index, len(self.buckets) - 1)] += 1
+            entry['request_bytes'] += sample.request_bytes
+            entry['response_bytes'] += sample.response_bytes
+            if sample.error is not None:
+                entry['errors'] += 1
+                entry['errors_by_reason'][sample.error] += 1
+
+    def stats(self):
+        """
+        Returns:
+        dict of endpoint to a dict of action to its counters ('calls',
+        'errors', 'latency_total', 'latency_min', 'latency_max',
+        'latency_avg', 'histogram' (list of [upper bound, count]),
+        'request_bytes', 'response_bytes', 'errors_by_reason'); the result
+        is JSON serializable so runs can be saved and compared
+        """
+        stats = {}
+        with self._lock:
+            for (endpoint, action), entry in self._actions.items():
+                values = dict(entry)
+                values['latency_avg'] = entry['latency_total'] / entry['calls']
+                values['histogram'] = [[bound if bound != float('inf') else '+Inf', count]
+                                       for bound, count in zip(self.buckets, entry['histogram'])]
+                values['errors_by_reason'] = dict(entry['errors_by_reason'])
+                stats.setdefault(endpoint, {})[action] = values
+        return stats
+
+    def report(self, sort_by='latency_total', limit=None):
+        """
+        Formats the hottest actions as a text table
+        Arguments:
+        sort_by - string - counter to sort by (descending)
+        limit - int - (optional) number of actions shown
+        Returns:
+        the table as a string
+        """
+        rows = [(endpoint, action, values) for endpoint, actions in self.stats().items()
+                for action, values in actions.items()]
+        rows.sort(key=lambda row: row[2][sort_by], reverse=True)
+        lines = ['{0:<9} {1:<40} {2:>7} {3:>6} {4:>10} {5:>10} {6:>12}'.format(
+            'endpoint', 'action', 'calls', 'errors', 'avg ms', 'max ms', 'resp bytes')]
+        for endpoint, action, values in rows[:limit]:
+            lines.append('{0:<9} {1:<40} {2:>7} {3:>6} {4:>10.1f} {5:>10.1f} {6:>12}'.format(
+                endpoint, action, values['calls'], values['errors'],
+                values['latency_avg'] * 1000, values['latency_max'] * 1000,
+                values['response_bytes']))
+        return '\n'.join(lines)
+
+    def clear(self):
+        """
+        Drops all the counters
+        """
+        with self._lock:
+            self._actions.clear()
+
+
+class LoggingSink(MetricsSink):
+    """
+    Logs every sample
+    """
+
+    def __init__(self, level=logging.INFO, logger=None):
+        """
+        Constructor
+        Arguments:
+        level - int - logging level of the messages
+        logger - logging.Logger - (optional) logger, defaults to the root logger
+        """
+        self.level = level
+        self.logger = logger or logging.getLogger()
+
+    def record(self, sample):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        self.logger.log(self.level, 'Aviatrix {0} {1} {2}: {3:.1f}ms, {4}B sent, {5}B received{6}'.format(
+            sample.method, sample.endpoint, sample.action, sample.duration * 1000,
+            sample.request_bytes, sample.response_bytes,
+            '' if sample.error is None else ', error: {0}'.format(sample.error)))
+
+
+class StatsDSink(MetricsSink):
+    """
+    Sends the samples to a StatsD daemon over UDP (fire and forget)
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='aviatrix'):
+        """
+        Constructor
+        Arguments:
+        host - string - StatsD host
+        port - int - StatsD UDP port
+        prefix - string - prefix of every metric name
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    @staticmethod
+    def _name(text):
+        return re.sub(r'[^A-Za-z0-9_-]+', '_', text).strip('_') or 'unknown'
+
+    def lines(self, sample):
+        """
+        Returns:
+        the StatsD lines describing a sample
+        """
+        name = '{0}.{1}.{2}'.format(self.prefix, sample.endpoint, self._name(sample.action))
+        lines = ['{0}.calls:1|c'.format(name),
+                 '{0}.latency:{1:.3f}|ms'.format(name, sample.duration * 1000),
+                 '{0}.request_bytes:{1}|c'.format(name, sample.request_bytes),
+                 '{0}.response_bytes:{1}|c'.format(name, sample.response_bytes)]
+        if sample.error is not None:
+            lines.append('{0}.errors.{1}:1|c'.format(name, self._name(sample.error)))
+        return lines
+
+    def record(self, sample):
+        try:
+            self._socket.sendto('\n'.join(self.lines(sample)).encode('utf-8'), self.address)
+        except OSError as err:
+            logging.debug('StatsD send failed: {0}'.format(err))
+
+    def close(self):
+        """
+        Closes the UDP socket
+        """
+        self._socket.close()
+
+
+class MultiSink(MetricsSink):
+    """
+    Forwards every sample to several sinks
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def record(self, sample):
+        for sink in self.sinks:
+            sink.record(sample)
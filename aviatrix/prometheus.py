@@ -0,0 +1,177 @@
+"""
+Prometheus exporter.
+
+A SnapshotPoller refreshes the fleet state on its own interval and the
+exporter renders the text exposition once per poll, so a scrape only copies
+a prepared buffer: scrapes never wait on the controller and adding
+Prometheus replicas adds no controller load.
+
+Usage:
+
+poller = SnapshotPoller(controller, interval=60, collect_stats=True)
+poller.start()
+serve_metrics(('', 9470), poller)
+"""
+
+import gzip
+import http.server
+import math
+import socketserver
+
+from .snapshot import is_gateway_down, is_peer_down
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (metric name, type, help, gateway_stat_summary key, multiplier)
+_GATEWAY_METRICS = [
+    ('aviatrix_gateway_cpu_load_percent', 'gauge', 'CPU time spent in kernel and user space.',
+     'cpu_load', 1),
+    ('aviatrix_gateway_cpu_idle_percent', 'gauge', 'Idle CPU time.', 'cpu_idle', 1),
+    ('aviatrix_gateway_memory_free_bytes', 'gauge', 'Free memory.', 'memory_free', 1024),
+    ('aviatrix_gateway_disk_free_bytes', 'gauge', 'Free disk space.', 'disk_free', 1024),
+    ('aviatrix_gateway_received_bytes_total', 'counter', 'Bytes received by the gateway.',
+     'bytes_in', 1),
+    ('aviatrix_gateway_sent_bytes_total', 'counter', 'Bytes sent by the gateway.',
+     'bytes_out', 1),
+]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(**labels):
+    return '{' + ','.join('{0}="{1}"'.format(name, _escape(value))
+                          for name, value in sorted(labels.items())) + '}'
+
+
+def _format_value(value):
+    """
+    Formats a sample value; the exposition format spells infinities and
+    NaN as +Inf, -Inf and NaN
+    """
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def _family(lines, name, metric_type, description, samples):
+    """
+    Appends one metric family (HELP, TYPE and its samples) to lines
+    """
+    lines.append('# HELP {0} {1}'.format(name, description))
+    lines.append('# TYPE {0} {1}'.format(name, metric_type))
+    for labels, value in samples:
+        lines.append('{0}{1} {2}'.format(name, labels, _format_value(value)))
+
+
+def render_snapshot(snapshot):
+    """
+    Renders a FleetSnapshot in the Prometheus text exposition format
+    Arguments:
+    snapshot - FleetSnapshot - the snapshot to render
+    Returns:
+    the exposition text
+    """
+    lines = []
+    _family(lines, 'aviatrix_snapshot_timestamp_seconds', 'gauge',
+            'Unix time of the last poll of the controller (0 before the first poll).',
+            [('', snapshot.taken)])
+    if not snapshot.taken:
+        return '\n'.join(lines) + '\n'
+    _family(lines, 'aviatrix_snapshot_fetch_duration_seconds', 'gauge',
+            'Time spent fetching each part of the last snapshot.',
+            [(_labels(part=part), duration) for part, duration in sorted(snapshot.durations.items())])
+    _family(lines, 'aviatrix_snapshot_fetch_error', 'gauge',
+            'Whether fetching the part failed in the last poll (1) or not (0).',
+            [(_labels(part=part), 1 if part in snapshot.errors else 0)
+             for part in sorted(snapshot.durations)])
+    _family(lines, 'aviatrix_gateways', 'gauge', 'Number of gateways.',
+            [('', len(snapshot.gateways))])
+    _family(lines, 'aviatrix_gateway_up', 'gauge', 'Whether the gateway is running or up.',
+            [(_labels(gateway=gwy.get('vpc_name', ''), vpc_id=gwy.get('vpc_id', ''),
+                      region=gwy.get('vpc_region', ''), cloud_type=gwy.get('cloud_type', '')),
+              0 if is_gateway_down(gwy) else 1) for gwy in snapshot.gateways])
+    _family(lines, 'aviatrix_peerings', 'gauge', 'Number of peerings.',
+            [('', len(snapshot.peers))])
+    _family(lines, 'aviatrix_peering_up', 'gauge', 'Whether the peering is up.',
+            [(_labels(gateway1=peer.get('vpc_name1', ''), gateway2=peer.get('vpc_name2', ''),
+                      state=str(peer.get('peering_state', '')).lower()),
+              0 if is_peer_down(peer) else 1) for peer in snapshot.peers])
+    for name, metric_type, description, key, multiplier in _GATEWAY_METRICS:
+        samples = [(_labels(gateway=gw_name), summary[key] * multiplier)
+                   for gw_name, summary in sorted(snapshot.stats.items()) if key in summary]
+        if samples:
+            _family(lines, name, metric_type, description, samples)
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the pre-rendered exposition on /metrics
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body, compressed = self.server.rendered
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = compressed
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class MetricsServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    HTTP server exposing the snapshot of a SnapshotPoller to Prometheus
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, poller):
+        """
+        Constructor
+        Arguments:
+        address - tuple - (host, port) to listen on
+        poller - SnapshotPoller - the poller providing the snapshot
+        """
+        self.poller = poller
+        self.rendered = None
+        self.update(poller.snapshot)
+        poller.add_listener(self.update)
+        http.server.HTTPServer.__init__(self, address, _MetricsRequestHandler)
+
+    def update(self, snapshot):
+        """
+        Renders a new snapshot (called by the poller after every poll)
+        """
+        body = render_snapshot(snapshot).encode('utf-8')
+        # swap both buffers at once so a scrape never mixes two snapshots
+        self.rendered = (body, gzip.compress(body))
+
+
+def serve_metrics(address, poller):
+    """
+    Serves the metrics until interrupted
+    Arguments:
+    address - tuple - (host, port) to listen on
+    poller - SnapshotPoller - a started poller
+    """
+    server = MetricsServer(address, poller)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,239 @@
+"""
+Client-side throttling of the requests sent to a controller.
+
+A ControllerGovernor combines one token bucket per action family ('read',
+'write' and 'backend' for the backend1 endpoint) with a limit on the number
+of requests in flight.  Clients talking to the same controller should share
+one governor (see shared_governor()), so that the budget holds for the whole
+process rather than per client instance.
+
+Usage:
+
+governor = shared_governor(controller_ip, rates={'read': 20, 'write': 2},
+                           max_in_flight=8)
+controller = Aviatrix(controller_ip, governor=governor)
+...
+print(governor.stats())
+"""
+
+import asyncio
+import threading
+import time
+
+from .retry import is_read_action
+
+FAMILIES = ('read', 'write', 'backend')
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket.  Callers reserve a token and wait the returned
+    delay, which lets both threads and coroutines use the same bucket.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Constructor
+        Arguments:
+        rate - float - tokens added per second
+        burst - float - bucket capacity (default: one second worth of tokens,
+                        at least 1)
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Takes tokens from the bucket, going into debt if it is empty
+        Returns:
+        seconds the caller must wait before using the tokens
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until the tokens are available
+        Returns:
+        seconds waited
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class ControllerGovernor(object):
+    """
+    Rate and concurrency limits for the requests sent to one controller
+    """
+
+    # polling interval bounds of coroutines waiting for an in-flight slot
+    _ASYNC_POLL = (0.001, 0.05)
+
+    def __init__(self, rates=None, bursts=None, max_in_flight=None):
+        """
+        Constructor
+        Arguments:
+        rates - dict - requests per second per family ('read', 'write',
+                       'backend'); a family without a rate is not limited
+        bursts - dict - (optional) bucket capacity per family
+        max_in_flight - int - (optional) most requests in flight at once,
+                              over all families
+        """
+        rates = rates or {}
+        bursts = bursts or {}
+        unknown = set(rates) - set(FAMILIES)
+        if unknown:
+            raise ValueError('Unknown action families {0}'.format(sorted(unknown)))
+        self.buckets = dict((family, TokenBucket(rate, bursts.get(family)))
+                            for family, rate in rates.items() if rate)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._slots = threading.Condition()
+        self._stats = dict((family, {'requests': 0, 'delayed': 0, 'wait_total': 0.0,
+                                     'wait_max': 0.0}) for family in FAMILIES)
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def family(action, is_backend=False):
+        """
+        Returns:
+        the family ('read', 'write' or 'backend') of an action
+        """
+        if is_backend:
+            return 'backend'
+        return 'read' if is_read_action(action) else 'write'
+
+    def limits(self):
+        """
+        Returns:
+        dict with the 'rates', 'bursts' and 'max_in_flight' in effect
+        """
+        return {'rates': dict((family, bucket.rate) for family, bucket in self.buckets.items()),
+                'bursts': dict((family, bucket.burst) for family, bucket in self.buckets.items()),
+                'max_in_flight': self.max_in_flight}
+
+    def _try_enter(self):
+        with self._slots:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def _record(self, family, delayed, waited):
+        with self._stats_lock:
+            stats = self._stats[family]
+            stats['requests'] += 1
+            stats['wait_total'] += waited
+            stats['wait_max'] = max(stats['wait_max'], waited)
+            if delayed:
+                stats['delayed'] += 1
+
+    def acquire(self, action, is_backend=False):
+        """
+        Blocks until a request for the action may be sent.  Every acquire()
+        must be followed by a release() once the response is read.
+        """
+        family = self.family(action, is_backend)
+        start = time.monotonic()
+        bucket = self.buckets.get(family)
+        delayed = bucket is not None and bucket.acquire() > 0
+        with self._slots:
+            while self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                delayed = True
+                self._slots.wait()
+            self.in_flight += 1
+        self._record(family, delayed, time.monotonic() - start)
+
+    async def acquire_async(self, action, is_backend=False):
+        """
+        Coroutine version of acquire()
+        """
+        family = self.family(action, is_backend)
+        start = time.monotonic()
+        bucket = self.buckets.get(family)
+        delay = bucket.reserve() if bucket is not None else 0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        delayed = delay > 0
+        # the slots are shared with threads, so poll instead of blocking the loop
+        poll = self._ASYNC_POLL[0]
+        while not self._try_enter():
+            delayed = True
+            await asyncio.sleep(poll)
+            poll = min(poll * 2, self._ASYNC_POLL[1])
+        self._record(family, delayed, time.monotonic() - start)
+
+    def release(self):
+        """
+        Frees the in-flight slot taken by acquire()
+        """
+        with self._slots:
+            self.in_flight -= 1
+            self._slots.notify()
+
+    def stats(self):
+        """
+        Returns:
+        dict of family to {'requests', 'delayed' (requests that had to wait),
+        'wait_total', 'wait_max', 'wait_avg'} (seconds), plus the current
+        'in_flight' count
+        """
+        with self._stats_lock:
+            stats = dict((family, dict(values)) for family, values in self._stats.items())
+        for values in stats.values():
+            values['wait_avg'] = values['wait_total'] / values['requests'] if values['requests'] else 0.0
+        stats['in_flight'] = self.in_flight
+        return stats
+
+    def reset_stats(self):
+        """
+        Clears the wait time counters
+        """
+        with self._stats_lock:
+            for values in self._stats.values():
+                values.update(requests=0, delayed=0, wait_total=0.0, wait_max=0.0)
+
+
+_GOVERNORS = {}
+_GOVERNORS_LOCK = threading.Lock()
+
+
+def shared_governor(controller_ip, rates=None, bursts=None, max_in_flight=None):
+    """
+    Returns the process wide governor of a controller, creating it with the
+    given limits on first use.  Later calls return the same governor; they
+    may omit the limits but must not ask for different ones.
+    Arguments:
+    controller_ip - string - host name or IP address of the controller
+    rates - dict - requests per second per family (see ControllerGovernor)
+    bursts - dict - bucket capacity per family
+    max_in_flight - int - most requests in flight at once
+    Returns:
+    the ControllerGovernor
+    Raises:
+    ValueError if the governor of the controller has different limits
+    """
+    requested = ControllerGovernor(rates, bursts, max_in_flight)
+    with _GOVERNORS_LOCK:
+        governor = _GOVERNORS.get(controller_ip)
+        if governor is None:
+            _GOVERNORS[controller_ip] = requested
+            return requested
+    if (rates is not None or bursts is not None or max_in_flight is not None) and \
+            requested.limits() != governor.limits():
+        raise ValueError('The governor of {0} already has the limits {1}, not {2}'.format(
+            controller_ip, governor.limits(), requested.limits()))
+    return governor
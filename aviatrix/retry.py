@@ -0,0 +1,229 @@
+"""
+Retries and circuit breaking for transient controller failures.
+
+A RetryPolicy decides whether a failed request is sent again and how long to
+wait first (exponential backoff with full jitter, or the server's
+Retry-After).  Read actions are retried by default; mutating actions only
+when retry_writes is enabled, since a request whose response was lost may
+already have been applied.  A CircuitBreaker stops sending requests for a
+while after consecutive transient failures, so an overloaded controller is
+not hit by a growing pile of retries.
+
+Usage:
+
+controller = Aviatrix(controller_ip,
+                      retry=RetryPolicy(max_attempts=4, backoff=0.5),
+                      circuit_breaker=CircuitBreaker(failure_threshold=5,
+                                                     reset_timeout=30))
+"""
+
+import email.utils
+import http.client
+import random
+import threading
+import time
+import urllib.error
+
+# prefixes of the actions that only read controller state
+READ_ACTION_PREFIXES = ('list_', 'get_', 'show_')
+
+# other read-only (or idempotent) actions
+READ_ACTIONS = frozenset([
+    'login',
+    # get_fw_policy_full()
+    'vpc_access_policy',
+])
+
+# HTTP status codes of a controller (or proxy) that is temporarily unable to
+# answer
+TRANSIENT_STATUS_CODES = frozenset([408, 429, 500, 502, 503, 504])
+
+
+def is_read_action(action):
+    """
+    True if the action only reads controller state and is safe to repeat
+    """
+    return action in READ_ACTIONS or action.startswith(READ_ACTION_PREFIXES)
+
+
+def is_transient_error(err):
+    """
+    True if err is a network failure or an HTTP status meaning the
+    controller is overloaded or temporarily unavailable
+    """
+    if isinstance(err, urllib.error.HTTPError):
+        return err.code in TRANSIENT_STATUS_CODES
+    # RESTException means the controller answered; the request itself failed
+    return isinstance(err, (OSError, EOFError, http.client.HTTPException))
+
+
+def retry_after(err):
+    """
+    Returns:
+    the delay in seconds requested by the Retry-After header of an HTTP
+    error, or None
+    """
+    headers = getattr(err, 'headers', None)
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker is open
+    """
+
+    def __init__(self, retry_in):
+        """
+        Constructor
+        Arguments:
+        retry_in - float - seconds until the breaker lets a trial request through
+        """
+        super(CircuitOpenError, self).__init__(
+            'Aviatrix controller unavailable; circuit open for another {0:.1f}s'.format(retry_in))
+        self.retry_in = retry_in
+
+
+class RetryPolicy(object):
+    """
+    Retry rules of the request layer
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30, retry_writes=False,
+                 max_retry_after=120):
+        """
+        Constructor
+        Arguments:
+        max_attempts - int - attempts per request, including the first one
+        backoff - float - base delay in seconds; attempt n waits a random
+                          time up to backoff * 2 ** n (full jitter)
+        max_backoff - float - longest delay between two attempts
+        retry_writes - bool - also retry mutating actions
+        max_retry_after - float - longest Retry-After delay honoured; a
+                                  request asking for more is not retried
+        """
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_writes = retry_writes
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, action, attempt, err):
+        """
+        Decides whether a failed request is sent again
+        Arguments:
+        action - string - the action name
+        attempt - int - number of attempts already made (1 after the first)
+        err - Exception - the error of the last attempt
+        Returns:
+        True to retry
+        """
+        if attempt >= self.max_attempts or not is_transient_error(err):
+            return False
+        return self.retry_writes or is_read_action(action)
+
+    def delay(self, attempt, err=None):
+        """
+        Returns:
+        seconds to wait before the next attempt (None to give up because the
+        server asked for a longer pause than max_retry_after)
+        """
+        requested = retry_after(err)
+        if requested is not None:
+            return requested if requested <= self.max_retry_after else None
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def next_delay(self, action, attempt, err):
+        """
+        Combines should_retry() and delay()
+        Returns:
+        seconds to wait before retrying, or None if the error is final
+        """
+        if not self.should_retry(action, attempt, err):
+            return None
+        return self.delay(attempt, err)
+
+
+class CircuitBreaker(object):
+    """
+    Thread safe circuit breaker.  After failure_threshold consecutive
+    transient failures it opens and every request fails with
+    CircuitOpenError for reset_timeout seconds; then one trial request is let
+    through, which closes the breaker on success or opens it again on failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """
+        Constructor
+        Arguments:
+        failure_threshold - int - consecutive failures that open the breaker
+        reset_timeout - float - seconds the breaker stays open
+        """
+        if failure_threshold < 1:
+            raise ValueError('failure_threshold must be at least 1')
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self._opened_at = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Must be called before sending a request
+        Raises:
+        CircuitOpenError if the request must not be sent
+        """
+        with self._lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == CircuitBreaker.OPEN and remaining <= 0:
+                self.state = CircuitBreaker.HALF_OPEN
+            if self.state == CircuitBreaker.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(max(0.0, remaining))
+
+    def release(self):
+        """
+        Must be called instead of record() when a request sent after
+        before_call() ends without an outcome (e.g. it was cancelled), so
+        that a trial request does not keep the breaker half open forever
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, err=None):
+        """
+        Records the outcome of a request sent after before_call()
+        Arguments:
+        err - Exception - the error of the request (None on success); only
+                          transient errors count as failures
+        """
+        with self._lock:
+            self._trial_in_flight = False
+            if err is None or not is_transient_error(err):
+                self.state = CircuitBreaker.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
@@ -0,0 +1,123 @@
+"""
+Persistent storage of controller sessions (CIDs) so that short lived
+processes can reuse a login instead of logging in on every run.
+
+Usage:
+
+controller = Aviatrix(controller_ip, session_store=FileSessionStore())
+controller.login(username, password)   # reuses a saved CID if still valid
+"""
+
+import json
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class SessionStore(object):
+    """
+    Interface of a session store.  Subclass it to keep sessions somewhere
+    else (e.g. a shared cache).
+    """
+
+    def load(self, controller_ip, username):
+        """
+        Returns:
+        the saved CID or None if there is no valid session
+        """
+        raise NotImplementedError()
+
+    def save(self, controller_ip, username, cid):
+        """
+        Saves the CID of a successful login
+        """
+        raise NotImplementedError()
+
+    def discard(self, controller_ip, username):
+        """
+        Forgets the session (e.g. after the controller rejected the CID)
+        """
+        raise NotImplementedError()
+
+
+class FileSessionStore(SessionStore):
+    """
+    Keeps sessions in a JSON file readable only by the current user.  Access
+    is serialized with an exclusive lock on a companion .lock file, so
+    concurrent processes share the file safely.
+    """
+
+    DEFAULT_PATH = os.path.join('~', '.aviatrix', 'sessions.json')
+
+    def __init__(self, path=None, max_age=3600):
+        """
+        Constructor
+        Arguments:
+        path - string - session file (default ~/.aviatrix/sessions.json)
+        max_age - float - seconds a saved CID is reused before logging in again
+        """
+        self.path = os.path.expanduser(path or FileSessionStore.DEFAULT_PATH)
+        self.max_age = max_age
+
+    @staticmethod
+    def _key(controller_ip, username):
+        return '{0}|{1}'.format(controller_ip, username)
+
+    def _locked(self):
+        """
+        Opens and exclusively locks the lock file
+        """
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        lock = open(self.path + '.lock', 'a')
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _read(self):
+        try:
+            with open(self.path) as sessions:
+                return json.load(sessions)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, sessions):
+        directory = os.path.dirname(self.path) or '.'
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.sessions')
+        try:
+            with os.fdopen(handle, 'w') as temp:
+                json.dump(sessions, temp)
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def load(self, controller_ip, username):
+        with self._locked():
+            session = self._read().get(self._key(controller_ip, username))
+        if not session or time.time() - session.get('saved', 0) > self.max_age:
+            return None
+        return session.get('cid')
+
+    def save(self, controller_ip, username, cid):
+        with self._locked():
+            sessions = self._read()
+            now = time.time()
+            # drop expired sessions while we hold the lock
+            sessions = {key: value for key, value in sessions.items()
+                        if now - value.get('saved', 0) <= self.max_age}
+            sessions[self._key(controller_ip, username)] = {'cid': cid, 'saved': now}
+            self._write(sessions)
+
+    def discard(self, controller_ip, username):
+        with self._locked():
+            sessions = self._read()
+            if sessions.pop(self._key(controller_ip, username), None) is not None:
+                self._write(sessions)
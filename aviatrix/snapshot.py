@@ -0,0 +1,271 @@
+"""
+Periodically refreshed, in-memory snapshot of a controller's fleet state,
+shared by monitoring integrations so the controller sees one poll per
+interval no matter how many consumers read the data.
+
+Usage:
+
+poller = SnapshotPoller(controller, interval=60)
+poller.start()
+...
+snapshot = poller.snapshot
+print(len(snapshot.gateways), count_down_peers(snapshot.peers))
+"""
+
+import collections
+import logging
+import re
+import threading
+import time
+
+from .batch import BatchCall
+
+# multipliers of the size suffixes used in ifstats ('232.46MB')
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2,
+               'G': 1024 ** 3, 'GB': 1024 ** 3, 'T': 1024 ** 4, 'TB': 1024 ** 4}
+_SIZE_RE = re.compile(r'^\s*([0-9.]+)\s*([A-Za-z]*)\s*$')
+
+
+def is_gateway_down(gwy):
+    """
+    True if the gateway (from list_gateways) is neither running nor up
+    """
+    return gwy.get('inst_state') != 'running' and gwy.get('vpc_state') != 'up'
+
+
+def is_peer_down(peer):
+    """
+    True if the peering (from list_peers) is not up
+    """
+    return str(peer.get('peering_state', '')).lower() != 'up'
+
+
+def count_down_gateways(gws):
+    """
+    Returns:
+    number of gateways that are not in an UP/running state
+    """
+    return sum(1 for gwy in gws if is_gateway_down(gwy))
+
+
+def count_down_peers(peers):
+    """
+    Returns:
+    number of peers that are not UP
+    """
+    return sum(1 for peer in peers if is_peer_down(peer))
+
+
+def parse_size(text):
+    """
+    Converts a size such as '232.46MB' to a number of bytes
+    Arguments:
+    text - string - the size (a plain number is taken as bytes)
+    Returns:
+    the size in bytes as an int
+    """
+    match = _SIZE_RE.match(str(text))
+    if not match or match.group(2).upper() not in _SIZE_UNITS:
+        raise ValueError('Unrecognized size {0!r}'.format(text))
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def gateway_stat_summary(gw_data):
+    """
+    Extracts the usual metrics from one entry of get_current_gateway_statistics()
+    Arguments:
+    gw_data - dict - statistics of one gateway
+    Returns:
+    dict of metric name (cpu_load, cpu_idle, memory_free, disk_free,
+    bytes_in, bytes_out) to its value; memory and disk are in kb
+    """
+    current = gw_data['mpstats']['stats_current']
+    cpu = current['cpu']
+    cumulative = gw_data['ifstats']['Cumulative (sent/received/total)']
+    return {'cpu_load': cpu['ks'] + cpu['us'],
+            'cpu_idle': cpu['idle'],
+            'memory_free': int(current['memory']['free']),
+            'disk_free': int(gw_data['hdisk_free']),
+            'bytes_in': parse_size(cumulative[1]),
+            'bytes_out': parse_size(cumulative[0])}
+
+
+def collect_gateway_stats(controller, gw_names, max_workers=32):
+    """
+    Fetches the current statistics of many gateways in one concurrent sweep
+    Arguments:
+    controller - Aviatrix - a logged in client
+    gw_names - list - gateway names
+    max_workers - int - maximum number of requests in flight
+    Returns:
+    tuple of (OrderedDict of gateway name to gateway_stat_summary(),
+              dict of gateway name to the error message of a failed fetch)
+    """
+    calls = [BatchCall('get_current_gateway_statistics', (gw_name,)) for gw_name in gw_names]
+    summaries = collections.OrderedDict()
+    errors = {}
+    for item in controller.batch(calls, max_workers):
+        gw_name = item.call.args[0]
+        if not item.ok:
+            errors[gw_name] = str(item.error)
+            continue
+        for gw_data in item.value or []:
+            try:
+                summaries[gw_data.get('gw_name', gw_name)] = gateway_stat_summary(gw_data)
+            except (KeyError, TypeError, ValueError) as err:
+                errors[gw_name] = 'Unexpected statistics format: {0!r}'.format(err)
+    return summaries, errors
+
+
+class FleetSnapshot(collections.namedtuple('FleetSnapshot',
+                                           ['taken', 'gateways', 'peers', 'stats',
+                                            'durations', 'errors'])):
+    """
+    State of the fleet at one point in time
+    Attributes:
+    taken - float - unix time the poll started
+    gateways - list - output of list_gateways()
+    peers - list - output of list_peers()
+    stats - dict - gateway name to gateway_stat_summary() (empty unless the
+                   poller collects statistics)
+    durations - dict - seconds spent fetching each part ('gateways', 'peers', ...)
+    errors - dict - part name to the error message of a failed fetch
+    """
+
+    __slots__ = ()
+
+
+EMPTY_SNAPSHOT = FleetSnapshot(0, [], [], {}, {}, {})
+
+
+class SnapshotPoller(object):
+    """
+    Polls the controller on a fixed interval in a background thread and
+    keeps the latest FleetSnapshot.  A part that fails to refresh keeps its
+    previous value and reports the error in FleetSnapshot.errors.
+    """
+
+    def __init__(self, controller, interval=60, account_name='admin', collect_stats=False,
+                 max_workers=32):
+        """
+        Constructor
+        Arguments:
+        controller - Aviatrix - a logged in client
+        interval - float - seconds between polls
+        account_name - string - account passed to list_gateways()
+        collect_stats - bool - also fetch the current statistics of every gateway
+        max_workers - int - maximum number of statistics requests in flight
+        """
+        self.controller = controller
+        self.interval = interval
+        self.account_name = account_name
+        self.collect_stats = collect_stats
+        self.max_workers = max_workers
+        self.snapshot = EMPTY_SNAPSHOT
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback):
+        """
+        Registers a function called with every new FleetSnapshot, from the
+        polling thread, right after it replaces the previous one
+        Arguments:
+        callback - function - takes the new FleetSnapshot
+        """
+        self._listeners.append(callback)
+
+    def _fetch(self, name, func, previous, durations, errors):
+        """
+        Runs one fetch, recording its duration and error
+        """
+        start = time.monotonic()
+        try:
+            return func()
+        except Exception as err:  # pylint: disable=broad-except
+            logging.warning('Snapshot: failed to fetch {0}: {1}'.format(name, err))
+            errors[name] = str(err)
+            return previous
+        finally:
+            durations[name] = time.monotonic() - start
+
+    def _poll_parts(self, previous, durations, errors):
+        """
+        Fetches the parts of a snapshot
+        Returns:
+        dict of FleetSnapshot field name to value
+        """
+        parts = {'gateways': self._fetch('gateways',
+                                         lambda: self.controller.list_gateways(self.account_name) or [],
+                                         previous.gateways, durations, errors),
+                 'peers': self._fetch('peers', lambda: self.controller.list_peers() or [],
+                                      previous.peers, durations, errors)}
+        if self.collect_stats:
+            parts['stats'] = self._poll_stats(parts['gateways'], previous, durations, errors)
+        return parts
+
+    def _poll_stats(self, gws, previous, durations, errors):
+        """
+        Fetches the statistics of the gateways; a gateway whose statistics
+        fail keeps its previous values
+        """
+        start = time.monotonic()
+        summaries, failed = collect_gateway_stats(self.controller,
+                                                  [gwy['vpc_name'] for gwy in gws if 'vpc_name' in gwy],
+                                                  self.max_workers)
+        durations['stats'] = time.monotonic() - start
+        if failed:
+            logging.warning('Snapshot: failed to fetch statistics of {0} gateways'.format(len(failed)))
+            errors['stats'] = '{0} of {1} gateways failed: {2}'.format(
+                len(failed), len(gws),
+                '; '.join('{0}: {1}'.format(name, err) for name, err in sorted(failed.items())))
+        for gw_name in failed:
+            if gw_name in previous.stats:
+                summaries[gw_name] = previous.stats[gw_name]
+        return summaries
+
+    def poll_once(self):
+        """
+        Refreshes the snapshot now
+        Returns:
+        the new FleetSnapshot
+        """
+        taken = time.time()
+        durations = {}
+        errors = {}
+        parts = self._poll_parts(self.snapshot, durations, errors)
+        # replace the whole snapshot at once so readers never see a mix
+        self.snapshot = self.snapshot._replace(taken=taken, durations=durations,
+                                               errors=errors, **parts)
+        for callback in self._listeners:
+            try:
+                callback(self.snapshot)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('Snapshot: listener failed')
+        return self.snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.poll_once()
+            self._stop.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        """
+        Starts polling in a daemon thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='aviatrix-snapshot-poller')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops polling
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
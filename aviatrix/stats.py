@@ -0,0 +1,182 @@
+"""
+Columnar (NumPy) representation of gateway statistics.
+
+get_statistics returns, per gateway, a list of (timestamp, value) points.
+to_arrays() turns that into one timestamp array and one value array per
+gateway, and align() puts several gateways on a shared time axis, so series
+can be aggregated with vectorized operations instead of Python loops.
+
+NumPy is an optional dependency (pip install aviatrix-sdk-python3[stats]);
+it is only imported when one of the array functions is used.
+
+Usage:
+
+series = controller.get_gateway_statistic_over_time(gw_names, start, end,
+                                                    Aviatrix.StatName.CPU_IDLE,
+                                                    as_arrays=True)
+for gw_name, data in series.items():
+    print(gw_name, stats.mean(data.values), stats.percentile(data.values, 95))
+
+times, names, matrix = stats.align(series)
+busiest = names[stats.maximum(matrix, axis=1).argmax()]
+"""
+
+import collections
+
+_NAME_KEYS = ('gw_name', 'name', 'vpc_name')
+_DATA_KEYS = ('data', 'values', 'points')
+_TIME_KEYS = ('time', 'timestamp', 'ts')
+_VALUE_KEYS = ('value', 'val')
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('NumPy is required for array statistics '
+                          '(pip install aviatrix-sdk-python3[stats])')
+    return numpy
+
+
+def _first(obj, keys):
+    for key in keys:
+        if key in obj:
+            return obj[key]
+    return None
+
+
+def _point(point):
+    """
+    Returns (timestamp, value) of a [timestamp, value] pair or a dict point
+    """
+    if isinstance(point, dict):
+        return _first(point, _TIME_KEYS), _first(point, _VALUE_KEYS)
+    return point[0], point[1]
+
+
+def iter_gateway_series(results):
+    """
+    Normalizes the results of get_statistics.
+    Arguments:
+    results - list or dict - results of get_gateway_statistic_over_time();
+              either a list of per gateway objects holding the gateway name
+              and its data points, or a dict of gateway name to data points
+    Returns:
+    generator of (gw_name, list of (timestamp, value)) tuples
+    """
+    if isinstance(results, dict):
+        items = results.items()
+    else:
+        items = ((_first(entry, _NAME_KEYS), entry) for entry in results or [])
+    for gw_name, data in items:
+        if isinstance(data, dict):
+            data = _first(data, _DATA_KEYS) or []
+        yield gw_name, [_point(point) for point in data]
+
+
+class StatSeries(collections.namedtuple('StatSeries', ['gw_name', 'timestamps', 'values'])):
+    """
+    Time series of a single gateway statistic
+    Attributes:
+    gw_name - string - the gateway name
+    timestamps - numpy.ndarray - int64 unix times (seconds), ascending
+    values - numpy.ndarray - float64 values (NaN where the controller sent none)
+    """
+
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+def series_from_points(gw_name, points):
+    """
+    Builds a StatSeries from (timestamp, value) points in any order
+    """
+    numpy = _numpy()
+    timestamps = numpy.fromiter((int(float(ts)) for ts, _ in points), dtype=numpy.int64,
+                                count=len(points))
+    values = numpy.fromiter((numpy.nan if value is None else float(value) for _, value in points),
+                            dtype=numpy.float64, count=len(points))
+    order = numpy.argsort(timestamps, kind='stable')
+    return StatSeries(gw_name, timestamps[order], values[order])
+
+
+def to_arrays(results):
+    """
+    Converts get_statistics results to arrays
+    Arguments:
+    results - list or dict - results of get_gateway_statistic_over_time()
+    Returns:
+    dict of gateway name to StatSeries
+    """
+    return {gw_name: series_from_points(gw_name, points)
+            for gw_name, points in iter_gateway_series(results)}
+
+
+def align(series, names=None):
+    """
+    Puts several series on a shared time axis
+    Arguments:
+    series - dict - gateway name to StatSeries (as returned by to_arrays())
+    names - list - (optional) gateway names (rows) to include, in order
+    Returns:
+    tuple (timestamps, names, values) where values is a 2-D array with one
+    row per gateway and one column per timestamp; missing points are NaN
+    """
+    numpy = _numpy()
+    names = list(series) if names is None else list(names)
+    if not names:
+        return numpy.empty(0, dtype=numpy.int64), names, numpy.empty((0, 0))
+    timestamps = numpy.unique(numpy.concatenate([series[name].timestamps for name in names]))
+    values = numpy.full((len(names), len(timestamps)), numpy.nan)
+    for row, name in enumerate(names):
+        columns = numpy.searchsorted(timestamps, series[name].timestamps)
+        values[row, columns] = series[name].values
+    return timestamps, names, values
+
+
+def minimum(values, axis=None):
+    """
+    Minimum ignoring missing (NaN) points
+    """
+    return _numpy().nanmin(values, axis=axis)
+
+
+def maximum(values, axis=None):
+    """
+    Maximum ignoring missing (NaN) points
+    """
+    return _numpy().nanmax(values, axis=axis)
+
+
+def mean(values, axis=None):
+    """
+    Mean ignoring missing (NaN) points
+    """
+    return _numpy().nanmean(values, axis=axis)
+
+
+def percentile(values, q, axis=None):
+    """
+    q-th percentile (0-100, scalar or sequence) ignoring missing (NaN) points
+    """
+    return _numpy().nanpercentile(values, q, axis=axis)
+
+
+def rate(timestamps, values):
+    """
+    Per second rate of change of a counter (e.g. cumulative bytes)
+    Arguments:
+    timestamps - numpy.ndarray - ascending unix times, shape (n,)
+    values - numpy.ndarray - shape (n,) or (gateways, n)
+    Returns:
+    tuple (timestamps, rates) where timestamps are the end of each interval,
+    shape (n - 1,), and rates has shape (n - 1,) or (gateways, n - 1)
+    """
+    numpy = _numpy()
+    timestamps = numpy.asarray(timestamps)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    elapsed = numpy.diff(timestamps).astype(numpy.float64)
+    elapsed[elapsed == 0] = numpy.nan
+    return timestamps[1:], numpy.diff(values, axis=-1) / elapsed
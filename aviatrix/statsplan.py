@@ -0,0 +1,160 @@
+"""
+Query planner for gateway statistics.
+
+get_statistics takes one statistic, one time window and a comma separated
+list of gateway names.  StatsQueryPlanner splits a (gateways x statistics x
+time range) request into bounded queries, runs them concurrently and
+stitches the answers back into one ordered series per (gateway, statistic).
+
+Usage:
+
+planner = StatsQueryPlanner(controller, max_window=datetime.timedelta(hours=6),
+                            max_gateways=25)
+series = planner.run(gw_names,
+                     [Aviatrix.StatName.CPU_IDLE, Aviatrix.StatName.MEMORY_FREE],
+                     start, end)
+for (gw_name, stat), points in series.items():
+    ...
+"""
+
+import collections
+import datetime
+import logging
+
+from . import stats
+from .batch import BatchCall
+
+
+class StatsQuery(collections.namedtuple('StatsQuery', ['gw_names', 'stat', 'start', 'end'])):
+    """
+    A single get_statistics request
+    Attributes:
+    gw_names - tuple - gateway names
+    stat - string - Aviatrix.StatName value
+    start - datetime - start of the window
+    end - datetime - end of the window
+    """
+
+    __slots__ = ()
+
+
+class StatsQueryPlanner(object):
+    """
+    Splits statistics requests into bounded time windows and gateway batches
+    """
+
+    def __init__(self, controller, max_window=datetime.timedelta(hours=6), max_gateways=25,
+                 max_names_length=1000, max_workers=8):
+        """
+        Constructor
+        Arguments:
+        controller - Aviatrix - a logged in client
+        max_window - timedelta - longest time window of a single query
+        max_gateways - int - most gateway names in a single query
+        max_names_length - int - longest comma separated gw_name parameter
+        max_workers - int - maximum number of queries in flight
+        """
+        if max_window <= datetime.timedelta(0):
+            raise ValueError('max_window must be positive')
+        if max_gateways < 1:
+            raise ValueError('max_gateways must be at least 1')
+        self.controller = controller
+        self.max_window = max_window
+        self.max_gateways = max_gateways
+        self.max_names_length = max_names_length
+        self.max_workers = max_workers
+
+    def windows(self, start, end):
+        """
+        Splits [start, end] into consecutive windows no longer than max_window
+        Returns:
+        list of (start, end) tuples
+        """
+        windows = []
+        while start < end:
+            window_end = min(start + self.max_window, end)
+            windows.append((start, window_end))
+            start = window_end
+        return windows
+
+    def gateway_batches(self, gw_names):
+        """
+        Groups gateway names so each group respects max_gateways and
+        max_names_length
+        Returns:
+        list of tuples of gateway names
+        """
+        batches = []
+        current = []
+        length = 0
+        for name in gw_names:
+            added = len(name) + (1 if current else 0)
+            if current and (len(current) >= self.max_gateways or
+                            length + added > self.max_names_length):
+                batches.append(tuple(current))
+                current = []
+                length = 0
+                added = len(name)
+            current.append(name)
+            length += added
+        if current:
+            batches.append(tuple(current))
+        return batches
+
+    def plan(self, gw_names, stat_names, start, end):
+        """
+        Builds the list of queries covering the request
+        Arguments:
+        gw_names - list - gateway names
+        stat_names - list - Aviatrix.StatName values
+        start - datetime - start of the time range
+        end - datetime - end of the time range
+        Returns:
+        list of StatsQuery
+        """
+        if isinstance(stat_names, str):
+            stat_names = [stat_names]
+        return [StatsQuery(batch, stat, window_start, window_end)
+                for stat in stat_names
+                for batch in self.gateway_batches(gw_names)
+                for window_start, window_end in self.windows(start, end)]
+
+    def run(self, gw_names, stat_names, start, end, as_arrays=False, ignore_errors=False):
+        """
+        Plans and runs the queries concurrently and stitches the answers
+        Arguments:
+        gw_names - list - gateway names
+        stat_names - list - Aviatrix.StatName values
+        start - datetime - start of the time range
+        end - datetime - end of the time range
+        as_arrays - bool - return aviatrix.stats.StatSeries instead of lists
+        ignore_errors - bool - log failed queries instead of raising the first error
+        Returns:
+        OrderedDict of (gw_name, stat) to a list of (timestamp, value)
+        points in ascending time order (one entry per timestamp)
+        """
+        if isinstance(stat_names, str):
+            stat_names = [stat_names]
+        gw_names = list(gw_names)
+        queries = self.plan(gw_names, stat_names, start, end)
+        calls = [BatchCall('get_gateway_statistic_over_time',
+                           (list(query.gw_names), query.start, query.end, query.stat))
+                 for query in queries]
+        points = collections.OrderedDict(((gw_name, stat), {})
+                                         for gw_name in gw_names for stat in stat_names)
+        for query, item in zip(queries, self.controller.batch(calls, self.max_workers)):
+            if not item.ok:
+                if not ignore_errors:
+                    raise item.error
+                logging.warning('Statistics query {0} failed: {1}'.format(query, item.error))
+                continue
+            for gw_name, gw_points in stats.iter_gateway_series(item.value):
+                merged = points.setdefault((gw_name, query.stat), {})
+                # adjacent windows share their boundary; keep one point per timestamp
+                for timestamp, value in gw_points:
+                    merged[timestamp] = value
+        series = collections.OrderedDict()
+        for key, merged in points.items():
+            ordered = sorted(merged.items(), key=lambda point: float(point[0]))
+            series[key] = stats.series_from_points(key[0], ordered) if as_arrays else ordered
+        return series
@@ -0,0 +1,211 @@
+"""
+Incremental decoding of large JSON API responses.
+
+The controller answers list actions with a document such as
+{"return": true, "results": [{...}, {...}, ...]}.  iter_json_path() reads
+such a document from a file-like object in chunks and yields the elements
+of the array found at the given key path one at a time, so memory use is
+bounded by the size of a single element rather than the whole response.
+aiter_json_path() does the same over an asyncio stream.
+"""
+
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+
+# yielded by the scanner when it needs the next chunk of the stream
+_NEED_DATA = object()
+
+
+class _Scanner(object):
+    """
+    Pull parser over a chunked text stream.  It performs no I/O: its
+    generators yield _NEED_DATA when the buffer runs out and expect the next
+    chunk of at least self.wanted bytes (b'' at the end) to be sent back, so
+    blocking and asyncio readers share it.
+    """
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.wanted = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        """
+        Appends the next chunk of the stream to the buffer
+        """
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.wanted = max(size or 0, self.chunk_size)
+        chunk = yield _NEED_DATA
+        if not chunk:
+            self.eof = True
+            self.buf += self.decoder.decode(b'', final=True)
+        else:
+            self.buf += self.decoder.decode(chunk)
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character ('' at the end)
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            yield from self._fill()
+
+    def take(self, expected):
+        """
+        Consumes the next character, which must be one of expected
+        """
+        char = yield from self.peek()
+        if not char or char not in expected:
+            raise ValueError('Expected {0!r} in JSON stream, found {1!r}'.format(expected, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decodes the next complete JSON value
+        """
+        yield from self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                # incomplete value; read at least as much again and retry
+                yield from self._fill(len(self.buf) - self.pos)
+                continue
+            if end == len(self.buf) and not self.eof:
+                # a number at the end of the buffer may continue in the next chunk
+                yield from self._fill(len(self.buf) - self.pos)
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self, path, envelope=None):
+        """
+        Walks an object, descending into the key path[0] and collecting the
+        other members into envelope
+        """
+        yield from self.take('{')
+        if (yield from self.peek()) == '}':
+            self.pos += 1
+            return
+        while True:
+            key = yield from self.value()
+            yield from self.take(':')
+            if key == path[0]:
+                yield from self.iter_value(path[1:])
+            elif envelope is not None:
+                envelope[key] = yield from self.value()
+            else:
+                yield from self.value()
+            if (yield from self.take(',}')) == '}':
+                return
+
+    def iter_value(self, path):
+        """
+        Yields the elements of the array at path below the current value
+        """
+        char = yield from self.peek()
+        if path:
+            if char == '{':
+                yield from self.iter_object(path)
+            else:
+                yield from self.value()
+            return
+        if char != '[':
+            yield (yield from self.value())
+            return
+        self.pos += 1
+        if (yield from self.peek()) == ']':
+            self.pos += 1
+            return
+        while True:
+            yield (yield from self.value())
+            if (yield from self.take(',]')) == ']':
+                return
+
+
+class CountingReader(object):
+    """
+    Binary file-like wrapper counting the bytes read through it
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.count = 0
+
+    def read(self, size=-1):
+        """
+        Reads from the wrapped stream
+        """
+        chunk = self.fp.read(size)
+        self.count += len(chunk)
+        return chunk
+
+
+def iter_json_path(fp, path=('results',), envelope=None, chunk_size=65536):
+    """
+    Yields the elements of the JSON array found at path in a JSON document.
+    Arguments:
+    fp - file-like object - binary stream holding the document
+    path - tuple - keys leading to the array (e.g. ('results', 'pair_list'))
+    envelope - dict - (optional) receives the other top level members
+                      (e.g. 'return' and 'reason')
+    chunk_size - int - number of bytes read at a time
+    Returns:
+    generator of the array elements; if the value at path is not an array
+    it is yielded as a single item
+    """
+    scanner = _Scanner(chunk_size)
+    events = scanner.iter_object(tuple(path), envelope)
+    data = None
+    while True:
+        try:
+            event = events.send(data)
+        except StopIteration:
+            return
+        if event is _NEED_DATA:
+            data = fp.read(scanner.wanted)
+        else:
+            data = None
+            yield event
+
+
+async def aiter_json_path(fp, path=('results',), envelope=None, chunk_size=65536):
+    """
+    Asynchronous version of iter_json_path()
+    Arguments:
+    fp - object - binary stream whose read(size) is a coroutine
+    path - tuple - keys leading to the array
+    envelope - dict - (optional) receives the other top level members
+    chunk_size - int - number of bytes read at a time
+    Returns:
+    async generator of the array elements
+    """
+    scanner = _Scanner(chunk_size)
+    events = scanner.iter_object(tuple(path), envelope)
+    data = None
+    while True:
+        try:
+            event = events.send(data)
+        except StopIteration:
+            return
+        if event is _NEED_DATA:
+            data = await fp.read(scanner.wanted)
+        else:
+            data = None
+            yield event
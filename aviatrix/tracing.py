@@ -0,0 +1,170 @@
+"""
+Phase level timing of API calls.
+
+With a Tracer attached, every request sent to the controller produces a
+CallTrace splitting its latency into name resolution, TCP connect, TLS
+handshake, time to first byte, body transfer and JSON decoding.  The Tracer
+aggregates the traces per action so a long automation run shows whether
+time goes to connection setup, the controller, the payload size or decoding.
+
+Usage:
+
+tracer = Tracer()
+controller = Aviatrix(controller_ip, tracer=tracer)
+...
+print(tracer.report())
+with open('traces.jsonl', 'w') as traces:
+    tracer.dump(traces)
+"""
+
+import collections
+import json
+import threading
+import time
+
+# phases of a call, in the order they happen
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'transfer', 'decode')
+
+
+class CallTrace(object):
+    """
+    Timing of one request
+    Attributes:
+    action - string - the action name
+    endpoint - string - 'api' or 'backend1'
+    method - string - GET/POST
+    started - float - unix time the request started
+    phases - dict - seconds spent in each of PHASES (dns, connect and tls
+                    are 0 on a reused keep-alive connection)
+    total - float - seconds from the start of the request to the decoded response
+    reused - bool - whether a pooled keep-alive connection was used
+    attempts - int - number of times the request was sent (retries and
+                     stale connection reconnects included)
+    response_bytes - int - size of the response body
+    error - string - error of a failed request (None on success)
+    """
+
+    __slots__ = ('action', 'endpoint', 'method', 'started', 'phases', 'total', 'reused',
+                 'attempts', 'response_bytes', 'error')
+
+    def __init__(self, action, endpoint, method):
+        self.action = action
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.time()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.total = 0.0
+        self.reused = None
+        self.attempts = 0
+        self.response_bytes = 0
+        self.error = None
+
+    def add(self, phase, seconds):
+        """
+        Adds time spent in a phase
+        """
+        self.phases[phase] += seconds
+
+    def as_dict(self):
+        """
+        Returns:
+        the trace as a JSON serializable dict
+        """
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class Tracer(object):
+    """
+    Collects CallTrace records and aggregates them per action
+    """
+
+    def __init__(self, keep=10000, on_trace=None):
+        """
+        Constructor
+        Arguments:
+        keep - int - number of most recent traces kept for dump() (None for
+                     all); the per action aggregates cover every trace
+        on_trace - callable - (optional) called with every finished CallTrace
+        """
+        self.traces = collections.deque(maxlen=keep)
+        self.on_trace = on_trace
+        self._actions = {}
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        """
+        Adds a finished trace
+        Arguments:
+        trace - CallTrace - the trace
+        """
+        with self._lock:
+            self.traces.append(trace)
+            entry = self._actions.get((trace.endpoint, trace.action))
+            if entry is None:
+                entry = self._actions[(trace.endpoint, trace.action)] = {
+                    'calls': 0, 'new_connections': 0, 'errors': 0, 'total': 0.0,
+                    'response_bytes': 0, 'phases': dict.fromkeys(PHASES, 0.0)}
+            entry['calls'] += 1
+            entry['new_connections'] += 0 if trace.reused else 1
+            entry['errors'] += 0 if trace.error is None else 1
+            entry['total'] += trace.total
+            entry['response_bytes'] += trace.response_bytes
+            for phase, seconds in trace.phases.items():
+                entry['phases'][phase] += seconds
+        if self.on_trace is not None:
+            self.on_trace(trace)
+
+    def stats(self):
+        """
+        Returns:
+        dict of endpoint to a dict of action to its aggregate ('calls',
+        'new_connections', 'errors', 'total', 'response_bytes' and 'phases',
+        the seconds spent in each phase over all calls)
+        """
+        stats = {}
+        with self._lock:
+            for (endpoint, action), entry in self._actions.items():
+                values = dict(entry)
+                values['phases'] = dict(entry['phases'])
+                stats.setdefault(endpoint, {})[action] = values
+        return stats
+
+    def report(self, limit=None):
+        """
+        Formats the average time per phase of every action, slowest total first
+        Arguments:
+        limit - int - (optional) number of actions shown
+        Returns:
+        the table as a string
+        """
+        rows = [(endpoint, action, values) for endpoint, actions in self.stats().items()
+                for action, values in actions.items()]
+        rows.sort(key=lambda row: row[2]['total'], reverse=True)
+        header = '{0:<9} {1:<36} {2:>6} {3:>5}'.format('endpoint', 'action', 'calls', 'new')
+        lines = [header + ''.join(' {0:>11}'.format(phase + ' ms') for phase in PHASES + ('total',))]
+        for endpoint, action, values in rows[:limit]:
+            calls = values['calls']
+            averages = [values['phases'][phase] / calls for phase in PHASES] + [values['total'] / calls]
+            lines.append('{0:<9} {1:<36} {2:>6} {3:>5}'.format(endpoint, action, calls,
+                                                              values['new_connections']) +
+                         ''.join(' {0:>11.2f}'.format(seconds * 1000) for seconds in averages))
+        return '\n'.join(lines)
+
+    def dump(self, fp):
+        """
+        Writes the kept traces as JSON lines
+        Arguments:
+        fp - file - text file open for writing
+        """
+        with self._lock:
+            traces = list(self.traces)
+        for trace in traces:
+            fp.write(json.dumps(trace.as_dict()) + '\n')
+
+    def clear(self):
+        """
+        Drops the kept traces and the aggregates
+        """
+        with self._lock:
+            self.traces.clear()
+            self._actions.clear()
@@ -0,0 +1,242 @@
+"""
+HTTP transport used by the Aviatrix client.
+
+Keeps a pool of persistent (keep-alive) HTTPS connections to the controller
+so that consecutive API calls reuse an established TCP/TLS session instead of
+performing a full handshake for every action.
+"""
+
+import collections
+import http.client
+import io
+import logging
+import socket
+import threading
+import time
+import urllib.error
+
+
+# errors raised when a pooled keep-alive socket was closed by the server
+# while it sat idle in the pool
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected,
+                           http.client.BadStatusLine,
+                           ConnectionResetError,
+                           ConnectionAbortedError,
+                           BrokenPipeError)
+
+
+class TimedHTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPS connection recording how long name resolution, the TCP connect and
+    the TLS handshake took (see connect_phases)
+    """
+
+    def __init__(self, *args, **kwargs):
+        http.client.HTTPSConnection.__init__(self, *args, **kwargs)
+        # seconds spent in 'dns', 'connect' and 'tls' once connected
+        self.connect_phases = None
+        self._create_connection = self._timed_create_connection
+
+    def _timed_create_connection(self, address, timeout, source_address=None):
+        host, port = address
+        start = time.monotonic()
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        resolved = time.monotonic()
+        error = OSError('No address found for {0}'.format(host))
+        for _, _, _, _, sockaddr in addresses:
+            try:
+                sock = socket.create_connection(sockaddr[:2], timeout, source_address)
+            except OSError as err:
+                error = err
+                continue
+            self.connect_phases = {'dns': resolved - start, 'connect': time.monotonic() - resolved}
+            return sock
+        raise error
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        start = time.monotonic()
+        self.sock = self._context.wrap_socket(self.sock,
+                                              server_hostname=self._tunnel_host or self.host)
+        self.connect_phases['tls'] = time.monotonic() - start
+
+
+class HTTPSConnectionPool(object):
+    """
+    Thread safe pool of keep-alive HTTPS connections to a single host.
+    """
+
+    def __init__(self, host, context, pool_size=10, idle_timeout=60, timeout=None):
+        """
+        Constructor
+        Arguments:
+        host - string - host name or IP address (optionally host:port)
+        context - ssl.SSLContext - SSL settings used for every connection
+        pool_size - int - maximum number of idle connections kept open
+        idle_timeout - int - seconds an idle connection is kept before it
+                             is evicted from the pool
+        timeout - float - socket timeout in seconds (None for the default)
+        """
+        if pool_size < 1:
+            raise ValueError('pool_size must be at least 1')
+        self.host = host
+        self.context = context
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        """
+        Creates a new (not yet connected) HTTPS connection
+        """
+        if self.timeout is None:
+            return TimedHTTPSConnection(self.host, context=self.context)
+        return TimedHTTPSConnection(self.host, context=self.context, timeout=self.timeout)
+
+    def _get_connection(self):
+        """
+        Takes the most recently used idle connection out of the pool, or
+        creates a new one if none is available.
+        Returns:
+        tuple (connection, reused)
+        """
+        expired = []
+        conn = None
+        now = time.monotonic()
+        with self._lock:
+            # the oldest connections sit on the left; evict the expired ones
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                expired.append(self._idle.popleft()[0])
+            if self._idle:
+                conn = self._idle.pop()[0]
+        for stale in expired:
+            stale.close()
+        if conn is not None:
+            return conn, True
+        return self._new_connection(), False
+
+    def _put_connection(self, conn):
+        """
+        Returns a connection to the pool (or closes it if the pool is full)
+        """
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def open(self, method, url, body=None, headers=None, trace=None, idempotent=False):
+        """
+        Sends a request and returns the response without reading the body.
+        The caller must call release() with the connection and response once
+        the body has been consumed.
+        Arguments:
+        method - string - GET/POST
+        url - string - path and query string of the request
+        body - bytes - request body (or None)
+        headers - dict - additional request headers
+        trace - CallTrace - (optional) receives the connection setup and
+                            time to first byte
+        idempotent - bool - the request may be sent again if a reused
+                            connection fails after it was sent; otherwise
+                            it is only resent when it could not be sent
+        Returns:
+        tuple (connection, http.client.HTTPResponse)
+        """
+        headers = headers or {}
+        while True:
+            conn, reused = self._get_connection()
+            if trace is not None:
+                trace.attempts += 1
+                started = time.monotonic()
+            sent = False
+            try:
+                conn.request(method, url, body, headers)
+                sent = True
+                response = conn.getresponse()
+            except STALE_CONNECTION_ERRORS as err:
+                conn.close()
+                # once sent, the controller may have acted on the request
+                # before the connection failed
+                if not reused or (sent and not idempotent):
+                    raise
+                # the server dropped the idle socket; retry on a fresh one
+                logging.debug('Reconnecting to {0} after stale connection: {1}'.format(self.host, err))
+                continue
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                raise
+            if trace is not None:
+                self._trace_response(trace, conn, reused, time.monotonic() - started)
+            if response.status >= 400:
+                payload = response.read()
+                self.release(conn, response)
+                raise urllib.error.HTTPError('https://{0}{1}'.format(self.host, url),
+                                             response.status, response.reason,
+                                             response.headers, io.BytesIO(payload))
+            return conn, response
+
+    @staticmethod
+    def _trace_response(trace, conn, reused, elapsed):
+        """
+        Splits the time until the response headers arrived into connection
+        setup and time to first byte
+        """
+        trace.reused = reused
+        setup = 0.0
+        if not reused and conn.connect_phases:
+            for phase, seconds in conn.connect_phases.items():
+                trace.add(phase, seconds)
+                setup += seconds
+        trace.add('ttfb', max(0.0, elapsed - setup))
+
+    def release(self, conn, response):
+        """
+        Hands a connection back to the pool once its response was consumed
+        Arguments:
+        conn - http.client.HTTPSConnection - connection returned by open()
+        response - http.client.HTTPResponse - response returned by open()
+        """
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self._put_connection(conn)
+
+    def request(self, method, url, body=None, headers=None, trace=None, idempotent=False):
+        """
+        Sends a request and reads the complete response body.
+        Arguments:
+        method - string - GET/POST
+        url - string - path and query string of the request
+        body - bytes - request body (or None)
+        headers - dict - additional request headers
+        trace - CallTrace - (optional) receives the timing of the phases
+        idempotent - bool - see open()
+        Returns:
+        the response body (bytes)
+        """
+        conn, response = self.open(method, url, body, headers, trace, idempotent)
+        started = time.monotonic()
+        try:
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+        if trace is not None:
+            trace.add('transfer', time.monotonic() - started)
+            trace.response_bytes = len(payload)
+        self.release(conn, response)
+        return payload
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            conn.close()
+
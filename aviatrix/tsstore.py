@@ -0,0 +1,236 @@
+"""
+Incremental on-disk store for gateway statistics.
+
+StatsStore keeps the points returned by get_statistics in a SQLite database,
+together with the time ranges already downloaded for every (gateway,
+statistic).  A query only fetches the missing ranges from the controller, so
+refreshing a long report costs one small delta fetch.
+
+Usage:
+
+store = StatsStore('/var/lib/aviatrix/stats.db', controller,
+                   retention=datetime.timedelta(days=90))
+series = store.query(gw_names, Aviatrix.StatName.CPU_IDLE,
+                     now - datetime.timedelta(days=30), now)
+store.apply_retention()
+store.compact()
+"""
+
+import collections
+import datetime
+import sqlite3
+import time
+
+from . import Util, stats
+from .statsplan import StatsQueryPlanner
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS points (
+    gw_name TEXT NOT NULL,
+    stat TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (gw_name, stat, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    gw_name TEXT NOT NULL,
+    stat TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL,
+    PRIMARY KEY (gw_name, stat, start_ts)
+) WITHOUT ROWID;
+'''
+
+
+def subtract_intervals(start, end, covered):
+    """
+    Returns the parts of [start, end] not covered by the given intervals
+    Arguments:
+    start - int - start of the range
+    end - int - end of the range
+    covered - list - sorted, non overlapping (start, end) tuples
+    Returns:
+    list of (start, end) tuples
+    """
+    missing = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+class StatsStore(object):
+    """
+    SQLite backed cache of gateway statistics time series
+    """
+
+    def __init__(self, path, controller, planner=None, retention=datetime.timedelta(days=90),
+                 settle=datetime.timedelta(minutes=5)):
+        """
+        Constructor
+        Arguments:
+        path - string - SQLite database file (':memory:' for a temporary store)
+        controller - Aviatrix - a logged in client used to fetch missing ranges
+        planner - StatsQueryPlanner - (optional) planner used for the fetches
+        retention - timedelta - points older than this are dropped by apply_retention()
+        settle - timedelta - the most recent data is not marked as downloaded
+                             until it is this old, since the controller may
+                             still be filling it in
+        """
+        self.controller = controller
+        self.planner = planner or StatsQueryPlanner(controller)
+        self.retention = retention
+        self.settle = settle
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        """
+        Closes the database
+        """
+        self.db.close()
+
+    def coverage(self, gw_name, stat):
+        """
+        Returns:
+        sorted list of (start, end) unix time ranges already downloaded
+        """
+        return self.db.execute('SELECT start_ts, end_ts FROM coverage '
+                               'WHERE gw_name = ? AND stat = ? ORDER BY start_ts',
+                               (gw_name, stat)).fetchall()
+
+    def _add_coverage(self, gw_name, stat, start, end):
+        """
+        Records [start, end] as downloaded, merging it with the overlapping
+        or adjacent ranges
+        """
+        rows = self.db.execute('SELECT start_ts, end_ts FROM coverage '
+                               'WHERE gw_name = ? AND stat = ? AND start_ts <= ? AND end_ts >= ?',
+                               (gw_name, stat, end, start)).fetchall()
+        for row_start, row_end in rows:
+            start = min(start, row_start)
+            end = max(end, row_end)
+        self.db.execute('DELETE FROM coverage WHERE gw_name = ? AND stat = ? '
+                        'AND start_ts <= ? AND end_ts >= ?', (gw_name, stat, end, start))
+        self.db.execute('INSERT INTO coverage VALUES (?, ?, ?, ?)', (gw_name, stat, start, end))
+
+    def missing(self, gw_names, stat, start, end):
+        """
+        Computes the ranges that still need to be downloaded
+        Arguments:
+        gw_names - list - gateway names
+        stat - string - Aviatrix.StatName value
+        start - datetime - start of the time range
+        end - datetime - end of the time range
+        Returns:
+        OrderedDict of (start, end) unix time range to the gateway names missing it
+        """
+        start_ts, end_ts = Util.unix_time(start), Util.unix_time(end)
+        ranges = collections.OrderedDict()
+        for gw_name in gw_names:
+            for missing in subtract_intervals(start_ts, end_ts, self.coverage(gw_name, stat)):
+                ranges.setdefault(missing, []).append(gw_name)
+        return ranges
+
+    def fetch(self, gw_names, stat, start, end):
+        """
+        Downloads the ranges of [start, end] that are not stored yet
+        Returns:
+        number of points stored
+        """
+        settled = int(time.time() - self.settle.total_seconds())
+        stored = 0
+        for (range_start, range_end), names in self.missing(gw_names, stat, start, end).items():
+            series = self.planner.run(names, [stat],
+                                      Util.EPOCH + datetime.timedelta(seconds=range_start),
+                                      Util.EPOCH + datetime.timedelta(seconds=range_end))
+            with self.db:
+                for (gw_name, _), points in series.items():
+                    self.db.executemany('INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?)',
+                                        ((gw_name, stat, int(float(timestamp)),
+                                          None if value is None else float(value))
+                                         for timestamp, value in points))
+                    stored += len(points)
+                covered_end = min(range_end, settled)
+                if covered_end > range_start:
+                    for gw_name in names:
+                        self._add_coverage(gw_name, stat, range_start, covered_end)
+        return stored
+
+    def read(self, gw_name, stat, start, end):
+        """
+        Reads stored points without contacting the controller
+        Returns:
+        list of (timestamp, value) in ascending time order
+        """
+        return self.db.execute('SELECT ts, value FROM points WHERE gw_name = ? AND stat = ? '
+                               'AND ts BETWEEN ? AND ? ORDER BY ts',
+                               (gw_name, stat, Util.unix_time(start),
+                                Util.unix_time(end))).fetchall()
+
+    def query(self, gw_names, stat, start, end, as_arrays=False):
+        """
+        Returns the series for [start, end], downloading only what is missing
+        Arguments:
+        gw_names - list - gateway names
+        stat - string - Aviatrix.StatName value
+        start - datetime - start of the time range
+        end - datetime - end of the time range
+        as_arrays - bool - return aviatrix.stats.StatSeries instead of lists
+        Returns:
+        OrderedDict of gateway name to a list of (timestamp, value) points
+        """
+        gw_names = list(gw_names)
+        self.fetch(gw_names, stat, start, end)
+        series = collections.OrderedDict()
+        for gw_name in gw_names:
+            points = self.read(gw_name, stat, start, end)
+            series[gw_name] = stats.series_from_points(gw_name, points) if as_arrays else points
+        return series
+
+    def apply_retention(self, now=None):
+        """
+        Drops points (and coverage) older than the retention period
+        Arguments:
+        now - datetime - (optional) reference time, defaults to the current time
+        Returns:
+        number of points deleted
+        """
+        now_ts = Util.unix_time(now) if now else int(time.time())
+        cutoff = now_ts - int(self.retention.total_seconds())
+        with self.db:
+            deleted = self.db.execute('DELETE FROM points WHERE ts < ?', (cutoff,)).rowcount
+            self.db.execute('DELETE FROM coverage WHERE end_ts < ?', (cutoff,))
+            # start_ts is part of the primary key, so clipped rows are re-inserted
+            clipped = self.db.execute('SELECT gw_name, stat, end_ts FROM coverage '
+                                      'WHERE start_ts < ?', (cutoff,)).fetchall()
+            self.db.execute('DELETE FROM coverage WHERE start_ts < ?', (cutoff,))
+            self.db.executemany('INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)',
+                                ((gw_name, stat, cutoff, end_ts)
+                                 for gw_name, stat, end_ts in clipped))
+        return deleted
+
+    def compact(self):
+        """
+        Merges fragmented coverage ranges and reclaims unused disk space
+        """
+        with self.db:
+            rows = self.db.execute('SELECT gw_name, stat, start_ts, end_ts FROM coverage '
+                                   'ORDER BY gw_name, stat, start_ts').fetchall()
+            merged = []
+            for gw_name, stat, start_ts, end_ts in rows:
+                if merged and merged[-1][:2] == [gw_name, stat] and start_ts <= merged[-1][3]:
+                    merged[-1][3] = max(merged[-1][3], end_ts)
+                else:
+                    merged.append([gw_name, stat, start_ts, end_ts])
+            self.db.execute('DELETE FROM coverage')
+            self.db.executemany('INSERT INTO coverage VALUES (?, ?, ?, ?)', merged)
+        self.db.execute('VACUUM')
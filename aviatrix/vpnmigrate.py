@@ -0,0 +1,343 @@
+"""
+Migration of VPN users to another VPC/ELB.
+
+A migration is planned from the current list_vpn_users() output: every
+selected user is detached from its VPC (if attached) and attached to the
+target load balancer.  Moves run concurrently on a bounded pool of threads
+and every completed step is appended to a checkpoint log (JSON lines,
+fsync'd), so an interrupted run started again with the same checkpoint only
+performs the remaining steps.
+
+Usage:
+
+users = controller.list_vpn_users()
+engine = MigrationEngine(controller, '/var/lib/aviatrix/migration.jsonl', max_workers=8)
+moves = engine.plan(users, 'Aviatrix-vpc-xyz', 'vpc-abcd0000', source_vpc_id='vpc-1234')
+report = engine.run(moves)
+print(report.summary())
+"""
+
+import collections
+import concurrent.futures
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+# checkpoint states of a move, in order; a FAILED record carries
+# 'detached': true when the user was detached before the failure
+DETACHED = 'detached'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class UserMove(collections.namedtuple('UserMove', ['username', 'email', 'source_vpc_id',
+                                                   'attached', 'target_lb_name',
+                                                   'target_vpc_id', 'profile_name'])):
+    """
+    Planned migration of one VPN user
+    Attributes:
+    username - string - the VPN user name
+    email - string - the user's email address (certificate delivery)
+    source_vpc_id - string - VPC the user is currently attached to
+    attached - bool - whether the user must be detached first
+    target_lb_name - string - load balancer the user is attached to
+    target_vpc_id - string - VPC the user is attached to
+    profile_name - string - (optional) profile assigned to the user
+    """
+
+    __slots__ = ()
+
+
+class MoveOutcome(collections.namedtuple('MoveOutcome', ['username', 'status', 'error',
+                                                         'duration'])):
+    """
+    Result of a move
+    Attributes:
+    username - string - the VPN user name
+    status - string - 'migrated', 'resumed' (finished a move interrupted or
+                      failed after the detach), 'skipped' (already done in the
+                      checkpoint) or 'failed'
+    error - string - error message of a failed move
+    duration - float - seconds spent on the move
+    """
+
+    __slots__ = ()
+
+
+def plan_migration(users, target_lb_name, target_vpc_id, source_vpc_id=None, usernames=None,
+                   profile_name=None, checkpoint=None):
+    """
+    Plans the moves of VPN users
+    Arguments:
+    users - list - output of list_vpn_users()
+    target_lb_name - string - load balancer (ELB) to attach the users to
+    target_vpc_id - string - VPC to attach the users to
+    source_vpc_id - string - (optional) only move the users of this VPC
+    usernames - set - (optional) only move these users
+    profile_name - string - (optional) profile assigned to the moved users
+    checkpoint - MigrationCheckpoint - (optional) log of an earlier run; the
+                 users it detached are planned whatever VPC they are in now
+    Returns:
+    list of UserMove; users already attached to the target are left out
+    """
+    moves = []
+    for user in users:
+        username = user['_id']
+        attached = bool(user.get('attached'))
+        if usernames is not None and username not in usernames:
+            continue
+        if attached and user.get('vpc_id') == target_vpc_id:
+            continue
+        move = UserMove(username, user.get('email'), user.get('vpc_id'), attached,
+                        target_lb_name, target_vpc_id, profile_name)
+        if checkpoint is not None and checkpoint.detached(move):
+            # detached from the source VPC by an interrupted run
+            moves.append(move._replace(source_vpc_id=checkpoint.source_vpc_id(move),
+                                       attached=True))
+            continue
+        if source_vpc_id is not None and user.get('vpc_id') != source_vpc_id:
+            continue
+        moves.append(move)
+    return moves
+
+
+class MigrationCheckpoint(object):
+    """
+    Append-only log of the completed steps of a migration.  Every record is
+    flushed and fsync'd before the next step starts, so after a crash the
+    log never claims more than was done.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor
+        Arguments:
+        path - string - checkpoint file (created if missing)
+        """
+        self.path = path
+        self.states = self._load()
+        self._lock = threading.Lock()
+        self._file = open(path, 'a')
+        if self._file.tell() and not self._ends_with_newline():
+            # terminate a torn last record so the next one starts on its own line
+            self._file.write('\n')
+            self._file.flush()
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as log:
+            log.seek(-1, os.SEEK_END)
+            return log.read(1) == b'\n'
+
+    def _load(self):
+        """
+        Reads the last state of every (username, target_vpc_id)
+        """
+        states = {}
+        if not os.path.exists(self.path):
+            return states
+        with open(self.path) as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a torn last line from a crash mid-write
+                    logging.warning('Ignoring corrupt checkpoint record: {0!r}'.format(line))
+                    continue
+                states[(record['username'], record['target_vpc_id'])] = record
+        return states
+
+    def state(self, move):
+        """
+        Returns:
+        the last recorded state of the move (None if not started)
+        """
+        record = self.states.get((move.username, move.target_vpc_id))
+        return record['state'] if record else None
+
+    def detached(self, move):
+        """
+        Returns:
+        True if the user was detached by an earlier run and the move must
+        resume at the attach
+        """
+        record = self.states.get((move.username, move.target_vpc_id))
+        if not record:
+            return False
+        return record['state'] == DETACHED or (record['state'] == FAILED and
+                                               bool(record.get('detached')))
+
+    def source_vpc_id(self, move):
+        """
+        Returns:
+        the source VPC recorded for the move (None if not started)
+        """
+        record = self.states.get((move.username, move.target_vpc_id))
+        return record.get('source_vpc_id') if record else None
+
+    def record(self, move, state, error=None, detached=False):
+        """
+        Durably appends the new state of a move
+        Arguments:
+        move - UserMove - the move
+        state - string - DETACHED, DONE or FAILED
+        error - string - (optional) error message of a failed move
+        detached - bool - whether the user was detached before a failure
+        """
+        record = {'username': move.username, 'target_vpc_id': move.target_vpc_id,
+                  'source_vpc_id': move.source_vpc_id, 'state': state, 'time': time.time()}
+        if error is not None:
+            record['error'] = error
+        if detached:
+            record['detached'] = True
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.states[(move.username, move.target_vpc_id)] = record
+
+    def close(self):
+        """
+        Closes the log
+        """
+        self._file.close()
+
+
+class MigrationReport(object):
+    """
+    Outcomes of a migration run
+    """
+
+    def __init__(self, outcomes):
+        """
+        Constructor
+        Arguments:
+        outcomes - list - MoveOutcome objects in plan order
+        """
+        self.outcomes = outcomes
+
+    def counts(self):
+        """
+        Returns:
+        dict of status to the number of users
+        """
+        return dict(collections.Counter(outcome.status for outcome in self.outcomes))
+
+    def failed(self):
+        """
+        Returns:
+        list of the failed MoveOutcome
+        """
+        return [outcome for outcome in self.outcomes if outcome.status == 'failed']
+
+    def summary(self):
+        """
+        Returns:
+        a one line summary
+        """
+        counts = self.counts()
+        return ', '.join('{0}: {1}'.format(status, counts[status]) for status in sorted(counts))
+
+    def write_csv(self, fp):
+        """
+        Writes one row per user (username, status, error, duration)
+        Arguments:
+        fp - file - text file open for writing
+        """
+        writer = csv.writer(fp)
+        writer.writerow(MoveOutcome._fields)
+        for outcome in self.outcomes:
+            writer.writerow([outcome.username, outcome.status, outcome.error or '',
+                             '{0:.3f}'.format(outcome.duration)])
+
+
+class MigrationEngine(object):
+    """
+    Runs planned moves concurrently with a checkpoint log
+    """
+
+    def __init__(self, controller, checkpoint_path, max_workers=8, retry_failed=True):
+        """
+        Constructor
+        Arguments:
+        controller - Aviatrix - a logged in client
+        checkpoint_path - string - checkpoint log; reuse it to resume a run
+        max_workers - int - maximum number of users migrated at once
+        retry_failed - bool - retry moves that failed in an earlier run
+        """
+        self.controller = controller
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.retry_failed = retry_failed
+
+    def plan(self, users, target_lb_name, target_vpc_id, source_vpc_id=None, usernames=None,
+             profile_name=None):
+        """
+        plan_migration() with the checkpoint of this engine, so that a rerun
+        also finishes the users an interrupted run had already detached
+        Returns:
+        list of UserMove
+        """
+        checkpoint = MigrationCheckpoint(self.checkpoint_path)
+        try:
+            return plan_migration(users, target_lb_name, target_vpc_id, source_vpc_id,
+                                  usernames, profile_name, checkpoint)
+        finally:
+            checkpoint.close()
+
+    def _migrate(self, checkpoint, move):
+        """
+        Performs the remaining steps of one move
+        Returns:
+        MoveOutcome
+        """
+        start = time.monotonic()
+        state = checkpoint.state(move)
+        if state == DONE or (state == FAILED and not self.retry_failed):
+            return MoveOutcome(move.username, 'skipped', None, 0.0)
+        resumed = detached = checkpoint.detached(move)
+        try:
+            if move.attached and not detached:
+                self.controller.detach_vpn_user(move.source_vpc_id, move.username)
+                checkpoint.record(move, DETACHED)
+                detached = True
+            self.controller.attach_vpn_user(move.target_lb_name, move.target_vpc_id,
+                                            move.username, move.email, move.profile_name)
+            checkpoint.record(move, DONE)
+        except Exception as err:  # pylint: disable=broad-except
+            logging.warning('Migration of VPN user {0} failed: {1}'.format(move.username, err))
+            # a rerun must not detach again, the user is no longer attached
+            checkpoint.record(move, FAILED, str(err), detached)
+            return MoveOutcome(move.username, 'failed', str(err), time.monotonic() - start)
+        return MoveOutcome(move.username, 'resumed' if resumed else 'migrated', None,
+                           time.monotonic() - start)
+
+    def run(self, moves):
+        """
+        Migrates the users
+        Arguments:
+        moves - list - UserMove objects from plan_migration()
+        Returns:
+        MigrationReport
+        """
+        moves = list(moves)
+        checkpoint = MigrationCheckpoint(self.checkpoint_path)
+        try:
+            if not moves:
+                return MigrationReport([])
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(self.max_workers, len(moves))) as pool:
+                futures = [pool.submit(self._migrate, checkpoint, move) for move in moves]
+                try:
+                    outcomes = [future.result() for future in futures]
+                except BaseException:
+                    # e.g. KeyboardInterrupt: let the moves in flight finish
+                    for future in futures:
+                        future.cancel()
+                    raise
+            return MigrationReport(outcomes)
+        finally:
+            checkpoint.close()
@@ -0,0 +1,341 @@
+"""
+Synchronization of VPN users with a desired list (CSV or LDIF file).
+
+The desired users are read from the file one record at a time and compared
+with list_vpn_users() through a hash index keyed by (username, vpc_id), so
+planning costs one pass over each side.  Only the needed changes are made:
+adds for missing users, deletes for users no longer listed (opt-in) and a
+detach/attach for users whose profile changed.  The plan can be reviewed
+before it is applied concurrently and rate limited.
+
+Usage:
+
+with open('users.csv') as users:
+    plan = plan_sync(iter_csv_users(users), controller.list_vpn_users(), delete_missing=True)
+print(plan.describe())
+results = apply_sync(controller, plan, max_workers=8, rate=10)
+"""
+
+import base64
+import collections
+import concurrent.futures
+import csv
+import logging
+
+from .ratelimit import TokenBucket
+
+ADD = 'add'
+DELETE = 'delete'
+CHANGE_PROFILE = 'change_profile'
+
+# fields of a desired user (CSV column names)
+USER_FIELDS = ('username', 'vpc_id', 'lb_name', 'email', 'profile_name')
+
+# fields every desired user needs (once the defaults are applied)
+REQUIRED_FIELDS = ('username', 'vpc_id', 'lb_name')
+
+# LDIF attribute read for each field
+LDIF_ATTRIBUTES = {'username': 'uid', 'email': 'mail', 'vpc_id': 'avxVpcId',
+                   'lb_name': 'avxLbName', 'profile_name': 'avxProfile'}
+
+
+class DesiredUser(collections.namedtuple('DesiredUser', USER_FIELDS)):
+    """
+    A VPN user that should exist
+    Attributes:
+    username - string - the VPN user name
+    vpc_id - string - VPC the user is attached to
+    lb_name - string - load balancer of the VPC
+    email - string - (optional) email address the certificate is sent to
+    profile_name - string - (optional) profile assigned to the user
+    """
+
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """
+        (username, vpc_id) identifying the user
+        """
+        return (self.username, self.vpc_id)
+
+
+class SyncAction(collections.namedtuple('SyncAction', ['op', 'username', 'vpc_id', 'desired',
+                                                       'current'])):
+    """
+    One change of a sync plan
+    Attributes:
+    op - string - ADD, DELETE or CHANGE_PROFILE
+    username - string - the VPN user name
+    vpc_id - string - the VPC of the user
+    desired - DesiredUser - the desired user (None for DELETE)
+    current - dict - the user from list_vpn_users() (None for ADD)
+    """
+
+    __slots__ = ()
+
+
+class SyncResult(collections.namedtuple('SyncResult', ['action', 'error'])):
+    """
+    Outcome of a SyncAction
+    Attributes:
+    action - SyncAction - the change
+    error - Exception - the error raised (None on success)
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """
+        True if the change was made
+        """
+        return self.error is None
+
+
+def _check_required(values, entry):
+    missing = [name for name in REQUIRED_FIELDS if not values.get(name)]
+    if missing:
+        raise ValueError('VPN user without {0}: {1}'.format(' or '.join(missing), entry))
+
+
+def _desired_user(fields, defaults):
+    values = dict(defaults or {})
+    values.update((name, value) for name, value in fields.items() if value)
+    _check_required(values, fields)
+    return DesiredUser(*[values.get(name) or None for name in USER_FIELDS])
+
+
+def iter_csv_users(fp, defaults=None):
+    """
+    Reads desired users from a CSV file with a header row naming the
+    USER_FIELDS columns (unknown columns are ignored)
+    Arguments:
+    fp - file - text file open for reading
+    defaults - dict - (optional) values of the missing fields (e.g. lb_name)
+    Returns:
+    generator of DesiredUser
+    """
+    for row in csv.DictReader(fp):
+        fields = dict((name.strip().lower(), (value or '').strip())
+                      for name, value in row.items() if name)
+        yield _desired_user(dict((name, fields.get(name)) for name in USER_FIELDS), defaults)
+
+
+def _iter_ldif_records(fp):
+    """
+    Yields the attributes of every LDIF entry as a dict of lower case
+    attribute name to the first value
+    """
+    record = {}
+    line = None
+    for raw in fp:
+        raw = raw.rstrip('\r\n')
+        if raw.startswith(' ') and line is not None:
+            # continuation of the previous line
+            line += raw[1:]
+            continue
+        if line is not None:
+            _add_ldif_line(record, line)
+        line = None
+        if not raw:
+            if record:
+                yield record
+            record = {}
+        elif not raw.startswith('#'):
+            line = raw
+    if line is not None:
+        _add_ldif_line(record, line)
+    if record:
+        yield record
+
+
+def _add_ldif_line(record, line):
+    name, _, value = line.partition(':')
+    if value.startswith(':'):
+        value = base64.b64decode(value[1:].strip()).decode('utf-8')
+    else:
+        value = value.strip()
+    record.setdefault(name.strip().lower(), value)
+
+
+def iter_ldif_users(fp, attributes=None, defaults=None):
+    """
+    Reads desired users from an LDIF export; entries without the username
+    attribute (e.g. groups) are skipped
+    Arguments:
+    fp - file - text file open for reading
+    attributes - dict - (optional) LDIF attribute of each field, see LDIF_ATTRIBUTES
+    defaults - dict - (optional) values of the missing fields (e.g. vpc_id)
+    Returns:
+    generator of DesiredUser
+    """
+    attributes = dict(LDIF_ATTRIBUTES, **(attributes or {}))
+    for record in _iter_ldif_records(fp):
+        fields = dict((name, record.get(attribute.lower())) for name, attribute in attributes.items())
+        if not fields['username']:
+            continue
+        yield _desired_user(fields, defaults)
+
+
+def index_users(users):
+    """
+    Indexes VPN users by (username, vpc_id)
+    Arguments:
+    users - iterable - output of list_vpn_users() or iter_vpn_users()
+    Returns:
+    dict of (username, vpc_id) to the user
+    """
+    return dict(((user['_id'], user.get('vpc_id')), user) for user in users)
+
+
+def _current_profile(user):
+    """
+    Returns:
+    the profile of a listed user, or False if the listing does not show it
+    """
+    for name in ('profile_name', 'profile'):
+        if name in user:
+            return user[name] or None
+    return False
+
+
+class SyncPlan(object):
+    """
+    Changes needed to make the controller match the desired users
+    """
+
+    def __init__(self, actions, unchanged, duplicates):
+        """
+        Constructor
+        Arguments:
+        actions - list - SyncAction objects
+        unchanged - int - number of desired users already in place
+        duplicates - int - number of desired entries repeating an earlier one
+        """
+        self.actions = actions
+        self.unchanged = unchanged
+        self.duplicates = duplicates
+
+    def counts(self):
+        """
+        Returns:
+        dict of op to the number of actions
+        """
+        counts = dict.fromkeys((ADD, DELETE, CHANGE_PROFILE), 0)
+        counts.update(collections.Counter(action.op for action in self.actions))
+        return counts
+
+    def summary(self):
+        """
+        Returns:
+        a one line summary
+        """
+        counts = self.counts()
+        summary = '{0} to add, {1} to delete, {2} profile changes, {3} unchanged'.format(
+            counts[ADD], counts[DELETE], counts[CHANGE_PROFILE], self.unchanged)
+        if self.duplicates:
+            summary += ' ({0} duplicate entries ignored)'.format(self.duplicates)
+        return summary
+
+    def describe(self):
+        """
+        Returns:
+        the summary followed by one line per action
+        """
+        lines = [self.summary()]
+        for action in self.actions:
+            detail = ''
+            if action.op == CHANGE_PROFILE:
+                detail = ' ({0} -> {1})'.format(_current_profile(action.current) or '-',
+                                                action.desired.profile_name or '-')
+            lines.append('{0:<15} {1} in {2}{3}'.format(action.op, action.username,
+                                                        action.vpc_id, detail))
+        return '\n'.join(lines)
+
+
+def plan_sync(desired, current, delete_missing=False, vpc_ids=None):
+    """
+    Compares the desired users with the controller's users
+    Arguments:
+    desired - iterable - DesiredUser objects (e.g. from iter_csv_users())
+    current - iterable - output of list_vpn_users() or iter_vpn_users()
+    delete_missing - bool - delete users that are not desired
+    vpc_ids - set - (optional) VPCs managed by the sync; only their users
+                    are deleted (default: the VPCs of the desired users)
+    Returns:
+    SyncPlan
+    Raises:
+    ValueError if a desired user lacks a username, vpc_id or lb_name
+    """
+    index = index_users(current)
+    seen = set()
+    managed = set(vpc_ids) if vpc_ids is not None else set()
+    actions = []
+    unchanged = 0
+    duplicates = 0
+    for user in desired:
+        # reject an incomplete entry before any change is made
+        _check_required(user._asdict(), user)
+        if user.key in seen:
+            duplicates += 1
+            continue
+        seen.add(user.key)
+        if vpc_ids is None:
+            managed.add(user.vpc_id)
+        existing = index.get(user.key)
+        if existing is None:
+            actions.append(SyncAction(ADD, user.username, user.vpc_id, user, None))
+            continue
+        profile = _current_profile(existing)
+        if profile is not False and profile != user.profile_name:
+            actions.append(SyncAction(CHANGE_PROFILE, user.username, user.vpc_id, user, existing))
+        else:
+            unchanged += 1
+    if delete_missing:
+        for key, existing in index.items():
+            if key not in seen and key[1] in managed:
+                actions.append(SyncAction(DELETE, key[0], key[1], None, existing))
+    return SyncPlan(actions, unchanged, duplicates)
+
+
+def _apply(controller, action, bucket):
+    if bucket is not None:
+        bucket.acquire(2 if action.op == CHANGE_PROFILE else 1)
+    try:
+        desired = action.desired
+        if action.op == ADD:
+            controller.add_vpn_user(desired.lb_name, desired.vpc_id, desired.username,
+                                    desired.email, desired.profile_name)
+        elif action.op == DELETE:
+            controller.delete_vpn_user(action.vpc_id, action.username)
+        else:
+            if action.current.get('attached', True):
+                controller.detach_vpn_user(action.vpc_id, action.username)
+            controller.attach_vpn_user(desired.lb_name, desired.vpc_id, desired.username,
+                                       desired.email, desired.profile_name)
+    except Exception as err:  # pylint: disable=broad-except
+        logging.warning('VPN user sync: {0} {1} failed: {2}'.format(action.op, action.username, err))
+        return SyncResult(action, err)
+    return SyncResult(action, None)
+
+
+def apply_sync(controller, plan, max_workers=8, rate=None):
+    """
+    Applies a plan concurrently
+    Arguments:
+    controller - Aviatrix - a logged in client
+    plan - SyncPlan - the plan from plan_sync()
+    max_workers - int - maximum number of changes in flight
+    rate - float - (optional) maximum API calls per second (a client
+                   governor, if any, applies as well)
+    Returns:
+    list of SyncResult in plan order
+    """
+    if not plan.actions:
+        return []
+    bucket = TokenBucket(rate) if rate else None
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(max_workers, len(plan.actions))) as pool:
+        futures = [pool.submit(_apply, controller, action, bucket) for action in plan.actions]
+        return [future.result() for future in futures]
@@ -0,0 +1,315 @@
+"""
+Zabbix integration.
+
+A resident daemon polls the controller through a SnapshotPoller and answers
+item queries from a Unix socket, so every Zabbix check reads the same
+in-memory snapshot instead of logging in and downloading the fleet itself.
+
+Usage (daemon):
+
+poller = SnapshotPoller(controller, interval=60)
+poller.start()
+serve_snapshot('/run/aviatrix/zabbix.sock', poller)
+
+Usage (check):
+
+print(query_snapshot('/run/aviatrix/zabbix.sock', 'down_peers'))
+
+Per-gateway metrics are pushed instead: one concurrent statistics sweep is
+sent to the Zabbix trapper in a single sender payload, together with the
+low-level discovery (LLD) data that creates the per-gateway items.
+
+Usage (push):
+
+sender = ZabbixSender('zabbix.example.com')
+sender.send(discovery_items('aviatrix', gws, peers) +
+            gateway_stat_items('aviatrix', collect_gateway_stats(controller, names)[0]))
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import time
+
+from .snapshot import count_down_gateways, count_down_peers, is_gateway_down, is_peer_down
+
+NOT_SUPPORTED = 'ZBX_NOTSUPPORTED'
+
+# item key -> function computing the value from a FleetSnapshot
+SNAPSHOT_ITEMS = {
+    'gateways': lambda snapshot: len(snapshot.gateways),
+    'down_gateways': lambda snapshot: count_down_gateways(snapshot.gateways),
+    'peers': lambda snapshot: len(snapshot.peers),
+    'down_peers': lambda snapshot: count_down_peers(snapshot.peers),
+    'snapshot_age': lambda snapshot: int(time.time() - snapshot.taken),
+    'poll_errors': lambda snapshot: len(snapshot.errors),
+}
+
+
+def snapshot_item(snapshot, key):
+    """
+    Computes a Zabbix item value from a snapshot
+    Arguments:
+    snapshot - FleetSnapshot - the current snapshot
+    key - string - one of SNAPSHOT_ITEMS
+    Returns:
+    the value as a string (ZBX_NOTSUPPORTED for unknown keys or before the
+    first poll)
+    """
+    if key not in SNAPSHOT_ITEMS or not snapshot.taken:
+        return NOT_SUPPORTED
+    return str(SNAPSHOT_ITEMS[key](snapshot))
+
+
+class _SnapshotRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Reads item keys (one per line) and writes back one value per line
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            key = line.decode('utf-8', 'replace').strip()
+            if not key:
+                break
+            value = snapshot_item(self.server.poller.snapshot, key)
+            self.wfile.write(value.encode() + b'\n')
+
+
+class SnapshotServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server answering item queries from a SnapshotPoller
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, poller, mode=0o660):
+        """
+        Constructor
+        Arguments:
+        path - string - socket path (an existing socket file is replaced)
+        poller - SnapshotPoller - the poller providing the snapshot
+        mode - int - permissions of the socket file
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+        self.poller = poller
+        socketserver.UnixStreamServer.__init__(self, path, _SnapshotRequestHandler)
+        os.chmod(path, mode)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def serve_snapshot(path, poller):
+    """
+    Serves item queries on the Unix socket until interrupted
+    Arguments:
+    path - string - socket path
+    poller - SnapshotPoller - a started poller
+    """
+    server = SnapshotServer(path, poller)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def query_snapshot(path, key, timeout=5):
+    """
+    Asks a running snapshot daemon for an item value
+    Arguments:
+    path - string - socket path of the daemon
+    key - string - item key (see SNAPSHOT_ITEMS)
+    timeout - float - socket timeout in seconds
+    Returns:
+    the value as a string
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+        client.sendall(key.encode() + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        client.close()
+    return data.decode().strip()
+
+
+# LLD keys of the discovery rules (Zabbix trapper items on the host)
+GATEWAY_DISCOVERY_KEY = 'aviatrix.gw.discovery'
+PEER_DISCOVERY_KEY = 'aviatrix.peer.discovery'
+
+# item key prototypes, formatted with the metric name
+GATEWAY_ITEM_KEY = 'aviatrix.gw.{0}[{1}]'
+PEER_ITEM_KEY = 'aviatrix.peer.{0}[{1},{2}]'
+
+
+class ZabbixError(Exception):
+    """
+    Raised when the Zabbix trapper rejects or garbles a sender request
+    """
+    pass
+
+
+def discover_gateways(gws):
+    """
+    Builds the LLD data of the gateways
+    Arguments:
+    gws - list - output of list_gateways()
+    Returns:
+    the LLD JSON string ({"data": [{"{#GW_NAME}": ...}, ...]})
+    """
+    return json.dumps({'data': [{'{#GW_NAME}': gwy.get('vpc_name', ''),
+                                 '{#VPC_ID}': gwy.get('vpc_id', ''),
+                                 '{#REGION}': gwy.get('vpc_region', ''),
+                                 '{#CLOUD_TYPE}': gwy.get('cloud_type', '')}
+                                for gwy in gws]})
+
+
+def discover_peers(peers):
+    """
+    Builds the LLD data of the peer pairs
+    Arguments:
+    peers - list - output of list_peers()
+    Returns:
+    the LLD JSON string ({"data": [{"{#PEER1}": ..., "{#PEER2}": ...}, ...]})
+    """
+    return json.dumps({'data': [{'{#PEER1}': peer.get('vpc_name1', ''),
+                                 '{#PEER2}': peer.get('vpc_name2', '')}
+                                for peer in peers]})
+
+
+def discovery_items(host, gws, peers):
+    """
+    Builds the sender items carrying the LLD data of gateways and peers
+    Arguments:
+    host - string - Zabbix host holding the discovery rules
+    gws - list - output of list_gateways()
+    peers - list - output of list_peers()
+    Returns:
+    list of (host, key, value) tuples
+    """
+    return [(host, GATEWAY_DISCOVERY_KEY, discover_gateways(gws)),
+            (host, PEER_DISCOVERY_KEY, discover_peers(peers))]
+
+
+def gateway_stat_items(host, summaries, clock=None):
+    """
+    Builds the sender items of per-gateway statistics
+    Arguments:
+    host - string - Zabbix host holding the discovered items
+    summaries - dict - gateway name to gateway_stat_summary() (see
+                       aviatrix.snapshot.collect_gateway_stats)
+    clock - int - (optional) unix time of the values
+    Returns:
+    list of (host, key, value, clock) tuples
+    """
+    clock = int(clock or time.time())
+    return [(host, GATEWAY_ITEM_KEY.format(metric, gw_name), value, clock)
+            for gw_name, summary in summaries.items()
+            for metric, value in sorted(summary.items())]
+
+
+def state_items(host, gws, peers, clock=None):
+    """
+    Builds the sender items of per-gateway and per-peering up/down state
+    (1 when up, 0 when down)
+    Returns:
+    list of (host, key, value, clock) tuples
+    """
+    clock = int(clock or time.time())
+    items = [(host, GATEWAY_ITEM_KEY.format('up', gwy.get('vpc_name', '')),
+              0 if is_gateway_down(gwy) else 1, clock) for gwy in gws]
+    items.extend((host, PEER_ITEM_KEY.format('up', peer.get('vpc_name1', ''),
+                                             peer.get('vpc_name2', '')),
+                  0 if is_peer_down(peer) else 1, clock) for peer in peers)
+    return items
+
+
+class ZabbixSender(object):
+    """
+    Client of the Zabbix sender protocol (what zabbix_sender speaks to a
+    trapper): one TCP connection and one JSON request per send() call
+    """
+
+    HEADER = b'ZBXD\x01'
+
+    def __init__(self, server, port=10051, timeout=10):
+        """
+        Constructor
+        Arguments:
+        server - string - Zabbix server or proxy host
+        port - int - trapper port
+        timeout - float - socket timeout in seconds
+        """
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+
+    @staticmethod
+    def encode(items, clock=None):
+        """
+        Builds a sender request
+        Arguments:
+        items - list - (host, key, value[, clock]) tuples
+        clock - int - (optional) unix time of the request
+        Returns:
+        the framed request bytes
+        """
+        data = []
+        for item in items:
+            entry = {'host': item[0], 'key': item[1], 'value': str(item[2])}
+            if len(item) > 3 and item[3] is not None:
+                entry['clock'] = int(item[3])
+            data.append(entry)
+        body = json.dumps({'request': 'sender data', 'data': data,
+                           'clock': int(clock or time.time())}).encode('utf-8')
+        return ZabbixSender.HEADER + struct.pack('<Q', len(body)) + body
+
+    @staticmethod
+    def _read_exactly(conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ZabbixError('Connection closed by the Zabbix server')
+            data += chunk
+        return data
+
+    def send(self, items):
+        """
+        Sends all the items in a single request
+        Arguments:
+        items - list - (host, key, value[, clock]) tuples
+        Returns:
+        dict with the processed, failed and total counts reported by the server
+        """
+        conn = socket.create_connection((self.server, self.port), self.timeout)
+        try:
+            conn.sendall(self.encode(items))
+            header = self._read_exactly(conn, len(self.HEADER) + 8)
+            if header[:len(self.HEADER)] != self.HEADER:
+                raise ZabbixError('Invalid response header {0!r}'.format(header))
+            length = struct.unpack('<Q', header[len(self.HEADER):])[0]
+            response = json.loads(self._read_exactly(conn, length).decode('utf-8'))
+        finally:
+            conn.close()
+        if response.get('response') != 'success':
+            raise ZabbixError('Zabbix rejected the request: {0}'.format(response))
+        # info looks like "processed: 3; failed: 0; total: 3; seconds spent: 0.000046"
+        counts = {}
+        for part in response.get('info', '').split(';'):
+            name, _, value = part.partition(':')
+            name = name.strip()
+            if name in ('processed', 'failed', 'total'):
+                counts[name] = int(value)
+        return counts
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+ Measures API calls per second against a local HTTPS stub controller using
+ a new urllib connection per call (the previous transport) and the pooled
+ keep-alive transport used by Aviatrix._avx_api_call.
+
+ INPUTS:
+   $1 - CALLS - int - (optional) number of calls per run, default 500
+
+ EXAMPLE OUTPUT:
+    urlopen per call:  305.1 calls/s
+    pooled keep-alive: 3719.8 calls/s
+"""
+import json
+import ssl
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+from aviatrix import Aviatrix
+from stub_controller import StubController
+
+GATEWAYS = [{'vpc_name': 'gw-{}'.format(i), 'vpc_id': 'vpc-{}'.format(i)}
+            for i in range(10)]
+
+
+def urlopen_call(controller_ip, ctx, action, parameters):
+    """
+    The pre-pool request path: a fresh TCP connection and TLS handshake
+    for every call
+    """
+    params = dict(parameters, action=action, CID='stub-cid')
+    url = 'https://{0}/v1/api?{1}'.format(controller_ip, urllib.parse.urlencode(params))
+    with urllib.request.urlopen(urllib.request.Request(url), context=ctx) as response:
+        return json.loads(response.read())['results']
+
+
+def run(label, func, calls):
+    """
+    Runs func calls times and prints the throughput
+    """
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    elapsed = time.perf_counter() - start
+    print('%-18s %.1f calls/s' % (label + ':', calls / elapsed))
+
+
+def main():
+    """
+    main() interface to this script
+    """
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    stub = StubController({'list_vpcs_summary': GATEWAYS}).start()
+    try:
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        run('urlopen per call',
+            lambda: urlopen_call(stub.address, ctx, 'list_vpcs_summary',
+                                 {'account_name': 'admin'}),
+            calls)
+
+        controller = Aviatrix(stub.address)
+        controller.login('admin', 'password')
+        run('pooled keep-alive', lambda: controller.list_gateways('admin'), calls)
+        controller.close()
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
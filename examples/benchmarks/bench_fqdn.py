@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+ Measures hostname evaluation throughput of aviatrix.fqdn.FqdnMatcher
+ against a linear scan of every entry (with fnmatch) on synthetic FQDN
+ filter tags, for distinct hostnames and for a proxy log like stream where
+ popular hostnames repeat, and checks both agree.
+
+ INPUTS:
+   $1 - ENTRIES - int - (optional) number of domain entries, default 5000
+   $2 - HOSTNAMES - int - (optional) number of hostnames, default 1000000
+
+ EXAMPLE OUTPUT:
+    compile 5000 entries:     0.007 s
+    linear scan:                 383 hostnames/s
+    FqdnMatcher (distinct):   180373 hostnames/s
+    FqdnMatcher (log):        788367 hostnames/s
+"""
+import fnmatch
+import random
+import sys
+import time
+
+from aviatrix.fqdn import FqdnMatcher
+
+WORDS = ['api', 'cdn', 'www', 'mail', 'static', 'img', 'auth', 'data', 'edge', 'login',
+         'shop', 'news', 'video', 'docs', 'app', 'ads', 'track', 'm', 'eu', 'us']
+TLDS = ['com', 'net', 'org', 'io', 'de', 'co.uk']
+
+
+def random_domain(rand):
+    """
+    A registered domain such as 'word12.com'
+    """
+    return '{0}{1}.{2}'.format(rand.choice(WORDS), rand.randrange(50), rand.choice(TLDS))
+
+
+def synthetic_tags(count, seed=1):
+    """
+    Splits count entries over a white list tag and a black list tag
+    """
+    rand = random.Random(seed)
+    white = []
+    black = []
+    for _ in range(count):
+        domain = random_domain(rand)
+        entry = '*.' + domain if rand.random() < 0.7 else domain
+        (black if rand.random() < 0.2 else white).append(entry)
+    return {'allowed-saas': ('white', white), 'blocked': ('black', black)}
+
+
+def synthetic_hostnames(count, seed=2):
+    """
+    Builds count hostnames of 2 to 4 labels
+    """
+    rand = random.Random(seed)
+    return ['.'.join([rand.choice(WORDS) for _ in range(rand.randrange(0, 3))] +
+                     [random_domain(rand)]) for _ in range(count)]
+
+
+def linear_allowed(tags, hostname):
+    """
+    Scans every entry of every tag
+    """
+    matched = set()
+    for color, entries in tags.values():
+        for entry in entries:
+            if (entry.startswith('*.') and fnmatch.fnmatchcase(hostname, entry)) or entry == hostname:
+                matched.add(color)
+                break
+    return 'black' not in matched and 'white' in matched
+
+
+def main():
+    """
+    main() interface to this script
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    log_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    tags = synthetic_tags(count)
+
+    start = time.perf_counter()
+    matcher = FqdnMatcher()
+    for tag_name, (color, entries) in tags.items():
+        matcher.add_tag(tag_name, entries, color)
+    print('compile %d entries:   %7.3f s' % (count, time.perf_counter() - start))
+
+    distinct = synthetic_hostnames(200000)
+    sample = distinct[:200]
+    start = time.perf_counter()
+    expected = [linear_allowed(tags, hostname) for hostname in sample]
+    print('linear scan:            %8d hostnames/s' % (len(sample) / (time.perf_counter() - start)))
+
+    uncached = FqdnMatcher(cache_size=0)
+    for tag_name, (color, entries) in tags.items():
+        uncached.add_tag(tag_name, entries, color)
+    start = time.perf_counter()
+    verdicts = list(uncached.evaluate_many(distinct))
+    print('FqdnMatcher (distinct): %8d hostnames/s' % (len(distinct) / (time.perf_counter() - start)))
+    if [verdict.allowed for verdict in verdicts[:len(sample)]] != expected:
+        raise SystemExit('FqdnMatcher disagrees with the linear scan')
+
+    # proxy logs: a few thousand hostnames make up most of the requests
+    rand = random.Random(3)
+    popular = distinct[:5000]
+    log = [rand.choice(popular) if rand.random() < 0.9 else rand.choice(distinct)
+           for _ in range(log_size)]
+    start = time.perf_counter()
+    for _ in matcher.evaluate_many(log):
+        pass
+    print('FqdnMatcher (log):      %8d hostnames/s' % (len(log) / (time.perf_counter() - start)))
+
+
+if __name__ == "__main__":
+    main()
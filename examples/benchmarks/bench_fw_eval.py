@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+ Measures flow evaluation throughput of aviatrix.fweval.PolicyEvaluator
+ against a linear first-match scan over the same rules (with ipaddress
+ networks), on a synthetic policy with tags, and checks both agree.
+
+ INPUTS:
+   $1 - RULES - int - (optional) number of rules, default 1000
+   $2 - FLOWS - int - (optional) number of flows, default 20000
+
+ EXAMPLE OUTPUT:
+    compile 1000 rules:     0.044 s
+    linear scan:           16761 flows/s
+    PolicyEvaluator:       91880 flows/s
+"""
+import ipaddress
+import random
+import sys
+import time
+
+from aviatrix.fweval import PolicyEvaluator
+
+PROTOCOLS = ('tcp', 'tcp', 'udp', 'icmp', 'all')
+
+
+def random_cidr(rand):
+    """
+    A prefix inside 10.0.0.0/12 so that rules and flows overlap
+    """
+    length = rand.choice((12, 16, 20, 24, 24, 28, 32))
+    address = (10 << 24) | rand.randrange(0, 1 << 20)
+    return str(ipaddress.ip_network('{0}/{1}'.format(ipaddress.IPv4Address(address), length),
+                                    strict=False))
+
+
+def synthetic_policy(count, seed=1):
+    """
+    Builds count rules and 20 tags of 10 prefixes
+    """
+    rand = random.Random(seed)
+    tags = dict(('tag-{0}'.format(i), [random_cidr(rand) for _ in range(10)]) for i in range(20))
+    rules = []
+    for _ in range(count):
+        protocol = rand.choice(PROTOCOLS)
+        port = ''
+        if protocol in ('tcp', 'udp'):
+            low = rand.randrange(1, 65000)
+            port = rand.choice((str(low), '{0}:{1}'.format(low, low + rand.randrange(1, 500))))
+        rules.append({'protocol': protocol, 'port': port,
+                      's_ip': rand.choice(list(tags)) if rand.random() < 0.2 else random_cidr(rand),
+                      'd_ip': rand.choice(list(tags)) if rand.random() < 0.2 else random_cidr(rand),
+                      'deny_allow': rand.choice(('allow', 'deny')), 'log_enable': 'off'})
+    return rules, tags
+
+
+def synthetic_flows(count, seed=2):
+    """
+    Builds count (src, dst, protocol, port) flows
+    """
+    rand = random.Random(seed)
+    flows = []
+    for _ in range(count):
+        protocol = rand.choice(('tcp', 'udp', 'icmp'))
+        flows.append((str(ipaddress.IPv4Address((10 << 24) | rand.randrange(0, 1 << 20))),
+                      str(ipaddress.IPv4Address((10 << 24) | rand.randrange(0, 1 << 20))),
+                      protocol, rand.randrange(1, 65536) if protocol != 'icmp' else None))
+    return flows
+
+
+class LinearEvaluator(object):
+    """
+    First-match scan of every rule for every flow
+    """
+
+    def __init__(self, rules, tags):
+        self.rules = []
+        for rule in rules:
+            sources = [ipaddress.ip_network(cidr) for cidr in tags.get(rule['s_ip'], [rule['s_ip']])]
+            destinations = [ipaddress.ip_network(cidr)
+                            for cidr in tags.get(rule['d_ip'], [rule['d_ip']])]
+            low, _, high = rule['port'].partition(':')
+            ports = (int(low), int(high or low)) if low else None
+            self.rules.append((rule['protocol'], ports, sources, destinations, rule['deny_allow']))
+
+    def evaluate(self, src, dst, protocol, port):
+        src = ipaddress.ip_address(src)
+        dst = ipaddress.ip_address(dst)
+        for index, (rule_protocol, ports, sources, destinations, action) in enumerate(self.rules):
+            if rule_protocol != 'all' and rule_protocol != protocol:
+                continue
+            if ports is not None and (port is None or not ports[0] <= port <= ports[1]):
+                continue
+            if any(src in network for network in sources) and \
+               any(dst in network for network in destinations):
+                return action, index
+        return 'deny', None
+
+
+def main():
+    """
+    main() interface to this script
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    flow_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    rules, tags = synthetic_policy(count)
+    flows = synthetic_flows(flow_count)
+
+    start = time.perf_counter()
+    evaluator = PolicyEvaluator(rules, tags)
+    evaluator.evaluate_many(flows[:1])
+    print('compile %d rules:   %7.3f s' % (count, time.perf_counter() - start))
+
+    linear = LinearEvaluator(rules, tags)
+    sample = flows[:max(1, flow_count // 20)]
+    start = time.perf_counter()
+    expected = [linear.evaluate(*flow) for flow in sample]
+    print('linear scan:        %8d flows/s' % (len(sample) / (time.perf_counter() - start)))
+
+    start = time.perf_counter()
+    verdicts = evaluator.evaluate_many(flows)
+    print('PolicyEvaluator:    %8d flows/s' % (len(flows) / (time.perf_counter() - start)))
+
+    if [(verdict.action, verdict.rule_index) for verdict in verdicts[:len(sample)]] != expected:
+        raise SystemExit('PolicyEvaluator disagrees with the linear scan')
+
+
+if __name__ == "__main__":
+    main()
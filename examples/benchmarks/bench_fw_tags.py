@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+ Measures firewall tag member compaction on a synthetic IPAM feed of
+ overlapping, adjacent and duplicate IPv4 prefixes: the integer range merge
+ of aviatrix.fwtags against ipaddress.collapse_addresses, the incremental
+ diff against the current members and the size of the update request.
+
+ INPUTS:
+   $1 - PREFIXES - int - (optional) number of prefixes, default 100000
+
+ EXAMPLE OUTPUT:
+    ipaddress.collapse_addresses:   4.392 s
+    fwtags.compact_members:         0.631 s
+    fwtags.plan_tag_members:        1.092 s (637 added, 321 removed)
+    prefixes: 100000 -> 60831 after compaction
+    update request: 9.7 MB -> 5.9 MB
+"""
+import ipaddress
+import random
+import sys
+import time
+import urllib.parse
+
+from aviatrix.fwtags import compact_members, plan_tag_members
+
+
+def ipam_feed(count, seed=1):
+    """
+    Generates prefixes clustered in a few /12s so that many overlap or touch
+    """
+    rand = random.Random(seed)
+    bases = [rand.randrange(0, 1 << 32) & 0xFFF00000 for _ in range(16)]
+    members = []
+    for i in range(count):
+        length = rand.choice((24, 24, 25, 26, 27, 28, 30, 32))
+        address = rand.choice(bases) | (rand.randrange(0, 1 << 20) & ~((1 << (32 - length)) - 1))
+        members.append({'name': 'ipam-{0}'.format(i),
+                        'cidr': '{0}/{1}'.format(ipaddress.IPv4Address(address), length)})
+    # exact duplicates from overlapping feeds
+    members.extend(rand.sample(members, count // 20))
+    return members[:count]
+
+
+def request_size(members):
+    """
+    Size of the update_policy_members form body
+    """
+    params = {}
+    for i, member in enumerate(members):
+        params['new_policies[%d][name]' % (i)] = member['name']
+        params['new_policies[%d][cidr]' % (i)] = member['cidr']
+    return len(urllib.parse.urlencode(params))
+
+
+def timed(label, func):
+    """
+    Runs func once and prints the elapsed time
+    """
+    start = time.perf_counter()
+    result = func()
+    print('%-30s %6.3f s' % (label + ':', time.perf_counter() - start))
+    return result
+
+
+def main():
+    """
+    main() interface to this script
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    members = ipam_feed(count)
+
+    reference = timed('ipaddress.collapse_addresses',
+                      lambda: list(ipaddress.collapse_addresses(
+                          ipaddress.ip_network(member['cidr'], strict=False) for member in members)))
+    compacted = timed('fwtags.compact_members', lambda: compact_members(members))
+    if [str(network) for network in reference] != [member['cidr'] for member in compacted]:
+        raise SystemExit('compaction differs from ipaddress.collapse_addresses')
+
+    # the next feed drops a few prefixes and adds a few new ones
+    changed = members[500:] + ipam_feed(500, seed=2)
+    start = time.perf_counter()
+    _, diff = plan_tag_members(compacted, changed, compact=True)
+    print('%-30s %6.3f s (%d added, %d removed)' % ('fwtags.plan_tag_members:',
+                                                   time.perf_counter() - start,
+                                                   len(diff.added), len(diff.removed)))
+    print('prefixes: %d -> %d after compaction' % (len(members), len(compacted)))
+    print('update request: %.1f MB -> %.1f MB' % (request_size(members) / 1e6,
+                                                 request_size(compacted) / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+ Compares the peak memory (RSS) of list_vpn_users(), which decodes the whole
+ response at once, with the streaming iter_vpn_users() against a local HTTPS
+ stub controller returning a large user list.  Each variant runs in its own
+ child process so the peaks do not influence each other.
+
+ INPUTS:
+   $1 - USERS - int - (optional) number of VPN users returned, default 200000
+
+ EXAMPLE OUTPUT:
+    response size:   34.1 MB (200000 users)
+    baseline:        23.8 MB peak RSS
+    list_vpn_users:  228.5 MB peak RSS (200000 users)
+    iter_vpn_users:  23.9 MB peak RSS (200000 users)
+"""
+import json
+import resource
+import subprocess
+import sys
+
+from aviatrix import Aviatrix
+from stub_controller import StubController
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of this process in kB.  VmHWM is used where
+    available because ru_maxrss also counts the parent's memory that was
+    inherited by fork() before exec().
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(mode, address):
+    """
+    Runs one variant and prints the number of users and the peak RSS in kB
+    """
+    controller = Aviatrix(address)
+    controller.login('admin', 'password')
+    count = 0
+    if mode == 'list':
+        count = len(controller.list_vpn_users())
+    elif mode == 'iter':
+        for _ in controller.iter_vpn_users():
+            count += 1
+    print(count, peak_rss_kb())
+
+
+def run(mode, address):
+    """
+    Runs a variant in a child process
+    Returns:
+    tuple (number of users, peak RSS in MB)
+    """
+    output = subprocess.check_output([sys.executable, __file__, '--child', mode, address])
+    count, max_rss = output.split()
+    return int(count), int(max_rss) / 1024.0
+
+
+def main():
+    """
+    main() interface to this script
+    """
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+        return
+
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    payload = json.dumps([{'_id': 'user{}'.format(i),
+                           'email': 'user{}@example.com'.format(i),
+                           'vpc_id': 'vpc-{:08x}'.format(i % 50),
+                           'lb_name': 'Aviatrix-vpc-{}'.format(i % 50),
+                           'attached': True,
+                           'profiles': ['default'],
+                           'saml_endpoint': None} for i in range(users)]).encode()
+    stub = StubController({'list_vpn_users': payload}).start()
+    try:
+        print('%-16s %.1f MB (%d users)' % ('response size:', len(payload) / 1048576.0, users))
+        print('%-16s %.1f MB peak RSS' % ('baseline:', run('none', stub.address)[1]))
+        for mode, label in (('list', 'list_vpn_users:'), ('iter', 'iter_vpn_users:')):
+            count, max_rss = run(mode, stub.address)
+            print('%-16s %.1f MB peak RSS (%d users)' % (label, max_rss, count))
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+ Pushes the per-gateway statistics of a synthetic fleet to Zabbix the way
+ a cron job would: one concurrent statistics sweep against a local HTTPS
+ stub controller, then the LLD data and every item in a single
+ ZabbixSender.send() to a local stand-in trapper.  Checks the trapper
+ received every item.
+
+ INPUTS:
+   $1 - GATEWAYS - int - (optional) number of gateways, default 200
+
+ EXAMPLE OUTPUT:
+    statistics sweep:    1.473 s (200 gateways, 0 errors)
+    sender request:      0.005 s (1202 items)
+    trapper answer:     {'processed': 1202, 'failed': 0, 'total': 1202}
+"""
+import sys
+import time
+
+from aviatrix import Aviatrix
+from aviatrix.snapshot import collect_gateway_stats
+from aviatrix.zabbix import ZabbixSender, discovery_items, gateway_stat_items
+from stub_controller import StubController
+from stub_zabbix import StubZabbixTrapper
+
+
+def gateway_statistics(params):
+    """
+    A show_packets_stat_for_gw answer for the requested gateway
+    """
+    return [{'gw_name': params['gw_name'],
+             'mpstats': {'stats_current': {'cpu': {'ks': 1.5, 'us': 4.0, 'idle': 94.5},
+                                           'memory': {'free': '812344'}}},
+             'ifstats': {'Cumulative (sent/received/total)': ['232.46MB', '1.2GB', '1.43GB']},
+             'hdisk_free': '6120000'}]
+
+
+def main():
+    """
+    main() interface to this script
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    gws = [{'vpc_name': 'gw-{0}'.format(i), 'vpc_id': 'vpc-{0}'.format(i),
+            'vpc_region': 'us-east-1', 'cloud_type': 1} for i in range(count)]
+    stub = StubController({'list_vpcs_summary': gws,
+                           'list_peer_vpc_pairs': {'pair_list': []},
+                           'show_packets_stat_for_gw': gateway_statistics}).start()
+    trapper = StubZabbixTrapper().start()
+    try:
+        controller = Aviatrix(stub.address)
+        controller.login('admin', 'password')
+        gws = controller.list_gateways('admin')
+        start = time.perf_counter()
+        summaries, errors = collect_gateway_stats(controller, [gwy['vpc_name'] for gwy in gws])
+        print('statistics sweep:   %6.3f s (%d gateways, %d errors)' % (
+            time.perf_counter() - start, len(summaries), len(errors)))
+
+        items = (discovery_items('aviatrix', gws, controller.list_peers()) +
+                 gateway_stat_items('aviatrix', summaries))
+        start = time.perf_counter()
+        counts = ZabbixSender(trapper.host, trapper.port).send(items)
+        print('sender request:     %6.3f s (%d items)' % (time.perf_counter() - start, len(items)))
+        print('trapper answer:     %s' % counts)
+        if counts.get('processed') != len(items) or len(trapper.items) != len(items):
+            raise SystemExit('the trapper did not receive every item')
+    finally:
+        trapper.stop()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
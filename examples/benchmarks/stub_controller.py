@@ -0,0 +1,120 @@
+"""
+ Local HTTPS stand-in for an Aviatrix Controller used by the benchmarks in
+ this directory.  A throw-away self-signed certificate is generated with the
+ openssl command line tool.
+
+ USAGE:
+    stub = StubController({'list_vpcs_summary': [{'vpc_name': 'gw1'}]})
+    stub.start()
+    controller = Aviatrix(stub.address)
+    ...
+    stub.stop()
+"""
+import http.server
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import urllib.parse
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers /v1/api and /v1/backend1 requests from the stub's action table
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _params(self):
+        query = urllib.parse.urlparse(self.path).query
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length', 0))
+            query = self.rfile.read(length).decode()
+        return dict(urllib.parse.parse_qsl(query))
+
+    def _respond(self):
+        params = self._params()
+        action = params.get('action')
+        responses = self.server.responses
+        if action == 'login':
+            body = {'return': True, 'CID': 'stub-cid', 'results': 'ok'}
+        elif action in responses:
+            results = responses[action]
+            if callable(results):
+                results = results(params)
+            body = {'return': True, 'results': results}
+        else:
+            body = {'return': False, 'reason': 'unknown action {}'.format(action)}
+        if isinstance(body.get('results'), bytes):
+            payload = b'{"return": true, "results": ' + body['results'] + b'}'
+        else:
+            payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class StubController(object):
+    """
+    Threaded HTTPS server answering Aviatrix API actions with canned results
+    """
+
+    def __init__(self, responses=None):
+        """
+        Arguments:
+        responses - dict - action name to results object, bytes holding an
+                           already serialized JSON results value, or a
+                           callable receiving the request parameters
+        """
+        self.responses = responses or {}
+        self._tmpdir = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        """
+        host:port of the running stub
+        """
+        return '127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def start(self):
+        """
+        Generates a certificate and starts serving in a background thread
+        """
+        self._tmpdir = tempfile.mkdtemp()
+        cert = os.path.join(self._tmpdir, 'cert.pem')
+        key = os.path.join(self._tmpdir, 'key.pem')
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048',
+                               '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                               '-keyout', key, '-out', cert],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self._server.responses = self.responses
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server and removes the generated certificate
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
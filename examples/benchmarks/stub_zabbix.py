@@ -0,0 +1,112 @@
+"""
+ Local stand-in for a Zabbix server trapper used by the examples in this
+ directory.  It speaks the sender protocol (a 'ZBXD\x01' header, the little
+ endian 64-bit body length and a JSON 'sender data' request) and answers
+ every request with success, keeping the received items.
+
+ USAGE:
+    trapper = StubZabbixTrapper()
+    trapper.start()
+    sender = ZabbixSender(trapper.host, trapper.port)
+    ...
+    print(len(trapper.items))
+    trapper.stop()
+"""
+import json
+import socketserver
+import struct
+import threading
+import time
+
+HEADER = b'ZBXD\x01'
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """
+    Answers one sender request per connection
+    """
+
+    def _read_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError('connection closed after {0} of {1} bytes'.format(len(data), size))
+            data += chunk
+        return data
+
+    def handle(self):
+        start = time.perf_counter()
+        header = self._read_exactly(len(HEADER) + 8)
+        if header[:len(HEADER)] != HEADER:
+            # a real trapper drops the connection without an answer
+            return
+        length = struct.unpack('<Q', header[len(HEADER):])[0]
+        request = json.loads(self._read_exactly(length).decode('utf-8'))
+        data = request.get('data') or []
+        with self.server.lock:
+            self.server.items.extend(data)
+            self.server.requests += 1
+        info = 'processed: {0}; failed: 0; total: {0}; seconds spent: {1:.6f}'.format(
+            len(data), time.perf_counter() - start)
+        body = json.dumps({'response': 'success', 'info': info}).encode('utf-8')
+        self.request.sendall(HEADER + struct.pack('<Q', len(body)) + body)
+
+
+class StubZabbixTrapper(object):
+    """
+    Threaded TCP server accepting Zabbix sender requests
+    """
+
+    def __init__(self):
+        self._server = None
+        self._thread = None
+
+    @property
+    def host(self):
+        """
+        address the stub listens on
+        """
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        """
+        port the stub listens on
+        """
+        return self._server.server_address[1]
+
+    @property
+    def items(self):
+        """
+        list of the received items ({'host', 'key', 'value'[, 'clock']})
+        """
+        with self._server.lock:
+            return list(self._server.items)
+
+    @property
+    def requests(self):
+        """
+        number of sender requests received
+        """
+        return self._server.requests
+
+    def start(self):
+        """
+        Starts serving in a background thread
+        """
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.lock = threading.Lock()
+        self._server.items = []
+        self._server.requests = 0
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server
+        """
+        self._server.shutdown()
+        self._server.server_close()
@@ -4,10 +4,18 @@
 # and detach existing VPN users from their current VPN gateway and then
 # attach them to a new VPN gateway
 #
+# Users are migrated concurrently and every completed step is written to
+# the CHECKPOINT file; if the run is interrupted, run the same command
+# again to finish the remaining users.
+#
 # INPUTS:
 #   $1 - HOST - string - host/ip of the controller
 #   $2 - USER - string - the username used to authenticate with controller
 #   $3 - PASSWORD - string - the password of the given USER
+#   $4 - LB_NAME - string - the target ELB name (from controller UI)
+#   $5 - VPC_ID - string - the target VPC ID
+#   $6 - CHECKPOINT - string - path of the checkpoint log
+#   $7 - SOURCE_VPC_ID - string - (optional) only move the users of this VPC
 #
 #-------------------------------------------------------------------------
 
@@ -15,18 +23,27 @@ import logging
 import sys
 
 from aviatrix import Aviatrix
+from aviatrix.vpnmigrate import MigrationEngine
 
-if len(sys.argv) != 4:
-    print ('usage: %s <HOST> <USER> <PASSWORD>\n'
+if len(sys.argv) not in (7, 8):
+    print ('usage: %s <HOST> <USER> <PASSWORD> <LB_NAME> <VPC_ID> <CHECKPOINT> [SOURCE_VPC_ID]\n'
            '  where\n'
            '    HOST Aviatrix Controller hostname or IP\n'
            '    USER Aviatrix Controller login username\n'
-           '    PASSWORD Aviatrix Controller login password\n' % sys.argv[0])
+           '    PASSWORD Aviatrix Controller login password\n'
+           '    LB_NAME target ELB name\n'
+           '    VPC_ID target VPC ID\n'
+           '    CHECKPOINT checkpoint log (reuse it to resume)\n'
+           '    SOURCE_VPC_ID only move the users of this VPC\n' % sys.argv[0])
     sys.exit(1)
 
 controller_ip = sys.argv[1]
 username = sys.argv[2]
 password = sys.argv[3]
+lb_name = sys.argv[4]
+vpc_id = sys.argv[5]
+checkpoint = sys.argv[6]
+source_vpc_id = sys.argv[7] if len(sys.argv) == 8 else None
 
 #logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
@@ -34,12 +51,12 @@ controller = Aviatrix(controller_ip)
 controller.login(username, password)
 
 users = controller.list_vpn_users()
-for user in users:
-    if user['attached']:
-        controller.detach_vpn_user(user['vpc_id'], user['_id'])
-    controller.attach_vpn_user('Aviatrix-vpc', # TODO: ELB (from controller UI)
-                               'vpc-abcd0000', # TODO: VPC ID
-                               user['_id'], # username
-                               user['email'], # email
-                               None,
-                               'TODO') # TODO
+engine = MigrationEngine(controller, checkpoint, max_workers=8)
+# also picks up the users an interrupted run already detached
+moves = engine.plan(users, lb_name, vpc_id, source_vpc_id=source_vpc_id)
+print('%d users to migrate' % len(moves))
+
+report = engine.run(moves)
+print(report.summary())
+report.write_csv(sys.stdout)
+sys.exit(1 if report.failed() else 0)
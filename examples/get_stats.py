@@ -59,16 +59,19 @@ def print_stats(controller_ip, username, password):
     controller.login(username, password)
 
     gws = controller.list_gateways('admin')
-    for gateway in gws:
-        data = controller.get_current_gateway_statistics(gateway['vpc_name'])
-        for gw_data in data:
+    calls = [('get_current_gateway_statistics', (gateway['vpc_name'],)) for gateway in gws]
+    for item in controller.batch(calls, max_workers=32):
+        if not item.ok:
+            print ('%s: failed to get statistics: %s\n' % (item.call.args[0], item.error))
+            continue
+        for gw_data in item.value:
             current = gw_data['mpstats']['stats_current']
             cpu = current['cpu']
             cpu_load = cpu['ks'] + cpu['us']
             cpu_idle = cpu['idle']
             memory = current['memory']
             memory_free = memory['free']
-            disk_free = long(gw_data['hdisk_free'])
+            disk_free = int(gw_data['hdisk_free'])
             network = gw_data['ifstats']
             total_bytes_in = network['Cumulative (sent/received/total)'][1]
             total_bytes_out = network['Cumulative (sent/received/total)'][0]
@@ -87,10 +90,10 @@ def print_stats(controller_ip, username, password):
     peers = controller.list_peers()
     for pair in peers:
         is_down = (pair['peering_state'].lower() != 'up')
-        print '%s%s <==> %s %s' % ('!!!!! ' if is_down else '',
-                                   pair['vpc_name1'],
-                                   pair['vpc_name2'],
-                                   pair['peering_state'].upper())
+        print ('%s%s <==> %s %s' % ('!!!!! ' if is_down else '',
+                                    pair['vpc_name1'],
+                                    pair['vpc_name2'],
+                                    pair['peering_state'].upper()))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+ This script exports the state of an Aviatrix Controller to Prometheus.  The
+ controller is polled in the background once per INTERVAL; scrapes are
+ answered from the last snapshot.
+
+ INPUTS:
+   $1 - HOST - string - host/ip of the controller
+   $2 - USER - string - the username used to authenticate with controller
+   $3 - PASSWORD - string - the password of the given USER
+   $4 - PORT - int - (optional) port to listen on, default 9470
+   $5 - INTERVAL - int - (optional) seconds between polls, default 60
+
+ EXAMPLE OUTPUT (curl http://localhost:9470/metrics):
+    aviatrix_gateway_up{cloud_type="1",gateway="gw-transit-hub",...} 1.0
+    aviatrix_peering_up{gateway1="gw-sample-app-dev",gateway2="gw-transit-hub",state="up"} 1.0
+    aviatrix_gateway_cpu_idle_percent{gateway="gw-transit-hub"} 99.0
+    aviatrix_snapshot_fetch_duration_seconds{part="stats"} 0.41
+"""
+import logging
+import sys
+
+from aviatrix import Aviatrix
+from aviatrix.prometheus import serve_metrics
+from aviatrix.snapshot import SnapshotPoller
+
+def main():
+    """
+    main() interface to this script
+    """
+    if len(sys.argv) not in (4, 5, 6):
+        print ('usage: %s <HOST> <USER> <PASSWORD> [PORT] [INTERVAL]\n'
+               '  where\n'
+               '    HOST Aviatrix Controller hostname or IP\n'
+               '    USER Aviatrix Controller login username\n'
+               '    PASSWORD Aviatrix Controller login password\n'
+               '    PORT port to listen on (default 9470)\n'
+               '    INTERVAL seconds between polls (default 60)\n' % sys.argv[0])
+        sys.exit(1)
+
+    port = int(sys.argv[4]) if len(sys.argv) > 4 else 9470
+    interval = int(sys.argv[5]) if len(sys.argv) > 5 else 60
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+    controller = Aviatrix(sys.argv[1], relogin=True)
+    controller.login(sys.argv[2], sys.argv[3])
+
+    poller = SnapshotPoller(controller, interval=interval, collect_stats=True)
+    poller.start()
+    serve_metrics(('', port), poller)
+
+if __name__ == "__main__":
+    main()
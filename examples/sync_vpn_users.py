@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------
+# This script synchronizes the VPN users of an Aviatrix Controller with a
+# CSV or LDIF file.  It prints the plan and only changes the controller
+# when --apply is given.
+#
+# CSV columns: username, vpc_id, lb_name, email, profile_name
+# LDIF attributes: uid, mail, avxVpcId, avxLbName, avxProfile
+#
+# INPUTS:
+#   $1 - HOST - string - host/ip of the controller
+#   $2 - USER - string - the username used to authenticate with controller
+#   $3 - PASSWORD - string - the password of the given USER
+#   $4 - FILE - string - the desired users (.csv or .ldif)
+#   --apply - make the changes
+#   --delete - also delete the users of the listed VPCs missing from FILE
+#
+#-------------------------------------------------------------------------
+
+import sys
+
+from aviatrix import Aviatrix
+from aviatrix.vpnsync import apply_sync, iter_csv_users, iter_ldif_users, plan_sync
+
+flags = set(arg for arg in sys.argv[1:] if arg.startswith('--'))
+args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+if len(args) != 4 or flags - set(['--apply', '--delete']):
+    print ('usage: %s <HOST> <USER> <PASSWORD> <FILE> [--apply] [--delete]\n'
+           '  where\n'
+           '    HOST Aviatrix Controller hostname or IP\n'
+           '    USER Aviatrix Controller login username\n'
+           '    PASSWORD Aviatrix Controller login password\n'
+           '    FILE desired VPN users (.csv or .ldif)\n'
+           '    --apply make the changes (default: only print the plan)\n'
+           '    --delete delete users missing from FILE\n' % sys.argv[0])
+    sys.exit(1)
+
+controller_ip, username, password, path = args
+
+controller = Aviatrix(controller_ip)
+controller.login(username, password)
+
+with open(path) as users:
+    if path.lower().endswith(('.ldif', '.ldf')):
+        desired = iter_ldif_users(users)
+    else:
+        desired = iter_csv_users(users)
+    plan = plan_sync(desired, controller.iter_vpn_users(), delete_missing='--delete' in flags)
+
+print(plan.describe())
+if '--apply' not in flags:
+    sys.exit(0)
+
+results = apply_sync(controller, plan, max_workers=8, rate=10)
+failed = [result for result in results if not result.ok]
+for result in failed:
+    print('FAILED %s %s: %s' % (result.action.op, result.action.username, result.error))
+print('%d changes made, %d failed' % (len(results) - len(failed), len(failed)))
+sys.exit(1 if failed else 0)
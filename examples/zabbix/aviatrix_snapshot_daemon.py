@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------
+# Resident daemon that polls the Aviatrix Controller on a fixed interval
+# and serves the Zabbix checks from one shared in-memory snapshot over a
+# Unix socket (see external_checks/query_snapshot.py).
+#
+# INPUTS:
+#   $1 - HOST - string - host/ip of the controller
+#   $2 - USER - string - the username used to authenticate with controller
+#   $3 - PASSWORD - string - the password of the given USER
+#   $4 - SOCKET - string - path of the Unix socket to listen on
+#   $5 - INTERVAL - int - (optional) seconds between polls, default 60
+#-------------------------------------------------------------------------
+import logging
+import sys
+
+from aviatrix import Aviatrix, FileSessionStore
+from aviatrix.snapshot import SnapshotPoller
+from aviatrix.zabbix import serve_snapshot
+
+if len(sys.argv) not in (5, 6):
+    print ('usage: %s <HOST> <USER> <PASSWORD> <SOCKET> [INTERVAL]\n'
+           '  where\n'
+           '    HOST Aviatrix Controller hostname or IP\n'
+           '    USER Aviatrix Controller login username\n'
+           '    PASSWORD Aviatrix Controller login password\n'
+           '    SOCKET path of the Unix socket to listen on\n'
+           '    INTERVAL seconds between polls (default 60)\n' % sys.argv[0])
+    sys.exit(1)
+
+controller_ip = sys.argv[1]
+username = sys.argv[2]
+password = sys.argv[3]
+socket_path = sys.argv[4]
+interval = int(sys.argv[5]) if len(sys.argv) == 6 else 60
+
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+controller = Aviatrix(controller_ip, session_store=FileSessionStore())
+controller.login(username, password)
+
+poller = SnapshotPoller(controller, interval=interval)
+poller.poll_once()
+poller.start()
+serve_snapshot(socket_path, poller)
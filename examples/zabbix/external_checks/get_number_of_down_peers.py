@@ -11,7 +11,7 @@
 # OUTPUTS:
 #   count - int - number of peers that are not UP
 #-------------------------------------------------------------------------
-from aviatrix import Aviatrix
+from aviatrix import Aviatrix, FileSessionStore
 import logging
 import sys
 
@@ -27,7 +27,8 @@ controller_ip = sys.argv[1]
 username = sys.argv[2]
 password = sys.argv[3]
 
-controller = Aviatrix(controller_ip)
+# reuse the CID of the previous run instead of logging in every time
+controller = Aviatrix(controller_ip, session_store=FileSessionStore())
 controller.login(username, password)
 peers = controller.list_peers_vpc_pairs()
 
@@ -38,4 +39,4 @@ for peer in peers:
         count = count + 1
 
 # print out the total count of gateways found to be DOWN
-print count
+print(count)
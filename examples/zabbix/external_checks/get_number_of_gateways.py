@@ -11,7 +11,7 @@
 # OUTPUTS:
 #   count - int - number of gateways configured
 #-------------------------------------------------------------------------
-from aviatrix import Aviatrix
+from aviatrix import Aviatrix, FileSessionStore
 import logging
 import sys
 
@@ -27,8 +27,9 @@ controller_ip = sys.argv[1]
 username = sys.argv[2]
 password = sys.argv[3]
 
-controller = Aviatrix(controller_ip)
+# reuse the CID of the previous run instead of logging in every time
+controller = Aviatrix(controller_ip, session_store=FileSessionStore())
 controller.login(username, password)
 
 gws = controller.list_gateways('admin')
-print len(gws)
+print(len(gws))
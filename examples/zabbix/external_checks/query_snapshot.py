@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------
+# This is a simple external script to be executed by services like Zabbix
+# to read one value from a running aviatrix_snapshot_daemon.py, which
+# polls the controller once per interval for all checks.
+#
+# INPUTS:
+#   $1 - SOCKET - string - Unix socket path of the snapshot daemon
+#   $2 - ITEM - string - one of gateways, down_gateways, peers,
+#                        down_peers, snapshot_age, poll_errors
+#
+# OUTPUTS:
+#   value - the item value (ZBX_NOTSUPPORTED if not available)
+#-------------------------------------------------------------------------
+import socket
+import sys
+
+if len(sys.argv) != 3:
+    print ('usage: %s <SOCKET> <ITEM>\n'
+           '  where\n'
+           '    SOCKET Unix socket path of aviatrix_snapshot_daemon.py\n'
+           '    ITEM gateways, down_gateways, peers, down_peers,\n'
+           '         snapshot_age or poll_errors\n' % sys.argv[0])
+    sys.exit(1)
+
+# only the standard library is imported to keep the check fast
+client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+client.settimeout(5)
+client.connect(sys.argv[1])
+client.sendall(sys.argv[2].encode() + b'\n')
+data = b''
+while not data.endswith(b'\n'):
+    chunk = client.recv(4096)
+    if not chunk:
+        break
+    data += chunk
+client.close()
+
+print(data.decode().strip())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------
+# Pushes per-gateway metrics to a Zabbix trapper.  Run it from cron once
+# per interval instead of one external check per gateway and item.
+#
+# The Zabbix host needs two discovery rules of type "Zabbix trapper":
+#   aviatrix.gw.discovery   - macros {#GW_NAME}, {#VPC_ID}, {#REGION},
+#                             {#CLOUD_TYPE}
+#   aviatrix.peer.discovery - macros {#PEER1}, {#PEER2}
+# and trapper item prototypes such as aviatrix.gw.cpu_load[{#GW_NAME}],
+# aviatrix.gw.up[{#GW_NAME}] or aviatrix.peer.up[{#PEER1},{#PEER2}].
+# Metrics: up, cpu_load, cpu_idle, memory_free, disk_free, bytes_in,
+# bytes_out.
+#
+# INPUTS:
+#   $1 - HOST - string - host/ip of the controller
+#   $2 - USER - string - the username used to authenticate with controller
+#   $3 - PASSWORD - string - the password of the given USER
+#   $4 - ZABBIX_SERVER - string - host/ip[:port] of the Zabbix server or proxy
+#   $5 - ZABBIX_HOST - string - name of the host in Zabbix
+#-------------------------------------------------------------------------
+import sys
+
+from aviatrix import Aviatrix, FileSessionStore
+from aviatrix.snapshot import collect_gateway_stats
+from aviatrix.zabbix import (ZabbixSender, discovery_items, gateway_stat_items,
+                             state_items)
+
+if len(sys.argv) != 6:
+    print ('usage: %s <HOST> <USER> <PASSWORD> <ZABBIX_SERVER> <ZABBIX_HOST>\n'
+           '  where\n'
+           '    HOST Aviatrix Controller hostname or IP\n'
+           '    USER Aviatrix Controller login username\n'
+           '    PASSWORD Aviatrix Controller login password\n'
+           '    ZABBIX_SERVER Zabbix server or proxy hostname or IP[:port]\n'
+           '    ZABBIX_HOST host name of the controller in Zabbix\n' % sys.argv[0])
+    sys.exit(1)
+
+controller_ip = sys.argv[1]
+username = sys.argv[2]
+password = sys.argv[3]
+zabbix_server, _, zabbix_port = sys.argv[4].partition(':')
+zabbix_host = sys.argv[5]
+
+controller = Aviatrix(controller_ip, session_store=FileSessionStore())
+controller.login(username, password)
+
+gws = controller.list_gateways('admin')
+peers = controller.list_peers()
+summaries, errors = collect_gateway_stats(controller, [gwy['vpc_name'] for gwy in gws])
+for gw_name, error in sorted(errors.items()):
+    sys.stderr.write('%s: failed to get statistics: %s\n' % (gw_name, error))
+
+sender = ZabbixSender(zabbix_server, int(zabbix_port or 10051))
+# discovery first, so that new gateways get their items created
+sender.send(discovery_items(zabbix_host, gws, peers))
+result = sender.send(state_items(zabbix_host, gws, peers) +
+                     gateway_stat_items(zabbix_host, summaries))
+print ('processed: %d, failed: %d, total: %d' %
+       (result.get('processed', 0), result.get('failed', 0), result.get('total', 0)))
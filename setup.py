@@ -9,4 +9,5 @@ setup(
     author_email='info@aviatrix.com',
     url='https://aviatrix.com',
     packages=['aviatrix'],
+    extras_require={'stats': ['numpy']},
     )
@@ -0,0 +1,41 @@
+"""
+Tests of the Prometheus text exposition rendering
+"""
+
+import unittest
+
+from aviatrix.prometheus import render_snapshot
+from aviatrix.snapshot import FleetSnapshot
+
+
+class RenderSnapshotTest(unittest.TestCase):
+    """
+    render_snapshot()
+    """
+
+    def _render(self, stats):
+        return render_snapshot(FleetSnapshot(1700000000.0, [], [], stats, {'gateways': 0.25}, {}))
+
+    def test_finite_values(self):
+        text = self._render({'gw-1': {'cpu_load': 5.5, 'memory_free': 2}})
+        self.assertIn('aviatrix_snapshot_timestamp_seconds 1700000000.0\n', text)
+        self.assertIn('aviatrix_snapshot_fetch_duration_seconds{part="gateways"} 0.25\n', text)
+        self.assertIn('aviatrix_gateway_cpu_load_percent{gateway="gw-1"} 5.5\n', text)
+        self.assertIn('aviatrix_gateway_memory_free_bytes{gateway="gw-1"} 2048.0\n', text)
+
+    def test_infinities_and_nan(self):
+        text = self._render({'gw-1': {'cpu_load': float('nan'), 'cpu_idle': float('inf'),
+                                      'bytes_in': float('-inf')}})
+        self.assertIn('aviatrix_gateway_cpu_load_percent{gateway="gw-1"} NaN\n', text)
+        self.assertIn('aviatrix_gateway_cpu_idle_percent{gateway="gw-1"} +Inf\n', text)
+        self.assertIn('aviatrix_gateway_received_bytes_total{gateway="gw-1"} -Inf\n', text)
+        for line in text.splitlines():
+            self.assertFalse(line.endswith(('nan', 'inf')), line)
+
+    def test_before_first_poll(self):
+        self.assertEqual(render_snapshot(FleetSnapshot(0, [], [], {}, {}, {})).splitlines()[-1],
+                         'aviatrix_snapshot_timestamp_seconds 0.0')
+
+
+if __name__ == '__main__':
+    unittest.main()